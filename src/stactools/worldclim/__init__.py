@@ -1,9 +1,22 @@
-import stactools.core
+from typing import Any
 
-from stactools.worldclim.cog import create_cog
-from stactools.worldclim.stac import create_monthly_item
+# The submodules import rasterio, shapely and pystac, and the loader xarray and
+# dask, so they are only loaded when one of their functions is first used
+_LAZY_ATTRIBUTES = {
+    "create_cog": "stactools.worldclim.cog",
+    "create_monthly_item": "stactools.worldclim.stac",
+    "load_collection": "stactools.worldclim.loader",
+    "export_cube": "stactools.worldclim.loader",
+    "Cube": "stactools.worldclim.cube",
+}
 
-stactools.core.use_fsspec()
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_ATTRIBUTES:
+        import importlib
+        module = importlib.import_module(_LAZY_ATTRIBUTES[name])
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def register_plugin(registry):
@@ -11,7 +24,10 @@ def register_plugin(registry):
     registry.register_subcommand(commands.create_worldclim_command)
 
 
-__all__ = [create_cog.__name__, create_monthly_item.__name__]
+__all__ = [
+    "create_cog", "create_monthly_item", "load_collection", "export_cube",
+    "Cube"
+]
 
 __version__ = '0.1.5'
 """Library version"""
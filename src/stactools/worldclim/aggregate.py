@@ -0,0 +1,333 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from math import gcd
+from tempfile import TemporaryDirectory
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import rasterio
+from rasterio.io import DatasetReader
+from rasterio.transform import Affine
+from rasterio.windows import Window
+
+from stactools.worldclim.constants import (
+    AGGREGATION_WINDOW_ROWS,
+    RESOLUTION_SHAPES,
+)
+from stactools.worldclim.enum import Resolution
+from stactools.worldclim.planner import DERIVED_RESOLUTIONS
+
+logger = logging.getLogger(__name__)
+
+
+def aggregation_factor(resolution: Resolution) -> int:
+    """Number of 30s pixels along each side of a pixel of a resolution."""
+    source_height, _ = RESOLUTION_SHAPES[Resolution.THIRTY_SECONDS.value]
+    height, _ = RESOLUTION_SHAPES[resolution.value]
+    return source_height // height
+
+
+def derived_file_name(file_name: str, resolution: Resolution) -> str:
+    """Name of the file of another resolution, e.g. wc2.1_10m_tmin_01.tif
+    for wc2.1_30s_tmin_01.tif."""
+    return file_name.replace(f"_{Resolution.THIRTY_SECONDS.value}_",
+                             f"_{resolution.value}_", 1)
+
+
+def block_sums(data: np.ma.MaskedArray,
+               factor: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Sums and counts of the valid values of each factor x factor block.
+
+    Args:
+        data (np.ma.MaskedArray): Values with nodata masked, whose height and
+            width are multiples of factor.
+        factor (int): Side of the blocks in pixels.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: float64 sums and int64 counts of the
+        valid values of each block.
+    """
+    height, width = data.shape
+    shape = (height // factor, factor, width // factor, factor)
+    values = data.filled(0).astype(np.float64).reshape(shape)
+    valid = ~np.ma.getmaskarray(data).reshape(shape)
+    return values.sum(axis=(1, 3)), valid.sum(axis=(1, 3), dtype=np.int64)
+
+
+def coarsen_sums(sums: np.ndarray, counts: np.ndarray,
+                 factor: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Combines the sums and counts of factor x factor groups of blocks."""
+    height, width = sums.shape
+    shape = (height // factor, factor, width // factor, factor)
+    return (sums.reshape(shape).sum(axis=(1, 3)),
+            counts.reshape(shape).sum(axis=(1, 3)))
+
+
+def block_means(sums: np.ndarray, counts: np.ndarray, dtype: str,
+                nodata: Optional[float]) -> np.ndarray:
+    """Means of the valid values of each block, in the source data type.
+
+    Integer means are rounded to the nearest integer, and blocks without any
+    valid value are nodata.
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    if np.issubdtype(np.dtype(dtype), np.integer):
+        means = np.rint(means)
+    fill = nodata if nodata is not None else 0
+    return np.where(counts > 0, means, fill).astype(dtype)
+
+
+def aggregate(
+    input_path: str,
+    outputs: Dict[int, str],
+    window_rows: int = AGGREGATION_WINDOW_ROWS,
+    max_workers: int = 1,
+) -> None:
+    """Writes block means of a raster at several aggregation factors.
+
+    The input is read once, in windows of full rows, and the sums of the
+    finest factor are combined into those of the coarser factors that are
+    multiples of it. Windows are aggregated in parallel, each worker thread
+    reading through its own dataset handle.
+
+    Args:
+        input_path (str): Path of the raster to aggregate.
+        outputs (Dict[int, str]): Path of the GeoTIFF written for each
+            aggregation factor.
+        window_rows (int, optional): Approximate number of input rows read
+            at once, rounded to a multiple of every factor.
+        max_workers (int, optional): Number of windows aggregated
+            concurrently. Defaults to 1.
+    """
+    factors = sorted(outputs)
+    step = reduce(lambda a, b: a * b // gcd(a, b), factors)
+    window_rows = max(step, window_rows // step * step)
+
+    with rasterio.open(input_path) as src:
+        for factor in factors:
+            if src.height % factor or src.width % factor:
+                raise ValueError(
+                    f"{input_path} of shape {src.shape} can't be aggregated "
+                    f"by {factor}")
+        profile = {
+            "driver": "GTiff",
+            "count": 1,
+            "dtype": src.dtypes[0],
+            "nodata": src.nodata,
+            "crs": src.crs,
+        }
+        transform = src.transform
+        height, width = src.shape
+
+    logger.info(f"Aggregating {input_path} by {factors}")
+    writers = {
+        factor: rasterio.open(outputs[factor],
+                              "w",
+                              height=height // factor,
+                              width=width // factor,
+                              transform=_scale(transform, factor),
+                              **profile)
+        for factor in factors
+    }
+    write_lock = threading.Lock()
+    local = threading.local()
+    readers: List[DatasetReader] = []
+
+    def aggregate_window(row: int) -> None:
+        if not hasattr(local, "src"):
+            local.src = rasterio.open(input_path)
+            with write_lock:
+                readers.append(local.src)
+        rows = min(window_rows, height - row)
+        data = local.src.read(1,
+                              window=Window(0, row, width, rows),
+                              masked=True)
+        sums: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        for i, factor in enumerate(factors):
+            finer = next((f for f in reversed(factors[:i]) if factor % f == 0),
+                         None)
+            if finer is None:
+                sums[factor] = block_sums(data, factor)
+            else:
+                sums[factor] = coarsen_sums(*sums[finer], factor // finer)
+        for factor, (total, count) in sums.items():
+            means = block_means(total, count, profile["dtype"],
+                                profile["nodata"])
+            window = Window(0, row // factor, width // factor,
+                            rows // factor)
+            with write_lock:
+                writers[factor].write(means, 1, window=window)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(aggregate_window, range(0, height,
+                                                      window_rows)))
+    finally:
+        for reader in readers:
+            reader.close()
+        for writer in writers.values():
+            writer.close()
+
+
+def derive_resolutions(
+    input_path: str,
+    output_directory: str,
+    resolutions: List[Resolution],
+    max_workers: int = 1,
+) -> List[str]:
+    """Derives coarser resolutions from a 30s WorldClim file.
+
+    Each pixel of a coarser resolution is the mean of the valid 30s pixels it
+    covers, so only the 30s archives need to be downloaded.
+
+    Args:
+        input_path (str): Path of the 30s file.
+        output_directory (str): Directory the derived files are written to,
+            named as the official files.
+        resolutions (List[Resolution]): Resolutions to derive.
+        max_workers (int, optional): Number of windows aggregated
+            concurrently. Defaults to 1.
+
+    Returns:
+        List[str]: Paths of the derived files, in the order of resolutions.
+    """
+    file_name = os.path.basename(input_path)
+    paths = {
+        resolution: os.path.join(output_directory,
+                                 derived_file_name(file_name, resolution))
+        for resolution in resolutions
+    }
+    aggregate(input_path, {
+        aggregation_factor(resolution): path
+        for resolution, path in paths.items()
+    },
+              max_workers=max_workers)
+    return [paths[resolution] for resolution in resolutions]
+
+
+class Comparison:
+    """Differences between a derived file and the official file.
+
+    Args:
+        pixels (int): Number of pixels compared.
+        nodata_mismatches (int): Pixels that are nodata in only one file.
+        max_abs_diff (float): Largest absolute difference of valid pixels.
+        mean_abs_diff (float): Mean absolute difference of valid pixels.
+    """
+    def __init__(self, pixels: int, nodata_mismatches: int,
+                 max_abs_diff: float, mean_abs_diff: float):
+        self.pixels = pixels
+        self.nodata_mismatches = nodata_mismatches
+        self.max_abs_diff = max_abs_diff
+        self.mean_abs_diff = mean_abs_diff
+
+    def within(self, tolerance: float) -> bool:
+        """Whether the files have the same nodata pixels and no valid pixel
+        differs by more than tolerance."""
+        return (self.nodata_mismatches == 0
+                and self.max_abs_diff <= tolerance)
+
+    def __str__(self) -> str:
+        return (f"{self.pixels} pixels, {self.nodata_mismatches} nodata "
+                f"mismatches, max abs diff {self.max_abs_diff:g}, mean abs "
+                f"diff {self.mean_abs_diff:g}")
+
+
+def compare(
+    derived_path: str,
+    official_path: str,
+    window_rows: int = AGGREGATION_WINDOW_ROWS,
+) -> Comparison:
+    """Compares a derived file to the official file of the same resolution.
+
+    Args:
+        derived_path (str): Path of the derived file.
+        official_path (str): Path of the official file.
+        window_rows (int, optional): Number of rows read at once.
+
+    Returns:
+        Comparison: The differences between the files.
+    """
+    pixels = mismatches = valid = 0
+    max_diff = total_diff = 0.0
+    for derived, official in _read_pairs(derived_path, official_path,
+                                         window_rows):
+        derived_mask = np.ma.getmaskarray(derived)
+        official_mask = np.ma.getmaskarray(official)
+        both = ~derived_mask & ~official_mask
+        diff = np.abs(derived.data[both].astype(np.float64) -
+                      official.data[both].astype(np.float64))
+        pixels += derived.size
+        mismatches += int(np.count_nonzero(derived_mask != official_mask))
+        valid += diff.size
+        if diff.size:
+            max_diff = max(max_diff, float(diff.max()))
+            total_diff += float(diff.sum())
+    return Comparison(pixels, mismatches, max_diff,
+                      total_diff / valid if valid else 0.0)
+
+
+def validate_derived(
+    source_path: str,
+    official_path: str,
+    scratch_dir: Optional[str] = None,
+    max_workers: int = 1,
+) -> Comparison:
+    """Derives the resolution of an official file from the 30s file and
+    compares the two.
+
+    Args:
+        source_path (str): Path of the 30s file.
+        official_path (str): Path of the official coarser file of the same
+            variable, e.g. wc2.1_10m_tmin_01.tif.
+        scratch_dir (str, optional): Directory of the derived file. Defaults
+            to the system temporary directory.
+        max_workers (int, optional): Number of windows aggregated
+            concurrently. Defaults to 1.
+
+    Returns:
+        Comparison: The differences between the derived and official files.
+    """
+    with rasterio.open(official_path) as official:
+        shape = official.shape
+    resolutions = [
+        resolution for resolution in DERIVED_RESOLUTIONS
+        if RESOLUTION_SHAPES[resolution.value] == shape
+    ]
+    if not resolutions:
+        raise ValueError(
+            f"{official_path} of shape {shape} is not a WorldClim resolution "
+            "derived from 30s")
+    with TemporaryDirectory(dir=scratch_dir) as tmp_dir:
+        derived_path = derive_resolutions(source_path, tmp_dir, resolutions,
+                                          max_workers)[0]
+        comparison = compare(derived_path, official_path)
+    logger.info(f"{official_path}: {comparison}")
+    return comparison
+
+
+def _scale(transform: Affine, factor: int) -> Affine:
+    """Transform of a grid whose pixels are factor x factor pixels of the
+    grid of transform."""
+    return Affine(transform.a * factor, transform.b * factor, transform.c,
+                  transform.d * factor, transform.e * factor, transform.f)
+
+
+def _read_pairs(
+    first_path: str, second_path: str, window_rows: int
+) -> Iterator[Tuple[np.ma.MaskedArray, np.ma.MaskedArray]]:
+    with rasterio.open(first_path) as first:
+        with rasterio.open(second_path) as second:
+            if first.shape != second.shape:
+                raise ValueError(f"{first_path} of shape {first.shape} and "
+                                 f"{second_path} of shape {second.shape} "
+                                 "differ")
+            height, width = first.shape
+            for row in range(0, height, window_rows):
+                window = Window(0, row, width, min(window_rows, height - row))
+                yield (first.read(1, window=window, masked=True),
+                       second.read(1, window=window, masked=True))
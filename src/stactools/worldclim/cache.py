@@ -0,0 +1,196 @@
+import hashlib
+import json
+import logging
+import os
+import socket
+from contextlib import contextmanager, suppress
+from tempfile import NamedTemporaryFile
+from typing import Any, Dict, Iterator, Optional
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ArchiveCache:
+    """A persistent, content addressed cache of downloaded archives.
+
+    Archives are stored once under the SHA-256 of their content, and an
+    index maps each URL to its content hash together with the ETag and
+    Last-Modified headers it was served with. On reuse the cached copy is
+    revalidated with a conditional request, so unchanged archives are not
+    downloaded again. Writes are atomic renames and downloads of the same URL
+    are serialised with a file lock, so several workers can share a cache
+    on a common volume.
+
+    Args:
+        root (str): Directory holding the cache.
+        offline (bool, optional): Only use cached archives, without any
+            network access. Defaults to False.
+        timeout (float, optional): Seconds after which a stalled download
+            fails. Defaults to the socket module's default timeout.
+    """
+    def __init__(self,
+                 root: str,
+                 offline: bool = False,
+                 timeout: Optional[float] = None):
+        self.root = os.path.abspath(root)
+        self.offline = offline
+        self.timeout = (timeout
+                        if timeout is not None else socket.getdefaulttimeout())
+        # Paths of the archives already validated by this instance
+        self._fetched: Dict[str, str] = {}
+        for sub_dir in ["objects", "index", "locks", "tmp"]:
+            os.makedirs(os.path.join(root, sub_dir), exist_ok=True)
+
+    def object_path(self, sha256: str) -> str:
+        return os.path.join(self.root, "objects", sha256[:2], sha256)
+
+    def _url_key(self, url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _index_path(self, url: str) -> str:
+        return os.path.join(self.root, "index", f"{self._url_key(url)}.json")
+
+    def entry(self, url: str) -> Optional[Dict[str, Any]]:
+        """The index entry of a URL, if its archive is in the cache."""
+        try:
+            with open(self._index_path(url)) as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        if not os.path.exists(self.object_path(entry["sha256"])):
+            return None
+        return entry
+
+    @contextmanager
+    def _lock(self, url: str) -> Iterator[None]:
+        lock_path = os.path.join(self.root, "locks",
+                                 f"{self._url_key(url)}.lock")
+        # Imported here so that modules importing the cache, but not locking
+        # it, also import on Windows
+        import fcntl
+
+        with open(lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def fetch(self, url: str) -> str:
+        """Returns the path of an up to date local copy of an archive.
+
+        An archive is only revalidated the first time this instance fetches
+        it, so the files of one archive can be fetched one by one cheaply.
+
+        Args:
+            url (str): URL of the archive.
+
+        Returns:
+            str: Path of the archive in the cache. It must not be modified.
+        """
+        path = self._fetched.get(url)
+        if path is not None and os.path.exists(path):
+            return path
+        path = self._fetch(url)
+        self._fetched[url] = path
+        return path
+
+    def _fetch(self, url: str) -> str:
+        if self.offline:
+            entry = self.entry(url)
+            if entry is None:
+                raise FileNotFoundError(
+                    f"{url} is not in the archive cache {self.root}")
+            logger.info(f"Using cached {url}")
+            return self.object_path(entry["sha256"])
+
+        with self._lock(url):
+            # Another thread may have fetched it while we waited for the lock
+            path = self._fetched.get(url)
+            if path is not None and os.path.exists(path):
+                return path
+            entry = self.entry(url)
+            request = Request(url)
+            if entry is not None:
+                if entry.get("etag"):
+                    request.add_header("If-None-Match", entry["etag"])
+                if entry.get("last_modified"):
+                    request.add_header("If-Modified-Since",
+                                       entry["last_modified"])
+            try:
+                response = urlopen(request, timeout=self.timeout)
+            except HTTPError as e:
+                if e.code == 304 and entry is not None:
+                    logger.info(f"Cached {url} is up to date")
+                    return self.object_path(entry["sha256"])
+                raise
+            except URLError as e:
+                if entry is None:
+                    raise
+                logger.warning(
+                    f"Could not revalidate {url}, using cached copy: {e}")
+                return self.object_path(entry["sha256"])
+
+            with response:
+                logger.info(f"Downloading {url}")
+                entry = self._store(url, response)
+            return self.object_path(entry["sha256"])
+
+    def remove(self, url: str) -> None:
+        """Removes an archive from the cache, such as a temporary cache once
+        all of its files have been converted.
+
+        Args:
+            url (str): URL of the archive.
+        """
+        with self._lock(url):
+            entry = self.entry(url)
+            self._fetched.pop(url, None)
+            with suppress(FileNotFoundError):
+                os.remove(self._index_path(url))
+            if entry is not None:
+                with suppress(FileNotFoundError):
+                    os.remove(self.object_path(entry["sha256"]))
+
+    def _store(self, url: str, response: Any) -> Dict[str, Any]:
+        sha256 = hashlib.sha256()
+        size = 0
+        with NamedTemporaryFile(dir=os.path.join(self.root, "tmp"),
+                                delete=False) as tmp_file:
+            try:
+                for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+                    sha256.update(chunk)
+                    size += len(chunk)
+                    tmp_file.write(chunk)
+            except BaseException:
+                os.remove(tmp_file.name)
+                raise
+
+        digest = sha256.hexdigest()
+        object_path = self.object_path(digest)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        if os.path.exists(object_path):
+            os.remove(tmp_file.name)
+        else:
+            os.replace(tmp_file.name, object_path)
+
+        entry = {
+            "url": url,
+            "sha256": digest,
+            "size": size,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        self._write_json(self._index_path(url), entry)
+        return entry
+
+    def _write_json(self, path: str, data: Dict[str, Any]) -> None:
+        with NamedTemporaryFile("w",
+                                dir=os.path.join(self.root, "tmp"),
+                                delete=False) as tmp_file:
+            json.dump(data, tmp_file)
+        os.replace(tmp_file.name, path)
@@ -1,32 +1,129 @@
 import logging
+import math
 import os
+import socket
+from contextlib import suppress
+from functools import partial
 from glob import glob
 from subprocess import CalledProcessError, check_output
 from tempfile import TemporaryDirectory
-from urllib.request import urlretrieve
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.request import Request, urlopen, urlretrieve
 from zipfile import ZipFile
 
 import rasterio
+from rasterio.windows import Window
 
+from stactools.worldclim.aggregate import derive_resolutions
+from stactools.worldclim.cache import ArchiveCache
 from stactools.worldclim.constants import (
+    COG_BLOCK_SIZE,
+    CONVERSION_PIXELS_PER_SECOND,
     DATASET_URL_TEMPLATE,
+    INT16_ENCODINGS,
+    INT16_NODATA,
     MONTHLY_DATA_VARIABLES,
     TILING_PIXEL_SIZE,
 )
-from stactools.worldclim.enum import Resolution
+from stactools.worldclim.enum import Encoding, Resolution
+from stactools.worldclim.planner import (
+    DERIVED_RESOLUTIONS,
+    Plan,
+    Shard,
+    WorkUnit,
+    bioclim_units,
+    monthly_units,
+)
+from stactools.worldclim.scheduler import (
+    BudgetScheduler,
+    RetryPolicy,
+    SharedResource,
+    Task,
+    TaskFailure,
+)
+from stactools.worldclim.utils import cog_output_path, file_variable
 
 logger = logging.getLogger(__name__)
 
+# Called with the path of every COG written
+PostHook = Callable[[str], None]
+
+
+def download_convert_monthly_dataset(
+    output_path: str,
+    scratch_dir: Optional[str] = None,
+    scratch_budget: Optional[int] = None,
+    memory_budget: Optional[int] = None,
+    max_workers: int = 1,
+    cache: Optional[ArchiveCache] = None,
+    pixels_per_second: float = CONVERSION_PIXELS_PER_SECOND,
+    shard: Optional[Shard] = None,
+    post_hook: Optional[PostHook] = None,
+    item_directories: bool = False,
+    encoding: Encoding = Encoding.NATIVE,
+    derive: bool = False,
+    retry: Optional[RetryPolicy] = None,
+    failure_report: Optional[str] = None,
+    units: Optional[List[WorkUnit]] = None,
+) -> List[WorkUnit]:
+    """Download and convert all monthly files, largest first
+
+    Each file is extracted from its archive and converted on its own, and
+    every intermediate is deleted as soon as it is no longer needed.
+
+    Args:
+        output_path (str): The directory to which the COGs will be written.
+        scratch_dir (str, optional): Directory for intermediate files.
+            Defaults to the system temporary directory.
+        scratch_budget (int, optional): Maximum bytes of intermediate files
+            on disk at once. Defaults to no limit.
+        memory_budget (int, optional): Maximum bytes of memory used by
+            parallel workers. Defaults to no limit.
+        max_workers (int, optional): Number of files converted concurrently.
+            Defaults to 1.
+        cache (ArchiveCache, optional): Cache of downloaded archives.
+            Defaults to downloading every archive.
+        pixels_per_second (float, optional): Conversion throughput used to
+            order the work.
+        shard (Shard, optional): Only convert the files of this shard.
+            Defaults to all files. Ignored with units, since the failure
+            report of a shard only lists its own files.
+        post_hook (Callable[[str], None], optional): Called with the path
+            of every COG written, e.g. cog_check.assert_cog.
+        item_directories (bool, optional): Write each COG into the
+            directory of its item, as the collection lays them out. Defaults
+            to False.
+        encoding (Encoding, optional): Encoding of the COGs; INT16 quantizes
+            floating point variables to int16 with their scale and offset in
+            INT16_ENCODINGS. Defaults to the native data types.
+        derive (bool, optional): Only download the 30s files and derive the
+            coarser resolutions from them by block-mean aggregation. Defaults
+            to False.
+        retry (RetryPolicy, optional): Retries and timeout of each file, as
+            in download_convert_units.
+        failure_report (str, optional): Keep going past files that fail and
+            write them to this report, as in download_convert_units.
+        units (List[WorkUnit], optional): Only convert these units, e.g. the
+            failed units of a report, instead of every file of the dataset.
 
-def download_convert_monthly_dataset(output_path: str) -> None:
-    with TemporaryDirectory() as tmp_dir:
-        download_monthly_dataset(tmp_dir)
-        convert_monthly_dataset(tmp_dir, output_path)
+    Returns:
+        List[WorkUnit]: The units that failed, only with failure_report.
+    """
+    if units is None:
+        units = monthly_units(derive)
+        if shard is not None:
+            units = shard.select(units)
+    return download_convert_units(units, output_path, scratch_dir,
+                                  scratch_budget, memory_budget, max_workers,
+                                  cache, pixels_per_second, post_hook,
+                                  item_directories, encoding, retry,
+                                  failure_report)
 
 
-def download_monthly_dataset(output_path: str) -> None:
+def download_monthly_dataset(output_path: str, derive: bool = False) -> None:
     logger.info("Download monthly dataset")
-    for res in Resolution:
+    resolutions = [Resolution.THIRTY_SECONDS] if derive else list(Resolution)
+    for res in resolutions:
         res_path = os.path.join(output_path, res.value)
         os.mkdir(res_path)
         for v in MONTHLY_DATA_VARIABLES.keys():
@@ -41,27 +138,87 @@ def download_monthly_dataset(output_path: str) -> None:
                 with ZipFile(tmp_file) as zipfile:
                     logger.info(f"Unzipping {tmp_file}")
                     zipfile.extractall(path=var_path)
+    if derive:
+        derive_dataset(output_path, list(MONTHLY_DATA_VARIABLES.keys()))
 
 
 def convert_monthly_dataset(input_path: str, output_path: str) -> None:
     for file_name in glob(f"{input_path}/**/*.tif", recursive=True):
-        if Resolution.THIRTY_SECONDS.value in file_name:
-            create_tiled_cogs(file_name, output_path)
-        else:
-            out_file_name = os.path.join(output_path,
-                                         os.path.basename(file_name))
-            create_cog(file_name, out_file_name)
+        convert_file(file_name, output_path)
 
 
-def download_convert_bioclim_dataset(output_path: str) -> None:
-    with TemporaryDirectory() as tmp_dir:
-        download_bioclim_dataset(tmp_dir)
-        convert_bioclim_dataset(tmp_dir, output_path)
+def download_convert_bioclim_dataset(
+    output_path: str,
+    scratch_dir: Optional[str] = None,
+    scratch_budget: Optional[int] = None,
+    memory_budget: Optional[int] = None,
+    max_workers: int = 1,
+    cache: Optional[ArchiveCache] = None,
+    pixels_per_second: float = CONVERSION_PIXELS_PER_SECOND,
+    shard: Optional[Shard] = None,
+    post_hook: Optional[PostHook] = None,
+    item_directories: bool = False,
+    encoding: Encoding = Encoding.NATIVE,
+    derive: bool = False,
+    retry: Optional[RetryPolicy] = None,
+    failure_report: Optional[str] = None,
+    units: Optional[List[WorkUnit]] = None,
+) -> List[WorkUnit]:
+    """Download and convert all bioclimatic files, largest first
 
+    Args:
+        output_path (str): The directory to which the COGs will be written.
+        scratch_dir (str, optional): Directory for intermediate files.
+            Defaults to the system temporary directory.
+        scratch_budget (int, optional): Maximum bytes of intermediate files
+            on disk at once. Defaults to no limit.
+        memory_budget (int, optional): Maximum bytes of memory used by
+            parallel workers. Defaults to no limit.
+        max_workers (int, optional): Number of files converted concurrently.
+            Defaults to 1.
+        cache (ArchiveCache, optional): Cache of downloaded archives.
+            Defaults to downloading every archive.
+        pixels_per_second (float, optional): Conversion throughput used to
+            order the work.
+        shard (Shard, optional): Only convert the files of this shard.
+            Defaults to all files. Ignored with units, since the failure
+            report of a shard only lists its own files.
+        post_hook (Callable[[str], None], optional): Called with the path
+            of every COG written, e.g. cog_check.assert_cog.
+        item_directories (bool, optional): Write each COG into the
+            directory of its item, as the collection lays them out. Defaults
+            to False.
+        encoding (Encoding, optional): Encoding of the COGs; INT16 quantizes
+            floating point variables to int16 with their scale and offset in
+            INT16_ENCODINGS. Defaults to the native data types.
+        derive (bool, optional): Only download the 30s files and derive the
+            coarser resolutions from them by block-mean aggregation. Defaults
+            to False.
+        retry (RetryPolicy, optional): Retries and timeout of each file, as
+            in download_convert_units.
+        failure_report (str, optional): Keep going past files that fail and
+            write them to this report, as in download_convert_units.
+        units (List[WorkUnit], optional): Only convert these units, e.g. the
+            failed units of a report, instead of every file of the dataset.
 
-def download_bioclim_dataset(output_path: str) -> None:
+    Returns:
+        List[WorkUnit]: The units that failed, only with failure_report.
+    """
+    if units is None:
+        units = bioclim_units(derive)
+        if shard is not None:
+            units = shard.select(units)
+    return download_convert_units(units, output_path, scratch_dir,
+                                  scratch_budget, memory_budget, max_workers,
+                                  cache, pixels_per_second, post_hook,
+                                  item_directories, encoding, retry,
+                                  failure_report)
+
+
+def download_bioclim_dataset(output_path: str, derive: bool = False) -> None:
     logger.info("Downloading bioclimatic dataset")
-    for res in Resolution:
+    resolutions = [Resolution.THIRTY_SECONDS] if derive else list(Resolution)
+    for res in resolutions:
         res_path = os.path.join(output_path, res.value)
         os.mkdir(res_path)
         url = DATASET_URL_TEMPLATE.format(resolution=res.value, variable="bio")
@@ -73,63 +230,441 @@ def download_bioclim_dataset(output_path: str) -> None:
             with ZipFile(tmp_file) as zipfile:
                 logger.info(f"Unzipping {tmp_file}")
                 zipfile.extractall(path=res_path)
+    if derive:
+        derive_dataset(output_path, [""])
+
+
+def derive_dataset(output_path: str, subdirectories: List[str]) -> None:
+    """Derive the coarser resolutions of downloaded 30s files
+
+    Args:
+        output_path (str): The directory the dataset was downloaded to, with
+            the files of each resolution in a directory named after it.
+        subdirectories (List[str]): Directories of the files within each
+            resolution directory, e.g. one per monthly variable.
+
+    Returns:
+        None
+    """
+    source_path = os.path.join(output_path, Resolution.THIRTY_SECONDS.value)
+    for subdirectory in subdirectories:
+        for file_name in sorted(
+                glob(os.path.join(source_path, subdirectory, "*.tif"))):
+            with TemporaryDirectory(dir=output_path) as tmp_dir:
+                derived_files = derive_resolutions(file_name, tmp_dir,
+                                                   DERIVED_RESOLUTIONS)
+                for res, derived_file in zip(DERIVED_RESOLUTIONS,
+                                             derived_files):
+                    res_path = os.path.join(output_path, res.value,
+                                            subdirectory)
+                    os.makedirs(res_path, exist_ok=True)
+                    os.replace(
+                        derived_file,
+                        os.path.join(res_path,
+                                     os.path.basename(derived_file)))
 
 
 def convert_bioclim_dataset(input_path: str, output_path: str) -> None:
     for file_name in glob(f"{input_path}/**/*.tif", recursive=True):
-        if Resolution.THIRTY_SECONDS.value in file_name:
-            create_tiled_cogs(file_name, output_path)
+        convert_file(file_name, output_path)
+
+
+def convert_file(
+    file_name: str,
+    output_path: str,
+    post_hook: Optional[PostHook] = None,
+    item_directories: bool = False,
+    scratch_dir: Optional[str] = None,
+    encoding: Encoding = Encoding.NATIVE,
+    timeout: Optional[float] = None,
+) -> None:
+    """Convert a WorldClim tif to COG, tiling 30s files
+
+    Args:
+        file_name (str): Path to the World Climate data.
+        output_path (str): The directory to which the COGs will be written.
+        post_hook (Callable[[str], None], optional): Called with the path
+            of every COG written, e.g. cog_check.assert_cog.
+        item_directories (bool, optional): Write each COG into the
+            directory of its item, as the collection lays them out. Defaults
+            to False.
+        scratch_dir (str, optional): Directory for GDAL's temporary files.
+            Defaults to the system temporary directory.
+        encoding (Encoding, optional): Encoding of the COGs; INT16 quantizes
+            floating point variables to int16 with their scale and offset in
+            INT16_ENCODINGS. Defaults to the native data types.
+        timeout (float, optional): Seconds after which a gdal_translate
+            process is killed, raising subprocess.TimeoutExpired. Defaults to
+            no timeout.
+
+    Returns:
+        None
+    """
+    if Resolution.THIRTY_SECONDS.value in file_name:
+        create_tiled_cogs(file_name,
+                          output_path,
+                          post_hook=post_hook,
+                          item_directories=item_directories,
+                          scratch_dir=scratch_dir,
+                          encoding=encoding,
+                          timeout=timeout)
+    else:
+        out_file_name = cog_output_path(output_path,
+                                        os.path.basename(file_name),
+                                        item_directories)
+        create_cog(file_name,
+                   out_file_name,
+                   post_hook=post_hook,
+                   scratch_dir=scratch_dir,
+                   scale_offset=int16_scale_offset(file_name, encoding),
+                   timeout=timeout)
+
+
+def int16_scale_offset(
+    file_name: str,
+    encoding: Encoding = Encoding.NATIVE,
+) -> Optional[Tuple[float, float]]:
+    """Scale and offset of the int16 encoding of a WorldClim file
+
+    Args:
+        file_name (str): Name of the file.
+        encoding (Encoding, optional): The requested encoding.
+
+    Returns:
+        Optional[Tuple[float, float]]: The scale and offset, or None if the
+        file keeps its native data type.
+    """
+    if encoding is Encoding.NATIVE:
+        return None
+    return INT16_ENCODINGS.get(file_variable(file_name))
+
+
+def int16_options(scale: float, offset: float) -> List[str]:
+    """gdal_translate options quantizing to int16 with a scale and offset
+
+    Values map linearly onto -32767 to 32767 and are rounded to the nearest
+    integer; nodata becomes INT16_NODATA.
+
+    Args:
+        scale (float): Scale of the encoding.
+        offset (float): Offset of the encoding.
+
+    Returns:
+        List[str]: The options.
+    """
+    raw_max = -(INT16_NODATA + 1)
+    return [
+        "-ot",
+        "Int16",
+        "-a_nodata",
+        str(INT16_NODATA),
+        "-scale",
+        repr(offset - raw_max * scale),
+        repr(offset + raw_max * scale),
+        str(-raw_max),
+        str(raw_max),
+        "-a_scale",
+        repr(scale),
+        "-a_offset",
+        repr(offset),
+    ]
+
+
+def archive_sizes(
+    units: List[WorkUnit],
+    cache: Optional[ArchiveCache] = None,
+    timeout: Optional[float] = None,
+) -> Dict[str, int]:
+    """Size in bytes of the archives of units of work
+
+    Sizes are read from the cache when possible and from the server
+    otherwise, unless the cache is offline. Archives of unknown size are left
+    out.
+
+    Args:
+        units (List[WorkUnit]): Units of work.
+        cache (ArchiveCache, optional): Cache of downloaded archives.
+        timeout (float, optional): Seconds to wait for the server.
+
+    Returns:
+        Dict[str, int]: Size of each archive by URL.
+    """
+    sizes = {}
+    for url in sorted(set(unit.url for unit in units)):
+        entry = cache.entry(url) if cache is not None else None
+        if entry is not None:
+            size = entry["size"]
+        elif cache is not None and cache.offline:
+            continue
         else:
-            out_file_name = os.path.join(output_path,
-                                         os.path.basename(file_name))
-            create_cog(file_name, out_file_name)
+            size = remote_size(url, timeout)
+        if size is not None:
+            sizes[url] = size
+    return sizes
+
+
+def remote_size(url: str, timeout: Optional[float] = None) -> Optional[int]:
+    """Size in bytes of a remote file, or None if the server doesn't say"""
+    if timeout is None:
+        timeout = socket.getdefaulttimeout()
+    try:
+        with urlopen(Request(url, method="HEAD"),
+                     timeout=timeout) as response:
+            length = response.headers.get("Content-Length")
+    except OSError as e:
+        logger.warning(f"Could not get the size of {url}: {e}")
+        return None
+    return int(length) if length is not None else None
+
+
+def download_convert_units(
+    units: List[WorkUnit],
+    output_path: str,
+    scratch_dir: Optional[str] = None,
+    scratch_budget: Optional[int] = None,
+    memory_budget: Optional[int] = None,
+    max_workers: int = 1,
+    cache: Optional[ArchiveCache] = None,
+    pixels_per_second: float = CONVERSION_PIXELS_PER_SECOND,
+    post_hook: Optional[PostHook] = None,
+    item_directories: bool = False,
+    encoding: Encoding = Encoding.NATIVE,
+    retry: Optional[RetryPolicy] = None,
+    failure_report: Optional[str] = None,
+) -> List[WorkUnit]:
+    """Convert units of work to COGs in the order of their Plan
+
+    Without a cache, archives are downloaded to a temporary cache in the
+    scratch directory, reserved in the scratch budget, and deleted as soon as
+    their last file has been converted.
+
+    Each file is converted in a task of its own, retried after transient
+    download and GDAL errors. Tasks are threads of this process, see
+    BudgetScheduler. With a failure report, a file that still fails with an
+    error does not stop the others, and the failed units are written to the
+    report so that load_failure_report can feed them back in.
+
+    Args:
+        units (List[WorkUnit]): Units of work to convert.
+        output_path (str): The directory to which the COGs will be written.
+        scratch_dir (str, optional): Directory for intermediate files.
+            Defaults to the system temporary directory.
+        scratch_budget (int, optional): Maximum bytes of intermediate files
+            on disk at once. Defaults to no limit.
+        memory_budget (int, optional): Maximum bytes of memory used by
+            parallel workers. Defaults to no limit.
+        max_workers (int, optional): Number of files converted concurrently.
+            Defaults to 1.
+        cache (ArchiveCache, optional): Cache of downloaded archives.
+            Defaults to downloading every archive.
+        pixels_per_second (float, optional): Conversion throughput used to
+            order the work.
+        post_hook (Callable[[str], None], optional): Called with the path
+            of every COG written, e.g. cog_check.assert_cog.
+        item_directories (bool, optional): Write each COG into the
+            directory of its item, as the collection lays them out. Defaults
+            to False.
+        encoding (Encoding, optional): Encoding of the COGs; INT16 quantizes
+            floating point variables to int16 with their scale and offset in
+            INT16_ENCODINGS. Defaults to the native data types.
+        retry (RetryPolicy, optional): Retries after transient errors and
+            timeout of the downloads and GDAL processes of each file.
+            Defaults to no retries and no timeout.
+        failure_report (str, optional): Path of a JSON report of the units
+            that failed. Defaults to raising the first error instead.
+
+    Returns:
+        List[WorkUnit]: The units that failed, only with failure_report.
+    """
+    retry = retry or RetryPolicy()
+    with TemporaryDirectory(dir=scratch_dir) as tmp_dir:
+        resources: Dict[str, SharedResource] = {}
+        if cache is None:
+            archives = ArchiveCache(os.path.join(tmp_dir, "archives"),
+                                    timeout=retry.timeout)
+            plan = Plan(units, max_workers, pixels_per_second,
+                        archive_sizes(units, timeout=retry.timeout))
+            for url, size in plan.archive_bytes.items():
+                resources[url] = SharedResource(os.path.basename(url), size,
+                                                partial(archives.remove, url))
+        else:
+            archives = cache
+            plan = Plan(units, max_workers, pixels_per_second)
+        logger.info(f"Converting {len(units)} files, estimated wall time "
+                    f"{plan.makespan:.0f}s")
+
+        tasks = [
+            Task(
+                name=unit.file_name,
+                run=partial(convert_unit, unit, archives, output_path,
+                            tmp_dir, post_hook, item_directories, encoding,
+                            retry.timeout),
+                scratch_bytes=unit.scratch_bytes,
+                memory_bytes=unit.memory_bytes,
+                resource=resources.get(unit.url),
+            ) for unit in plan.order
+        ]
+        failures = BudgetScheduler(scratch_budget, memory_budget, max_workers,
+                                   retry).run(tasks, failure_report
+                                              is not None)
+    if failure_report is None:
+        return []
+
+    from stactools.worldclim.failures import save_failure_report
+
+    units_by_name = {unit.file_name: unit for unit in units}
+    failed: List[Tuple[WorkUnit, TaskFailure]] = [
+        (units_by_name[failure.task.name], failure) for failure in failures
+    ]
+    save_failure_report(failure_report, failed)
+    return [unit for unit, _ in failed]
+
+
+def convert_unit(
+    unit: WorkUnit,
+    archives: ArchiveCache,
+    output_path: str,
+    scratch_dir: Optional[str] = None,
+    post_hook: Optional[PostHook] = None,
+    item_directories: bool = False,
+    encoding: Encoding = Encoding.NATIVE,
+    timeout: Optional[float] = None,
+) -> None:
+    """Extract one file from its archive and convert it to COGs
+
+    Files of the coarser resolutions the unit derives are aggregated from
+    the extracted file next to it and converted as well.
+
+    Args:
+        unit (WorkUnit): The unit of work.
+        archives (ArchiveCache): Cache to fetch the archive from.
+        output_path (str): The directory to which the COGs will be written.
+        scratch_dir (str, optional): Directory for the extracted file and
+            GDAL's temporary files. Defaults to the system temporary
+            directory.
+        post_hook (Callable[[str], None], optional): Called with the path
+            of every COG written, e.g. cog_check.assert_cog.
+        item_directories (bool, optional): Write each COG into the
+            directory of its item, as the collection lays them out. Defaults
+            to False.
+        encoding (Encoding, optional): Encoding of the COGs; INT16 quantizes
+            floating point variables to int16 with their scale and offset in
+            INT16_ENCODINGS. Defaults to the native data types.
+        timeout (float, optional): Seconds after which a gdal_translate
+            process is killed, raising subprocess.TimeoutExpired. Defaults to
+            no timeout.
+
+    Returns:
+        None
+    """
+    archive = archives.fetch(unit.url)
+    with TemporaryDirectory(dir=scratch_dir) as tmp_dir:
+        with ZipFile(archive) as zipfile:
+            members = [
+                member for member in zipfile.infolist()
+                if os.path.basename(member.filename) == unit.file_name
+            ]
+            if not members:
+                raise FileNotFoundError(
+                    f"{unit.file_name} is not in {unit.url}")
+            logger.info(f"Unzipping {unit.file_name}")
+            file_name = zipfile.extract(members[0], path=tmp_dir)
+        convert_file(file_name, output_path, post_hook, item_directories,
+                     tmp_dir, encoding, timeout)
+        if unit.derived:
+            for derived_file in derive_resolutions(file_name, tmp_dir,
+                                                   unit.derived):
+                convert_file(derived_file, output_path, post_hook,
+                             item_directories, tmp_dir, encoding, timeout)
+
+
+def tile_windows(height: int, width: int) -> List[Tuple[str, Window]]:
+    """Tile suffixes and windows for splitting a raster into tiles
+
+    Tiles are named like gdal_retile.py names them: "_<row>_<col>", counting
+    from 1 and zero padded to the number of digits of the larger tile count.
+
+    Args:
+        height (int): Height of the raster in pixels.
+        width (int): Width of the raster in pixels.
+
+    Returns:
+        List[Tuple[str, Window]]: Suffix and window of each tile.
+    """
+    tile_width, tile_height = TILING_PIXEL_SIZE
+    rows = math.ceil(height / tile_height)
+    cols = math.ceil(width / tile_width)
+    digits = len(str(max(rows, cols)))
+    tiles = []
+    for row in range(rows):
+        for col in range(cols):
+            window = Window(col * tile_width, row * tile_height,
+                            min(tile_width, width - col * tile_width),
+                            min(tile_height, height - row * tile_height))
+            suffix = f"_{row + 1:0{digits}d}_{col + 1:0{digits}d}"
+            tiles.append((suffix, window))
+    return tiles
 
 
 def create_tiled_cogs(
     input_file: str,
     output_directory: str,
     raise_on_fail: bool = True,
+    post_hook: Optional[PostHook] = None,
+    item_directories: bool = False,
+    encoding: Encoding = Encoding.NATIVE,
+    scratch_dir: Optional[str] = None,
+    timeout: Optional[float] = None,
 ) -> None:
     """Split tiff into tiles and create COGs
 
+    Each tile is translated straight from its window of the input file, so
+    no intermediate tiles are written.
+
     Args:
         input_path (str): Path to the World Climate data.
         output_directory (str): The directory to which the COG will be written.
         raise_on_fail (bool, optional): Whether to raise error on failure.
             Defaults to True.
+        post_hook (Callable[[str], None], optional): Called with the path
+            of every COG written, e.g. cog_check.assert_cog.
+        item_directories (bool, optional): Write each COG into the
+            directory of its item, as the collection lays them out. Defaults
+            to False.
+        encoding (Encoding, optional): Encoding of the COGs; INT16 quantizes
+            floating point variables to int16 with their scale and offset in
+            INT16_ENCODINGS. Defaults to the native data types.
+        scratch_dir (str, optional): Directory for GDAL's temporary files.
+            Defaults to the system temporary directory.
+        timeout (float, optional): Seconds after which a gdal_translate
+            process is killed, raising subprocess.TimeoutExpired. Defaults to
+            no timeout.
 
     Returns:
         None
     """
     logger.info(f"Retiling {input_file}")
+    scale_offset = int16_scale_offset(input_file, encoding)
     try:
-        with TemporaryDirectory() as tmp_dir:
-            cmd = [
-                "gdal_retile.py",
-                "-ps",
-                str(TILING_PIXEL_SIZE[0]),
-                str(TILING_PIXEL_SIZE[1]),
-                "-targetDir",
-                tmp_dir,
-                input_file,
-            ]
-            try:
-                output = check_output(cmd)
-            except CalledProcessError as e:
-                output = e.output
-                raise
-            finally:
-                logger.info(f"output: {str(output)}")
-            file_names = glob(f"{tmp_dir}/*.tif")
-            for f in file_names:
-                input_file = os.path.join(tmp_dir, f)
-                output_file = os.path.join(output_directory,
-                                           os.path.basename(f))
-                with rasterio.open(input_file, "r") as dataset:
-                    contains_data = dataset.read().any()
+        base_name = os.path.splitext(os.path.basename(input_file))[0]
+        with rasterio.open(input_file, "r") as dataset:
+            tiles = tile_windows(dataset.height, dataset.width)
+            for suffix, window in tiles:
+                output_file = cog_output_path(output_directory,
+                                              f"{base_name}{suffix}.tif",
+                                              item_directories)
+                contains_data = dataset.read(window=window).any()
                 # Exclude empty files
                 if contains_data:
-                    create_cog(input_file, output_file, raise_on_fail, False)
+                    create_cog(input_file,
+                               output_file,
+                               raise_on_fail,
+                               False,
+                               window=window,
+                               post_hook=post_hook,
+                               scratch_dir=scratch_dir,
+                               scale_offset=scale_offset,
+                               timeout=timeout)
 
     except Exception:
         logger.error("Failed to process {}".format(input_file))
@@ -145,9 +680,17 @@ def create_cog(
     output_path: str,
     raise_on_fail: bool = True,
     dry_run: bool = False,
+    window: Optional[Window] = None,
+    post_hook: Optional[PostHook] = None,
+    scratch_dir: Optional[str] = None,
+    scale_offset: Optional[Tuple[float, float]] = None,
+    timeout: Optional[float] = None,
 ) -> None:
     """Create COG from a tif
 
+    The COG is written next to output_path and renamed into place once
+    complete, so output_path never holds a partial file.
+
     Args:
         input_path (str): Path to World Climate data.
         output_path (str): The path to which the COG will be written.
@@ -155,6 +698,19 @@ def create_cog(
             Defaults to True.
         dry_run (bool, optional): Run without downloading tif, creating COG,
             and writing COG. Defaults to False.
+        window (Window, optional): Only convert this window of the input.
+            Defaults to the whole input.
+        post_hook (Callable[[str], None], optional): Called with the path
+            of every COG written, e.g. cog_check.assert_cog.
+        scratch_dir (str, optional): Directory for GDAL's temporary files,
+            ideally on fast local disk. Defaults to the system temporary
+            directory.
+        scale_offset (Tuple[float, float], optional): Quantize to int16 so
+            that value = raw * scale + offset, recording the scale and offset
+            in the GeoTIFF. Defaults to keeping the input data type.
+        timeout (float, optional): Seconds after which a gdal_translate
+            process is killed, raising subprocess.TimeoutExpired. Defaults to
+            no timeout.
 
     Returns:
         None
@@ -174,7 +730,7 @@ def create_cog(
                 "-co",
                 "NUM_THREADS=ALL_CPUS",
                 "-co",
-                "BLOCKSIZE=512",
+                f"BLOCKSIZE={COG_BLOCK_SIZE}",
                 "-co",
                 "COMPRESS=DEFLATE",
                 "-co",
@@ -183,17 +739,37 @@ def create_cog(
                 "PREDICTOR=YES",
                 "-co",
                 "OVERVIEWS=IGNORE_EXISTING",
-                input_path,
-                output_path,
             ]
+            if window is not None:
+                cmd += [
+                    "-srcwin",
+                    str(window.col_off),
+                    str(window.row_off),
+                    str(window.width),
+                    str(window.height),
+                ]
+            if scale_offset is not None:
+                cmd += int16_options(*scale_offset)
+            if scratch_dir is not None:
+                cmd += ["--config", "CPL_TMPDIR", scratch_dir]
+            directory, base_name = os.path.split(output_path)
+            partial_path = os.path.join(directory, f".{base_name}.partial")
+            cmd += [input_path, partial_path]
+            if directory:
+                os.makedirs(directory, exist_ok=True)
 
             try:
-                output = check_output(cmd)
+                output = check_output(cmd, timeout=timeout)
+                os.replace(partial_path, output_path)
             except CalledProcessError as e:
                 output = e.output
                 raise
             finally:
                 logger.info(f"output: {str(output)}")
+                with suppress(FileNotFoundError):
+                    os.remove(partial_path)
+            if post_hook is not None:
+                post_hook(output_path)
 
     except Exception:
         logger.error("Failed to process {}".format(output_path))
@@ -0,0 +1,241 @@
+import logging
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# TIFF tags read by the checker
+NEW_SUBFILE_TYPE = 254
+IMAGE_WIDTH = 256
+IMAGE_LENGTH = 257
+STRIP_OFFSETS = 273
+TILE_WIDTH = 322
+TILE_LENGTH = 323
+TILE_OFFSETS = 324
+
+# Bit of NewSubfileType marking masks
+TRANSPARENCY_MASK = 4
+
+# struct format of each TIFF field type
+FIELD_FORMATS = {
+    1: "B",
+    3: "H",
+    4: "L",
+    6: "b",
+    8: "h",
+    9: "l",
+    16: "Q",
+    17: "q",
+    18: "Q",
+}
+
+# Largest IFD entry count accepted, against corrupt files
+MAX_IFD_ENTRIES = 1024
+
+
+class IFD:
+    """The tags of one TIFF image file directory that matter for COGs."""
+    def __init__(self, offset: int, tags: Dict[int, Tuple[int, ...]]):
+        self.offset = offset
+        self.tags = tags
+
+    def value(self, tag: int, default: int = 0) -> int:
+        values = self.tags.get(tag)
+        return values[0] if values else default
+
+    @property
+    def width(self) -> int:
+        return self.value(IMAGE_WIDTH)
+
+    @property
+    def height(self) -> int:
+        return self.value(IMAGE_LENGTH)
+
+    @property
+    def is_tiled(self) -> bool:
+        return TILE_WIDTH in self.tags and TILE_OFFSETS in self.tags
+
+    @property
+    def is_mask(self) -> bool:
+        return bool(self.value(NEW_SUBFILE_TYPE) & TRANSPARENCY_MASK)
+
+    @property
+    def data_offsets(self) -> List[int]:
+        """Offsets of the tiles or strips, without the empty ones."""
+        offsets = self.tags.get(TILE_OFFSETS, self.tags.get(STRIP_OFFSETS))
+        return [offset for offset in offsets or () if offset > 0]
+
+
+def read_ifds(f: BinaryIO) -> List[IFD]:
+    """Reads the IFDs of a classic or Big TIFF file, without its image data.
+
+    Args:
+        f (BinaryIO): The file, opened in binary mode.
+
+    Returns:
+        List[IFD]: The IFDs in file order.
+    """
+    header = f.read(16)
+    if header[:2] == b"II":
+        endian = "<"
+    elif header[:2] == b"MM":
+        endian = ">"
+    else:
+        raise ValueError("Not a TIFF file")
+    magic = struct.unpack(f"{endian}H", header[2:4])[0]
+    if magic == 42:
+        count_format, offset_format, entry_size = "H", "L", 12
+        next_offset = struct.unpack(f"{endian}L", header[4:8])[0]
+    elif magic == 43:
+        count_format, offset_format, entry_size = "Q", "Q", 20
+        next_offset = struct.unpack(f"{endian}Q", header[8:16])[0]
+    else:
+        raise ValueError("Not a TIFF file")
+    offset_size = struct.calcsize(f"{endian}{offset_format}")
+    count_size = struct.calcsize(f"{endian}{count_format}")
+
+    ifds: List[IFD] = []
+    seen = set()
+    while next_offset and next_offset not in seen:
+        seen.add(next_offset)
+        f.seek(next_offset)
+        count = struct.unpack(f"{endian}{count_format}", f.read(count_size))[0]
+        if count > MAX_IFD_ENTRIES:
+            raise ValueError(f"Corrupt IFD at offset {next_offset}")
+        entries = f.read(count * entry_size + offset_size)
+        tags = {}
+        for i in range(count):
+            entry = entries[i * entry_size:(i + 1) * entry_size]
+            tag, field_type = struct.unpack(f"{endian}HH", entry[:4])
+            value_format = FIELD_FORMATS.get(field_type)
+            if value_format is None:
+                continue
+            n = struct.unpack(f"{endian}{offset_format}",
+                              entry[4:4 + offset_size])[0]
+            size = n * struct.calcsize(f"{endian}{value_format}")
+            if size <= offset_size:
+                data = entry[4 + offset_size:4 + offset_size + size]
+            else:
+                value_offset = struct.unpack(f"{endian}{offset_format}",
+                                             entry[4 + offset_size:])[0]
+                position = f.tell()
+                f.seek(value_offset)
+                data = f.read(size)
+                f.seek(position)
+            tags[tag] = struct.unpack(f"{endian}{n}{value_format}", data)
+        ifds.append(IFD(next_offset, tags))
+        next_offset = struct.unpack(f"{endian}{offset_format}",
+                                    entries[-offset_size:])[0]
+    return ifds
+
+
+def check_cog(path: str) -> List[str]:
+    """Checks that a file is a cloud optimized GeoTIFF from its IFDs only.
+
+    The checks follow GDAL's COG layout: the main image is tiled, images
+    larger than one tile have overviews of decreasing size, every IFD comes
+    before the image data, the data of smaller overviews comes before the
+    data of larger ones, and the tiles of each image are in order.
+
+    Args:
+        path (str): Path of the file.
+
+    Returns:
+        List[str]: Problems found, empty if the file is a valid COG.
+    """
+    try:
+        with open(path, "rb") as f:
+            ifds = read_ifds(f)
+    except (OSError, ValueError, struct.error) as e:
+        return [f"Could not read TIFF structure: {e}"]
+    images = [ifd for ifd in ifds if not ifd.is_mask]
+    if not images:
+        return ["No image in file"]
+
+    errors = []
+    main, overviews = images[0], images[1:]
+    if not main.is_tiled:
+        errors.append("Main image is not tiled")
+        return errors
+    tile_width = main.value(TILE_WIDTH)
+    tile_height = main.value(TILE_LENGTH)
+    if (main.width > tile_width or main.height > tile_height) and not overviews:
+        errors.append(f"{main.width}x{main.height} image larger than a "
+                      f"{tile_width}x{tile_height} tile has no overviews")
+
+    previous = main
+    for i, overview in enumerate(overviews, start=1):
+        if not overview.is_tiled:
+            errors.append(f"Overview {i} is not tiled")
+        if (overview.width >= previous.width
+                or overview.height >= previous.height):
+            errors.append(f"Overview {i} is not smaller than the image "
+                          "before it")
+        previous = overview
+
+    first_data = min(
+        (offset for ifd in ifds for offset in ifd.data_offsets),
+        default=None,
+    )
+    if first_data is not None and any(ifd.offset > first_data
+                                      for ifd in ifds):
+        errors.append("IFDs are not all before the image data")
+
+    for i, ifd in enumerate(images):
+        offsets = ifd.data_offsets
+        if offsets != sorted(offsets):
+            errors.append(f"Tiles of image {i} are not in order")
+    for i in range(len(images) - 1):
+        larger = images[i].data_offsets
+        smaller = images[i + 1].data_offsets
+        if larger and smaller and min(larger) < max(smaller):
+            errors.append(f"Data of image {i} is not after the data of "
+                          f"image {i + 1}")
+    return errors
+
+
+def assert_cog(path: str) -> None:
+    """Raises a ValueError if a file is not a valid COG.
+
+    Suitable as the post_hook of create_cog and the conversion pipeline.
+
+    Args:
+        path (str): Path of the file.
+    """
+    errors = check_cog(path)
+    if errors:
+        raise ValueError(f"{path} is not a valid COG: {'; '.join(errors)}")
+
+
+def find_tiffs(directory: str) -> List[str]:
+    """Every .tif file under a directory, sorted."""
+    return sorted(
+        glob(os.path.join(directory, "**", "*.tif"), recursive=True))
+
+
+def check_cogs(
+    paths: Iterable[str],
+    max_workers: Optional[int] = None,
+) -> Dict[str, List[str]]:
+    """Checks many files in parallel.
+
+    Args:
+        paths (Iterable[str]): Paths of the files.
+        max_workers (int, optional): Number of threads. Defaults to the
+            ThreadPoolExecutor default.
+
+    Returns:
+        Dict[str, List[str]]: Problems of each invalid file, by path.
+    """
+    paths = list(paths)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(check_cog, paths)
+        failures = {
+            path: errors
+            for path, errors in zip(paths, results) if errors
+        }
+    logger.info(f"{len(failures)} of {len(paths)} files are not valid COGs")
+    return failures
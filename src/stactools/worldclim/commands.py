@@ -1,15 +1,388 @@
 import logging
 import os
-import shutil
-from glob import glob
+from contextlib import contextmanager
+from functools import partial
+from tempfile import TemporaryDirectory
+from typing import TYPE_CHECKING, Callable, Iterator, List, Optional, Tuple
 
 import click
 
-from stactools.worldclim import cog, stac
-from stactools.worldclim.constants import MONTHLY_DATA_VARIABLES
+from stactools.worldclim.constants import (
+    CONVERSION_PIXELS_PER_SECOND,
+    MONTHLY_DATA_VARIABLES,
+    RETRIES,
+    RETRY_BACKOFF_SECONDS,
+    UPLOAD_WORKERS,
+)
+from stactools.worldclim.enum import Encoding, Resolution, StatisticsMode
+from stactools.worldclim.planner import Shard
+from stactools.worldclim.scheduler import RetryPolicy, parse_size
+
+if TYPE_CHECKING:
+    from pystac import Collection, Item
+
+    from stactools.worldclim.cache import ArchiveCache
+    from stactools.worldclim.planner import WorkUnit
+    from stactools.worldclim.storage import StagedItems, Uploader
+
+# The cog and stac modules import rasterio, shapely and pystac, so commands
+# import them when they run rather than when the CLI starts.
 
 logger = logging.getLogger(__name__)
 
+statistics_option = click.option(
+    "-s",
+    "--statistics",
+    type=click.Choice([mode.value for mode in StatisticsMode]),
+    default=None,
+    help="Add raster band statistics and histograms to the assets",
+)
+
+footprint_option = click.option(
+    "--footprint",
+    is_flag=True,
+    default=False,
+    help="Use the outline of the valid data as the item geometry instead of "
+    "the bounds, traced from the smallest overview",
+)
+
+compact_option = click.option(
+    "--compact",
+    is_flag=True,
+    default=False,
+    help="Only keep the projection fields at the item level, identifying "
+    "the CRS by code without proj:wkt2, for much smaller item JSON",
+)
+
+thumbnail_option = click.option(
+    "--thumbnails",
+    type=click.Choice(["png", "webp"]),
+    default=None,
+    help="Add a colormapped thumbnail asset of this format to every item, "
+    "rendered from the smallest overview",
+)
+
+
+def budget_options(function):
+    """Adds the scratch directory, scratch disk, memory and worker options of
+    the download and convert pipeline."""
+    function = click.option(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of files converted concurrently",
+    )(function)
+    function = click.option(
+        "--memory-budget",
+        default=None,
+        help="Maximum memory used by parallel workers, e.g. 8G",
+    )(function)
+    function = click.option(
+        "--scratch-dir",
+        default=None,
+        help="Directory for intermediate files, ideally on fast local disk. "
+        "Defaults to the system temporary directory",
+    )(function)
+    function = click.option(
+        "--scratch-budget",
+        default=None,
+        help="Maximum intermediate files on disk at once, e.g. 50G",
+    )(function)
+    return function
+
+
+def cache_options(function):
+    """Adds the archive cache options of the download and convert pipeline."""
+    function = click.option(
+        "--offline",
+        is_flag=True,
+        default=False,
+        help="Only use archives already in the cache",
+    )(function)
+    function = click.option(
+        "--cache-dir",
+        default=None,
+        help="Directory of a persistent cache of downloaded archives",
+    )(function)
+    return function
+
+
+def plan_options(function):
+    """Adds the planning options of the download and convert pipeline."""
+    function = click.option(
+        "--pixels-per-second",
+        type=float,
+        default=CONVERSION_PIXELS_PER_SECOND,
+        show_default=True,
+        help="Conversion throughput of one worker, used to order work",
+    )(function)
+    function = click.option(
+        "--plan",
+        is_flag=True,
+        default=False,
+        help="Print the task graph, expected scratch usage and estimated "
+        "wall time, and exit without converting anything",
+    )(function)
+    return function
+
+
+def failure_options(function):
+    """Adds the retry, timeout and failure report options of the download
+    and convert pipeline."""
+    function = click.option(
+        "--retry-failed",
+        default=None,
+        help="Only convert the files listed in a failure report of an "
+        "earlier run. With --shard, give the same shard as that run",
+    )(function)
+    function = click.option(
+        "--failure-report",
+        default=None,
+        help="Keep going when files fail after their retries, list them in "
+        "this JSON report and exit with an error before creating items",
+    )(function)
+    function = click.option(
+        "--task-timeout",
+        type=float,
+        default=None,
+        help="Seconds after which a stalled download or gdal_translate of a "
+        "file fails with a transient error. Other steps, which run in this "
+        "process, are not interrupted",
+    )(function)
+    function = click.option(
+        "--retry-backoff",
+        type=float,
+        default=RETRY_BACKOFF_SECONDS,
+        show_default=True,
+        help="Seconds before the first retry, doubled before each next one",
+    )(function)
+    function = click.option(
+        "--retries",
+        type=click.IntRange(min=0),
+        default=RETRIES,
+        show_default=True,
+        help="Times a file is converted again after a transient download or "
+        "GDAL error",
+    )(function)
+    return function
+
+
+shard_option = click.option(
+    "--shard",
+    default=None,
+    help="Only process shard I of N, e.g. 2/8. Shards partition the work "
+    "deterministically and are assembled with the merge command",
+)
+
+check_option = click.option(
+    "--check-cogs",
+    is_flag=True,
+    default=False,
+    help="Check the structure of every COG as it is written, and fail on "
+    "the first that is not a valid COG",
+)
+
+encoding_option = click.option(
+    "--encoding",
+    type=click.Choice([encoding.value for encoding in Encoding]),
+    default=Encoding.NATIVE.value,
+    show_default=True,
+    help="Data type of the COGs. int16 quantizes floating point variables "
+    "with a per variable scale and offset, halving their size",
+)
+
+derive_option = click.option(
+    "--derive",
+    is_flag=True,
+    default=False,
+    help="Only download the 30s archives and derive the 2.5m, 5m and 10m "
+    "files from them by block-mean aggregation",
+)
+
+validate_option = click.option(
+    "--validate/--no-validate",
+    default=True,
+    show_default=True,
+    help="Validate the items and collection against their JSON schemas, "
+    "which are fetched from the network",
+)
+
+upload_option = click.option(
+    "--upload-workers",
+    type=int,
+    default=UPLOAD_WORKERS,
+    show_default=True,
+    help="Number of files uploaded concurrently when the destination is an "
+    "object storage URL",
+)
+
+
+def _post_hook(
+    check_cogs: bool,
+    uploader: Optional["Uploader"] = None,
+    staged_items: Optional["StagedItems"] = None,
+) -> Optional[Callable[[str], None]]:
+    hooks: List[Callable[[str], None]] = []
+    if check_cogs:
+        from stactools.worldclim.cog_check import assert_cog
+
+        hooks.append(assert_cog)
+    if staged_items is not None:
+        hooks.append(staged_items.add)
+    elif uploader is not None:
+        hooks.append(partial(uploader.upload, remove=True))
+    if not hooks:
+        return None
+
+    def post_hook(path: str) -> None:
+        for hook in hooks:
+            hook(path)
+
+    return post_hook
+
+
+def _staged_items(
+    uploader: Optional["Uploader"],
+    create_item: Callable[[List[str]], "Item"],
+    cogs_per_item: int,
+    thumbnails: Optional[str],
+) -> Optional["StagedItems"]:
+    """Creates the items of an object storage destination, with their
+    thumbnails, as soon as their COGs are staged."""
+    if uploader is None:
+        return None
+    from stactools.worldclim.storage import StagedItems
+
+    def create(paths: List[str]) -> "Item":
+        item = create_item(paths)
+        if thumbnails is not None:
+            from stactools.worldclim.thumbnail import add_thumbnail
+
+            add_thumbnail(item, image_format=thumbnails)
+        return item
+
+    return StagedItems(uploader, create, cogs_per_item)
+
+
+@contextmanager
+def _output_directory(
+    destination: str,
+    scratch_dir: Optional[str],
+    upload_workers: int,
+) -> Iterator[Tuple[str, Optional["Uploader"]]]:
+    """The local directory to write to, and an uploader mirroring it to the
+    destination if the destination is a URL such as s3://bucket/worldclim."""
+    if "://" not in destination:
+        yield destination, None
+        return
+    from stactools.worldclim.storage import Uploader
+
+    # COGs are staged in the scratch directory, and each is uploaded and
+    # removed as soon as it is written, or its item is created
+    with TemporaryDirectory(dir=scratch_dir) as staging_dir:
+        with Uploader(staging_dir, destination, upload_workers) as uploader:
+            yield staging_dir, uploader
+
+
+def _save_index(collection: "Collection", directory: str,
+                uploader: Optional["Uploader"]) -> None:
+    """Saves the item index of a collection next to its JSON."""
+    from stactools.worldclim.index import INDEX_FILE_NAME, ItemIndex
+
+    path = os.path.join(directory, INDEX_FILE_NAME)
+    ItemIndex.from_items(collection.get_items(recursive=True)).save(
+        path, uploader.url_for(path) if uploader is not None else None)
+    if uploader is not None:
+        uploader.upload(path)
+
+
+def _bbox(bbox: Optional[str]) -> Optional[List[float]]:
+    if bbox is None:
+        return None
+    try:
+        bounds = [float(value) for value in bbox.split(",")]
+    except ValueError:
+        bounds = []
+    if len(bounds) != 4:
+        raise click.BadParameter("Expected west,south,east,north",
+                                 param_hint="--bbox")
+    return bounds
+
+
+def _shard(shard: Optional[str]) -> Optional[Shard]:
+    if shard is None:
+        return None
+    try:
+        return Shard.parse(shard)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--shard")
+
+
+def _print_plan(dataset: str,
+                workers: int,
+                pixels_per_second: float,
+                cache: Optional["ArchiveCache"],
+                shard: Optional[Shard],
+                derive: bool = False,
+                units: Optional[List["WorkUnit"]] = None) -> None:
+    from stactools.worldclim.cog import archive_sizes
+    from stactools.worldclim.planner import Plan, bioclim_units, monthly_units
+
+    if units is None:
+        units = (monthly_units(derive)
+                 if dataset == "monthly" else bioclim_units(derive))
+        if shard is not None:
+            units = shard.select(units)
+    plan = Plan(units,
+                workers,
+                pixels_per_second,
+                archive_sizes(units, cache),
+                archives_in_scratch=cache is None)
+    click.echo(plan.describe())
+
+
+def _archive_cache(cache_dir: Optional[str],
+                   offline: bool,
+                   timeout: Optional[float] = None) -> Optional["ArchiveCache"]:
+    if cache_dir is None:
+        if offline:
+            raise click.UsageError("--offline requires --cache-dir")
+        return None
+    from stactools.worldclim.cache import ArchiveCache
+    return ArchiveCache(cache_dir, offline=offline, timeout=timeout)
+
+
+def _failed_units(retry_failed: Optional[str]) -> Optional[List["WorkUnit"]]:
+    if retry_failed is None:
+        return None
+    from stactools.worldclim.failures import load_failure_report
+
+    try:
+        return load_failure_report(retry_failed)
+    except (OSError, ValueError, KeyError) as e:
+        raise click.BadParameter(str(e), param_hint="--retry-failed")
+
+
+def _check_failures(failed: List["WorkUnit"],
+                    failure_report: Optional[str]) -> None:
+    if failed:
+        raise click.ClickException(
+            f"{len(failed)} files failed, see {failure_report}. Convert them "
+            f"again with --retry-failed {failure_report}")
+
+
+def _size(size: Optional[str]) -> Optional[int]:
+    if size is None:
+        return None
+    return parse_size(size)
+
+
+def _statistics_mode(statistics: Optional[str]) -> Optional[StatisticsMode]:
+    if statistics is None:
+        return None
+    return StatisticsMode(statistics)
+
 
 def create_worldclim_command(cli):
     """Creates the stactools-worldclim command line utility."""
@@ -28,16 +401,71 @@ def create_worldclim_command(cli):
         "-d",
         "--destination",
         required=True,
-        help="The output directory for the STAC json",
+        help="The output directory, or an fsspec URL such as "
+        "s3://bucket/worldclim to upload to",
     )
-    def create_all_monthly_cogs(destination: str):
+    @budget_options
+    @cache_options
+    @plan_options
+    @shard_option
+    @check_option
+    @upload_option
+    @encoding_option
+    @derive_option
+    @failure_options
+    def create_all_monthly_cogs(
+        destination: str,
+        scratch_dir: Optional[str],
+        scratch_budget: Optional[str],
+        memory_budget: Optional[str],
+        workers: int,
+        cache_dir: Optional[str],
+        offline: bool,
+        plan: bool,
+        pixels_per_second: float,
+        shard: Optional[str],
+        check_cogs: bool,
+        upload_workers: int,
+        encoding: str,
+        derive: bool,
+        retries: int,
+        retry_backoff: float,
+        task_timeout: Optional[float],
+        failure_report: Optional[str],
+        retry_failed: Optional[str],
+    ):
         """Creates a STAC Item
         Args:
             source (str): HREF of the Asset associated with the Item
             destination (str): An HREF for the STAC Collection
         """
+        cache = _archive_cache(cache_dir, offline, task_timeout)
+        units = _failed_units(retry_failed)
+        if plan:
+            _print_plan("monthly", workers, pixels_per_second, cache,
+                        _shard(shard), derive, units)
+            return
+
+        from stactools.worldclim import cog
 
-        cog.download_convert_monthly_dataset(destination)
+        with _output_directory(destination, scratch_dir,
+                               upload_workers) as (output_dir, uploader):
+            failed = cog.download_convert_monthly_dataset(
+                output_dir,
+                scratch_dir=scratch_dir,
+                scratch_budget=_size(scratch_budget),
+                memory_budget=_size(memory_budget),
+                max_workers=workers,
+                cache=cache,
+                pixels_per_second=pixels_per_second,
+                shard=_shard(shard),
+                post_hook=_post_hook(check_cogs, uploader),
+                encoding=Encoding(encoding),
+                derive=derive,
+                retry=RetryPolicy(retries, retry_backoff, task_timeout),
+                failure_report=failure_report,
+                units=units)
+            _check_failures(failed, failure_report)
 
     @worldclim.command(
         "create-all-bioclim-cogs",
@@ -47,16 +475,71 @@ def create_worldclim_command(cli):
         "-d",
         "--destination",
         required=True,
-        help="The output directory for the STAC json",
+        help="The output directory, or an fsspec URL such as "
+        "s3://bucket/worldclim to upload to",
     )
-    def create_all_bioclim_cogs(destination: str):
+    @budget_options
+    @cache_options
+    @plan_options
+    @shard_option
+    @check_option
+    @upload_option
+    @encoding_option
+    @derive_option
+    @failure_options
+    def create_all_bioclim_cogs(
+        destination: str,
+        scratch_dir: Optional[str],
+        scratch_budget: Optional[str],
+        memory_budget: Optional[str],
+        workers: int,
+        cache_dir: Optional[str],
+        offline: bool,
+        plan: bool,
+        pixels_per_second: float,
+        shard: Optional[str],
+        check_cogs: bool,
+        upload_workers: int,
+        encoding: str,
+        derive: bool,
+        retries: int,
+        retry_backoff: float,
+        task_timeout: Optional[float],
+        failure_report: Optional[str],
+        retry_failed: Optional[str],
+    ):
         """Creates a STAC Item
         Args:
             source (str): HREF of the Asset associated with the Item
             destination (str): An HREF for the STAC Collection
         """
+        cache = _archive_cache(cache_dir, offline, task_timeout)
+        units = _failed_units(retry_failed)
+        if plan:
+            _print_plan("bioclim", workers, pixels_per_second, cache,
+                        _shard(shard), derive, units)
+            return
+
+        from stactools.worldclim import cog
 
-        cog.download_convert_bioclim_dataset(destination)
+        with _output_directory(destination, scratch_dir,
+                               upload_workers) as (output_dir, uploader):
+            failed = cog.download_convert_bioclim_dataset(
+                output_dir,
+                scratch_dir=scratch_dir,
+                scratch_budget=_size(scratch_budget),
+                memory_budget=_size(memory_budget),
+                max_workers=workers,
+                cache=cache,
+                pixels_per_second=pixels_per_second,
+                shard=_shard(shard),
+                post_hook=_post_hook(check_cogs, uploader),
+                encoding=Encoding(encoding),
+                derive=derive,
+                retry=RetryPolicy(retries, retry_backoff, task_timeout),
+                failure_report=failure_report,
+                units=units)
+            _check_failures(failed, failure_report)
 
     @worldclim.command(
         "create-monthly-collection",
@@ -73,6 +556,7 @@ def create_worldclim_command(cli):
         Args:
             destination (str): An HREF for the Collection JSON
         """
+        from stactools.worldclim import stac
         collection = stac.create_monthly_collection()
 
         collection.set_self_href(os.path.join(destination, "collection.json"))
@@ -97,6 +581,7 @@ def create_worldclim_command(cli):
         Args:
             destination (str): An HREF for the Collection JSON
         """
+        from stactools.worldclim import stac
         collection = stac.create_monthly_collection()
 
         collection.set_self_href(os.path.join(destination, "collection.json"))
@@ -121,6 +606,7 @@ def create_worldclim_command(cli):
         Args:
             destination (str): An HREF for the Collection JSON
         """
+        from stactools.worldclim import stac
         collection = stac.create_bioclim_collection()
 
         collection.set_self_href(os.path.join(destination, "collection.json"))
@@ -146,14 +632,37 @@ def create_worldclim_command(cli):
         required=True,
         help="Location of a directory contining the cogs",
     )
-    def create_monthly_item_command(destination: str, cog: str):
+    @statistics_option
+    @footprint_option
+    @compact_option
+    @click.option(
+        "--encoding",
+        type=click.Choice([encoding.value for encoding in Encoding]),
+        default=None,
+        help="Data type the COGs were converted with. Defaults to the data "
+        "type of the given COG, which is never int16 for prec and srad",
+    )
+    def create_monthly_item_command(destination: str, cog: str,
+                                    statistics: Optional[str],
+                                    footprint: bool, compact: bool,
+                                    encoding: Optional[str]):
         """Creates a STAC Item
         Args:
             destination (str): Output directory
             cog (str): HREF to the Asset COG
+            statistics (str, optional): Statistics mode for raster bands
+            footprint (bool): Whether to use data footprints as geometries
+            compact (bool): Whether to only keep projection fields on the item
+            encoding (str, optional): Encoding of the COGs
         """
+        from stactools.worldclim import stac
 
-        item = stac.create_monthly_item(cog)
+        item = stac.create_monthly_item(
+            cog,
+            statistics=_statistics_mode(statistics),
+            footprint=footprint,
+            compact=compact,
+            encoding=Encoding(encoding) if encoding is not None else None)
         item.save_object(dest_href=os.path.join(
             destination,
             os.path.basename(cog).replace(".tif", ".json")))
@@ -177,13 +686,25 @@ def create_worldclim_command(cli):
         required=True,
         help="Location of a directory contining the cogs",
     )
-    def create_bioclim_item_command(destination: str, cog: str):
+    @statistics_option
+    @footprint_option
+    @compact_option
+    def create_bioclim_item_command(destination: str, cog: str,
+                                    statistics: Optional[str],
+                                    footprint: bool, compact: bool):
         """Creates a STAC Item
         Args:
             destination (str): An HREF for the STAC Collection
             cog (str): HREF to the Asset COG
+            statistics (str, optional): Statistics mode for raster bands
+            footprint (bool): Whether to use data footprints as geometries
+            compact (bool): Whether to only keep projection fields on the item
         """
-        item = stac.create_bioclim_item(cog)
+        from stactools.worldclim import stac
+        item = stac.create_bioclim_item(cog,
+                                        statistics=_statistics_mode(statistics),
+                                        footprint=footprint,
+                                        compact=compact)
         item.save_object(dest_href=os.path.join(
             destination,
             os.path.basename(cog).replace(".tif", ".json")))
@@ -200,33 +721,174 @@ def create_worldclim_command(cli):
         "-d",
         "--destination",
         required=True,
-        help="The output directory for the STAC json",
+        help="The output directory, or an fsspec URL such as "
+        "s3://bucket/worldclim to upload to",
     )
-    def create_full_monthly__collection(destination: str):
+    @statistics_option
+    @footprint_option
+    @compact_option
+    @thumbnail_option
+    @budget_options
+    @cache_options
+    @plan_options
+    @shard_option
+    @check_option
+    @upload_option
+    @encoding_option
+    @derive_option
+    @validate_option
+    @failure_options
+    def create_full_monthly__collection(destination: str,
+                                        statistics: Optional[str],
+                                        footprint: bool,
+                                        compact: bool,
+                                        thumbnails: Optional[str],
+                                        scratch_dir: Optional[str],
+                                        scratch_budget: Optional[str],
+                                        memory_budget: Optional[str],
+                                        workers: int,
+                                        cache_dir: Optional[str],
+                                        offline: bool,
+                                        plan: bool,
+                                        pixels_per_second: float,
+                                        shard: Optional[str],
+                                        check_cogs: bool,
+                                        upload_workers: int,
+                                        encoding: str,
+                                        derive: bool,
+                                        validate: bool,
+                                        retries: int,
+                                        retry_backoff: float,
+                                        task_timeout: Optional[float],
+                                        failure_report: Optional[str],
+                                        retry_failed: Optional[str]):
         """Creates a STAC Collection and all of its Items and Assets
+
+        With --shard, only the items of the shard are created and saved, and
+        the merge command assembles the collection once every shard is done.
+
         Args:
             destination (str): An HREF for the STAC Collection
+            statistics (str, optional): Statistics mode for raster bands
+            footprint (bool): Whether to use data footprints as geometries
+            compact (bool): Whether to only keep projection fields on items
+            thumbnails (str, optional): Format of the thumbnails to add
+            shard (str, optional): Shard to process, as "i/N"
+            check_cogs (bool): Whether to check every COG as it is written
+            upload_workers (int): Number of files uploaded concurrently to an
+                object storage destination
+            encoding (str): "native", or "int16" to quantize floating point
+                variables
+            derive (bool): Whether to derive the coarser resolutions from
+                the 30s files instead of downloading them
+            validate (bool): Whether to validate the items and collection
+            retries (int): Times a file is retried after a transient error
+            retry_backoff (float): Seconds before the first retry
+            task_timeout (float, optional): Timeout of downloads and GDAL
+            failure_report (str, optional): Path of the failure report
+            retry_failed (str, optional): Failure report of the files to
+                convert again
         """
-        os.chdir(destination)
+        cache = _archive_cache(cache_dir, offline, task_timeout)
+        worker_shard = _shard(shard)
+        units = _failed_units(retry_failed)
+        if plan:
+            _print_plan("monthly", workers, pixels_per_second, cache,
+                        worker_shard, derive, units)
+            return
+
+        if worker_shard is not None and "://" in destination:
+            raise click.BadParameter(
+                "Shards can only be written to a local destination",
+                param_hint="--shard")
+        if units is not None and "://" in destination:
+            # The COGs of the earlier run are not in the staging directory,
+            # so the published collection would only keep the retried items
+            raise click.BadParameter(
+                "Failed files can only be retried into a local destination",
+                param_hint="--retry-failed")
+
+        from stactools.worldclim import cog, stac
+
         collection = stac.create_monthly_collection()
-        collection.normalize_hrefs("./")
-        collection.save(dest_href="./")
-        cog.download_convert_monthly_dataset("./")
-        for file_name in glob("./*tmin*.tif"):
-            logger.info(f"Processing {file_name}")
-            id = stac.create_monthly_item(file_name).id
-            os.makedirs(id, exist_ok=True)
-            for data_var in MONTHLY_DATA_VARIABLES.keys():
-                var_file_name = file_name.replace("tmin", data_var)
-                shutil.move(var_file_name, os.path.join(id, var_file_name))
-            item = stac.create_monthly_item(os.path.join(id, file_name))
-            collection.add_item(item)
-            item.validate()
-        logger.info("Saving collection")
-        collection.normalize_hrefs("./")
-        collection.make_all_asset_hrefs_relative()
-        collection.save(dest_href="./")
-        collection.validate()
+        with _output_directory(destination, scratch_dir,
+                               upload_workers) as (output_dir, uploader):
+            if worker_shard is None:
+                # COGs are written straight into their item directories
+                cog_directory = output_dir
+                if uploader is None:
+                    collection.normalize_hrefs(destination)
+                    collection.save(dest_href=destination)
+            else:
+                # Shards may share the destination, so each converts into its
+                # own directory, from which its COGs are renamed into place
+                cog_directory = os.path.join(destination, worker_shard.name)
+                os.makedirs(cog_directory, exist_ok=True)
+            staged_items = _staged_items(
+                uploader, lambda paths: stac.create_monthly_item(
+                    paths[0],
+                    statistics=_statistics_mode(statistics),
+                    footprint=footprint,
+                    compact=compact,
+                    encoding=Encoding(encoding)), len(MONTHLY_DATA_VARIABLES),
+                thumbnails)
+            failed = cog.download_convert_monthly_dataset(
+                cog_directory,
+                scratch_dir=scratch_dir,
+                scratch_budget=_size(scratch_budget),
+                memory_budget=_size(memory_budget),
+                max_workers=workers,
+                cache=cache,
+                pixels_per_second=pixels_per_second,
+                shard=worker_shard,
+                post_hook=_post_hook(check_cogs, uploader, staged_items),
+                item_directories=worker_shard is None,
+                encoding=Encoding(encoding),
+                derive=derive,
+                retry=RetryPolicy(retries, retry_backoff, task_timeout),
+                failure_report=failure_report,
+                units=units)
+            _check_failures(failed, failure_report)
+            if staged_items is not None:
+                items = staged_items.items
+            else:
+                items = stac.create_monthly_items(
+                    cog_directory,
+                    output_dir,
+                    statistics=_statistics_mode(statistics),
+                    footprint=footprint,
+                    compact=compact,
+                    encoding=Encoding(encoding))
+                if thumbnails is not None:
+                    from stactools.worldclim.thumbnail import add_thumbnails
+
+                    add_thumbnails(items,
+                                   image_format=thumbnails,
+                                   max_workers=workers)
+            if validate:
+                for item in items:
+                    item.validate()
+
+            if worker_shard is not None:
+                from stactools.worldclim.shard import save_shard
+
+                os.rmdir(cog_directory)
+                save_shard(collection, items, destination, worker_shard)
+                return
+
+            collection.add_items(items)
+            if uploader is not None:
+                from stactools.worldclim.storage import publish_collection
+
+                publish_collection(collection, uploader)
+            else:
+                logger.info("Saving collection")
+                collection.normalize_hrefs(destination)
+                collection.make_all_asset_hrefs_relative()
+                collection.save(dest_href=destination)
+            _save_index(collection, output_dir, uploader)
+        if validate:
+            collection.validate()
 
     @worldclim.command(
         "create-full-bioclim-collection",
@@ -236,32 +898,460 @@ def create_worldclim_command(cli):
         "-d",
         "--destination",
         required=True,
-        help="The output directory for the STAC json",
+        help="The output directory, or an fsspec URL such as "
+        "s3://bucket/worldclim to upload to",
     )
-    def create_full_bioclim__collection(destination: str):
+    @statistics_option
+    @footprint_option
+    @compact_option
+    @thumbnail_option
+    @budget_options
+    @cache_options
+    @plan_options
+    @shard_option
+    @check_option
+    @upload_option
+    @encoding_option
+    @derive_option
+    @validate_option
+    @failure_options
+    def create_full_bioclim__collection(destination: str,
+                                        statistics: Optional[str],
+                                        footprint: bool,
+                                        compact: bool,
+                                        thumbnails: Optional[str],
+                                        scratch_dir: Optional[str],
+                                        scratch_budget: Optional[str],
+                                        memory_budget: Optional[str],
+                                        workers: int,
+                                        cache_dir: Optional[str],
+                                        offline: bool,
+                                        plan: bool,
+                                        pixels_per_second: float,
+                                        shard: Optional[str],
+                                        check_cogs: bool,
+                                        upload_workers: int,
+                                        encoding: str,
+                                        derive: bool,
+                                        validate: bool,
+                                        retries: int,
+                                        retry_backoff: float,
+                                        task_timeout: Optional[float],
+                                        failure_report: Optional[str],
+                                        retry_failed: Optional[str]):
         """Creates a STAC Collection and all of its Items and Assets
+
+        With --shard, only the items of the shard are created and saved, and
+        the merge command assembles the collection once every shard is done.
+
         Args:
             destination (str): An HREF for the STAC Collection
+            statistics (str, optional): Statistics mode for raster bands
+            footprint (bool): Whether to use data footprints as geometries
+            compact (bool): Whether to only keep projection fields on items
+            thumbnails (str, optional): Format of the thumbnails to add
+            shard (str, optional): Shard to process, as "i/N"
+            check_cogs (bool): Whether to check every COG as it is written
+            upload_workers (int): Number of files uploaded concurrently to an
+                object storage destination
+            encoding (str): "native", or "int16" to quantize floating point
+                variables
+            derive (bool): Whether to derive the coarser resolutions from
+                the 30s files instead of downloading them
+            validate (bool): Whether to validate the items and collection
+            retries (int): Times a file is retried after a transient error
+            retry_backoff (float): Seconds before the first retry
+            task_timeout (float, optional): Timeout of downloads and GDAL
+            failure_report (str, optional): Path of the failure report
+            retry_failed (str, optional): Failure report of the files to
+                convert again
         """
-        os.chdir(destination)
+        cache = _archive_cache(cache_dir, offline, task_timeout)
+        worker_shard = _shard(shard)
+        units = _failed_units(retry_failed)
+        if plan:
+            _print_plan("bioclim", workers, pixels_per_second, cache,
+                        worker_shard, derive, units)
+            return
+
+        if worker_shard is not None and "://" in destination:
+            raise click.BadParameter(
+                "Shards can only be written to a local destination",
+                param_hint="--shard")
+        if units is not None and "://" in destination:
+            # The COGs of the earlier run are not in the staging directory,
+            # so the published collection would only keep the retried items
+            raise click.BadParameter(
+                "Failed files can only be retried into a local destination",
+                param_hint="--retry-failed")
+
+        from stactools.worldclim import cog, stac
+
         collection = stac.create_bioclim_collection()
-        collection.normalize_hrefs("./")
-        collection.save(dest_href="./")
-        cog.download_convert_bioclim_dataset("./")
-        for file_name in glob("./*.tif"):
-            logger.info(f"Processing {file_name}")
-            id = os.path.basename(file_name).replace(".tif", "")
-            item_dir = id
-            os.makedirs(item_dir, exist_ok=True)
-            new_file_name = os.path.join(item_dir, f"{id}.tif")
-            shutil.move(file_name, new_file_name)
-            item = stac.create_bioclim_item(new_file_name)
-            collection.add_item(item)
-            item.validate()
-        logger.info("Saving collection")
-        collection.normalize_hrefs("./")
+        with _output_directory(destination, scratch_dir,
+                               upload_workers) as (output_dir, uploader):
+            if worker_shard is None:
+                # COGs are written straight into their item directories
+                cog_directory = output_dir
+                if uploader is None:
+                    collection.normalize_hrefs(destination)
+                    collection.save(dest_href=destination)
+            else:
+                # Shards may share the destination, so each converts into its
+                # own directory, from which its COGs are renamed into place
+                cog_directory = os.path.join(destination, worker_shard.name)
+                os.makedirs(cog_directory, exist_ok=True)
+            staged_items = _staged_items(
+                uploader, lambda paths: stac.create_bioclim_item(
+                    paths[0],
+                    statistics=_statistics_mode(statistics),
+                    footprint=footprint,
+                    compact=compact), 1, thumbnails)
+            failed = cog.download_convert_bioclim_dataset(
+                cog_directory,
+                scratch_dir=scratch_dir,
+                scratch_budget=_size(scratch_budget),
+                memory_budget=_size(memory_budget),
+                max_workers=workers,
+                cache=cache,
+                pixels_per_second=pixels_per_second,
+                shard=worker_shard,
+                post_hook=_post_hook(check_cogs, uploader, staged_items),
+                item_directories=worker_shard is None,
+                encoding=Encoding(encoding),
+                derive=derive,
+                retry=RetryPolicy(retries, retry_backoff, task_timeout),
+                failure_report=failure_report,
+                units=units)
+            _check_failures(failed, failure_report)
+            if staged_items is not None:
+                items = staged_items.items
+            else:
+                items = stac.create_bioclim_items(
+                    cog_directory,
+                    output_dir,
+                    statistics=_statistics_mode(statistics),
+                    footprint=footprint,
+                    compact=compact)
+                if thumbnails is not None:
+                    from stactools.worldclim.thumbnail import add_thumbnails
+
+                    add_thumbnails(items,
+                                   image_format=thumbnails,
+                                   max_workers=workers)
+            if validate:
+                for item in items:
+                    item.validate()
+
+            if worker_shard is not None:
+                from stactools.worldclim.shard import save_shard
+
+                os.rmdir(cog_directory)
+                save_shard(collection, items, destination, worker_shard)
+                return
+
+            collection.add_items(items)
+            if uploader is not None:
+                from stactools.worldclim.storage import publish_collection
+
+                publish_collection(collection, uploader)
+            else:
+                logger.info("Saving collection")
+                collection.normalize_hrefs(destination)
+                collection.make_all_asset_hrefs_relative()
+                collection.save(dest_href=destination)
+            _save_index(collection, output_dir, uploader)
+        if validate:
+            collection.validate()
+
+    @worldclim.command(
+        "merge",
+        short_help="Assemble the items of every shard into one collection",
+    )
+    @click.option(
+        "-d",
+        "--destination",
+        required=True,
+        help="The output directory shared by the shards",
+    )
+    @click.option(
+        "--dataset",
+        type=click.Choice(["monthly", "bioclim"]),
+        required=True,
+        help="The dataset the shards created",
+    )
+    def merge_command(destination: str, dataset: str):
+        """Creates a STAC Collection from the items saved by sharded runs of
+        create-full-monthly-collection or create-full-bioclim-collection.
+        Only item JSON files are read.
+
+        Args:
+            destination (str): The output directory shared by the shards
+            dataset (str): "monthly" or "bioclim"
+        """
+        from stactools.worldclim import stac
+        from stactools.worldclim.shard import merge_shards
+
+        if dataset == "monthly":
+            collection = stac.create_monthly_collection()
+        else:
+            collection = stac.create_bioclim_collection()
+        merge_shards(collection, destination)
+        _save_index(collection, destination, None)
+
+    @worldclim.command(
+        "check-cogs",
+        short_help="Check that every tif in a directory is a valid COG",
+    )
+    @click.argument("directory")
+    @click.option(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of files checked concurrently",
+    )
+    def check_cogs_command(directory: str, workers: Optional[int]):
+        """Checks the TIFF structure of every .tif under a directory, reading
+        only file headers, and lists the files that are not valid COGs.
+
+        Args:
+            directory (str): Directory to search for .tif files
+            workers (int, optional): Number of files checked concurrently
+        """
+        from stactools.worldclim.cog_check import check_cogs, find_tiffs
+
+        paths = find_tiffs(directory)
+        failures = check_cogs(paths, max_workers=workers)
+        for path, errors in failures.items():
+            click.echo(f"{path}:")
+            for error in errors:
+                click.echo(f"  {error}")
+        click.echo(f"{len(paths) - len(failures)} of {len(paths)} files "
+                   "are valid COGs")
+        if failures:
+            raise click.ClickException(
+                f"{len(failures)} files are not valid COGs")
+
+    @worldclim.command(
+        "add-thumbnails",
+        short_help="Add thumbnail assets to the items of a collection",
+    )
+    @click.argument("collection_href")
+    @click.option(
+        "-f",
+        "--format",
+        "image_format",
+        type=click.Choice(["png", "webp"]),
+        default="png",
+        help="Image format of the thumbnails",
+    )
+    @click.option(
+        "-w",
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of thumbnails rendered concurrently",
+    )
+    def add_thumbnails_command(collection_href: str, image_format: str,
+                               workers: Optional[int]):
+        """Renders a thumbnail of every item of a local collection next to its
+        COGs and saves the items with the new assets.
+
+        Args:
+            collection_href (str): HREF of the collection.json
+            image_format (str): "png" or "webp"
+            workers (int, optional): Number of thumbnails rendered
+                concurrently
+        """
+        import pystac
+
+        from stactools.worldclim.thumbnail import add_thumbnails
+
+        collection = pystac.Collection.from_file(collection_href)
+        items = list(collection.get_items(recursive=True))
+        add_thumbnails(items, image_format=image_format, max_workers=workers)
         collection.make_all_asset_hrefs_relative()
-        collection.save(dest_href="./")
-        collection.validate()
+        collection.save()
+
+    @worldclim.command(
+        "validate-derived",
+        short_help="Compare a resolution derived from 30s to the official "
+        "file",
+    )
+    @click.argument("source")
+    @click.argument("official")
+    @click.option(
+        "-t",
+        "--tolerance",
+        type=float,
+        default=0.0,
+        show_default=True,
+        help="Largest absolute difference accepted between the files",
+    )
+    @click.option(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        show_default=True,
+        help="Number of windows aggregated concurrently",
+    )
+    @click.option(
+        "--scratch-dir",
+        default=None,
+        help="Directory of the derived file",
+    )
+    def validate_derived_command(source: str, official: str,
+                                 tolerance: float, workers: int,
+                                 scratch_dir: Optional[str]):
+        """Derives the resolution of an official coarser file, e.g.
+        wc2.1_10m_tmin_01.tif, from the 30s file of the same variable and
+        reports how much they differ.
+
+        Args:
+            source (str): Path of the 30s file
+            official (str): Path of the official coarser file
+            tolerance (float): Largest absolute difference accepted
+            workers (int): Number of windows aggregated concurrently
+            scratch_dir (str, optional): Directory of the derived file
+        """
+        from stactools.worldclim.aggregate import validate_derived
+
+        comparison = validate_derived(source, official, scratch_dir, workers)
+        click.echo(str(comparison))
+        if not comparison.within(tolerance):
+            raise click.ClickException(
+                f"The derived file differs from {official} by more than "
+                f"{tolerance:g} or in its nodata pixels")
+
+    @worldclim.command(
+        "query",
+        short_help="Find items in the index of a collection",
+    )
+    @click.argument("index_href")
+    @click.option(
+        "--bbox",
+        default=None,
+        help="Only items intersecting west,south,east,north",
+    )
+    @click.option(
+        "-r",
+        "--resolution",
+        type=click.Choice([resolution.value for resolution in Resolution]),
+        default=None,
+        help="Only items of this resolution",
+    )
+    @click.option(
+        "-v",
+        "--variable",
+        default=None,
+        help="Only items with this variable, and print the HREFs of its "
+        "COGs",
+    )
+    @click.option(
+        "-m",
+        "--month",
+        type=click.IntRange(1, 12),
+        default=None,
+        help="Only monthly items of this month",
+    )
+    def query_command(index_href: str, bbox: Optional[str],
+                      resolution: Optional[str], variable: Optional[str],
+                      month: Optional[int]):
+        """Prints the IDs of the items matching every filter, read from the
+        items.npz index saved next to a collection, without reading any item
+        JSON.
+
+        Args:
+            index_href (str): Path of the index
+            bbox (str, optional): west,south,east,north
+            resolution (str, optional): Resolution, e.g. 30s
+            variable (str, optional): Variable, e.g. prec or bio_12
+            month (int, optional): Month, from 1 to 12
+        """
+        from stactools.worldclim.index import ItemIndex
+
+        index = ItemIndex.load(index_href)
+        try:
+            positions = index.query(_bbox(bbox), resolution, variable, month)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--variable")
+        if variable is None:
+            for item_id in index.ids[positions]:
+                click.echo(item_id)
+        else:
+            for item_id, href in zip(index.ids[positions],
+                                     index.hrefs(positions, variable)):
+                click.echo(f"{item_id} {href}")
+
+    @worldclim.command(
+        "export-cube",
+        short_help="Export variables to a memory mappable array",
+    )
+    @click.argument("collection_href")
+    @click.option(
+        "-d",
+        "--destination",
+        required=True,
+        help="Directory of the cube",
+    )
+    @click.option(
+        "-r",
+        "--resolution",
+        type=click.Choice([resolution.value for resolution in Resolution]),
+        default=Resolution.TEN_MINUTES.value,
+        show_default=True,
+        help="Resolution to export",
+    )
+    @click.option(
+        "-v",
+        "--variable",
+        "variables",
+        multiple=True,
+        help="Variable to export, repeatable. Defaults to every variable",
+    )
+    @click.option(
+        "-m",
+        "--month",
+        "months",
+        type=click.IntRange(1, 12),
+        multiple=True,
+        help="Month to export, repeatable. Defaults to every month",
+    )
+    @click.option(
+        "--bbox",
+        default=None,
+        help="Only export west,south,east,north",
+    )
+    def export_cube_command(collection_href: str, destination: str,
+                            resolution: str, variables: Tuple[str, ...],
+                            months: Tuple[int, ...], bbox: Optional[str]):
+        """Decodes variables, months and a region of a collection once into
+        an uncompressed float32 array with a JSON header, which cube.Cube
+        memory maps for repeated point lookups.
+
+        Args:
+            collection_href (str): HREF of the collection.json
+            destination (str): Directory of the cube
+            resolution (str): Resolution to export
+            variables (Tuple[str, ...]): Variables to export, or all
+            months (Tuple[int, ...]): Months to export, or all
+            bbox (str, optional): west,south,east,north
+        """
+        import pystac
+
+        from stactools.worldclim.loader import export_cube
+
+        collection = pystac.Collection.from_file(collection_href)
+        try:
+            cube = export_cube(collection, destination,
+                               Resolution(resolution), variables or None,
+                               months or None, _bbox(bbox))
+        except (KeyError, ValueError) as e:
+            raise click.ClickException(str(e))
+        height, width, layers = cube.shape
+        click.echo(f"Exported {layers} layers of {height}x{width} pixels to "
+                   f"{destination}")
 
     return worldclim
@@ -1,19 +1,15 @@
-from pyproj import CRS
-from pystac import Link, Provider
-from pystac.provider import ProviderRole
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
 
 WORLDCLIM_ID = "worldclim-monthly"
 WORLDCLIM_BIOCLIM_ID = "worldclim-bioclim"
 WORLDCLIM_VERSION = 2.1
 WORLDCLIM_EPSG = 4326
-WORLDCLIM_CRS_WKT = CRS.from_epsg(WORLDCLIM_EPSG).to_wkt()
 WORLDCLIM_TITLE = "WorldClim historical climate data by month"
 WORLDCLIM_BIOCLIM_TITLE = "WorldClim historical bioclimatic variables"
 LICENSE = "CC-BY-SA-4.0"
 title_string = "Creative Commons - Attribution-ShareAlike 4.0 International - CC BY-SA 4.0"
-LICENSE_LINK = Link(rel="license",
-                    target="https://creativecommons.org/licenses/by-sa/4.0/",
-                    title=title_string)
 
 DESCRIPTION = """This is WorldClim version 2.1 climate data for 1970-2000. This version was
 released in January 2020. There are monthly climate data for minimum, mean, and maximum temperature,
@@ -33,14 +29,11 @@ CITATION = "Fick, S.E. and R.J. Hijmans, 2017. WorldClim 2: new 1km spatial reso
 START_YEAR = 1970
 END_YEAR = 2000
 
-DATASET_URL_MAIN = "https://biogeo.ucdavis.edu/data/worldclim"
+# Can be pointed at a mirror, or at a local server for load tests
+DATASET_URL_MAIN = os.environ.get("WORLDCLIM_DATASET_URL",
+                                  "https://biogeo.ucdavis.edu/data/worldclim")
 DATASET_URL_TEMPLATE = f"{DATASET_URL_MAIN}/v{WORLDCLIM_VERSION}/base/wc{WORLDCLIM_VERSION}_{{resolution}}_{{variable}}.zip"  # noqa E501
 
-WORLDCLIM_PROVIDER = Provider(
-    name="WorldClim",
-    roles=[ProviderRole.PROCESSOR, ProviderRole.HOST],
-    url="https://worldclim.org/data/worldclim21.html")
-
 BIOCLIM_DESCRIPTION = """Bioclimatic variables are derived from the monthly temperature
 and rainfall values in order to generate more biologically meaningful variables. These are
 often used in species distribution modeling and related ecological modeling techniques.
@@ -82,4 +75,153 @@ BIOCLIM_VARIABLES = {
     "bio_19": "Precipitation of Coldest Quarter",
 }
 
+# Scale and offset of the int16 encoding of each floating point variable, so
+# that value = raw * scale + offset. Raw values span -32767 to 32767, with
+# -32768 as nodata; the precision is half the scale.
+INT16_ENCODINGS: Dict[str, Tuple[float, float]] = {
+    # degrees C, -327.67 to 327.67, precision 0.005
+    "tmin": (0.01, 0.0),
+    "tmax": (0.01, 0.0),
+    "tavg": (0.01, 0.0),
+    # m s-1, -32.767 to 32.767, precision 0.0005
+    "wind": (0.001, 0.0),
+    # kPa, -6.5534 to 6.5534, precision 0.0001
+    "vapr": (0.0002, 0.0),
+    # Temperatures and temperature ranges in degrees C, precision 0.005
+    "bio_1": (0.01, 0.0),
+    "bio_2": (0.01, 0.0),
+    "bio_5": (0.01, 0.0),
+    "bio_6": (0.01, 0.0),
+    "bio_7": (0.01, 0.0),
+    "bio_8": (0.01, 0.0),
+    "bio_9": (0.01, 0.0),
+    "bio_10": (0.01, 0.0),
+    "bio_11": (0.01, 0.0),
+    # Percentages, -327.67 to 327.67, precision 0.005
+    "bio_3": (0.01, 0.0),
+    "bio_15": (0.01, 0.0),
+    # Standard deviation x100, -3276.7 to 3276.7, precision 0.05
+    "bio_4": (0.1, 0.0),
+    # Precipitation in mm
+    "bio_12": (0.5, 0.0),  # -16383.5 to 16383.5, precision 0.25
+    "bio_13": (0.1, 0.0),  # -3276.7 to 3276.7, precision 0.05
+    "bio_14": (0.1, 0.0),
+    "bio_16": (0.25, 0.0),  # -8191.75 to 8191.75, precision 0.125
+    "bio_17": (0.1, 0.0),
+    "bio_18": (0.25, 0.0),
+    "bio_19": (0.25, 0.0),
+}
+INT16_NODATA = -32768
+
 TILING_PIXEL_SIZE = (10800, 10800)
+# Block size of the COGs written by create_cog
+COG_BLOCK_SIZE = 512
+
+HISTOGRAM_BUCKETS = 256
+# Longest side of the decimated read used for approximate statistics when a
+# file has no overviews
+APPROXIMATE_STATISTICS_MAX_SIZE = 1024
+# Longest side of the nodata mask from which data footprints are traced
+FOOTPRINT_MAX_SIZE = 256
+# Longest side of item thumbnails
+THUMBNAIL_MAX_SIZE = 256
+# Variable shown in the thumbnails of monthly items
+MONTHLY_THUMBNAIL_VARIABLE = "tavg"
+# Colormaps of thumbnails, as RGB stops from the lowest to the highest value
+COLORMAPS: Dict[str, List[Tuple[int, int, int]]] = {
+    # Reversed ColorBrewer RdYlBu
+    "temperature": [(49, 54, 149), (69, 117, 180), (116, 173, 209),
+                    (171, 217, 233), (224, 243, 248), (254, 224, 144),
+                    (253, 174, 97), (244, 109, 67), (215, 48, 39),
+                    (165, 0, 38)],
+    # ColorBrewer Blues
+    "precipitation": [(247, 251, 255), (198, 219, 239), (107, 174, 214),
+                      (33, 113, 181), (8, 48, 107)],
+    # ColorBrewer YlOrRd
+    "radiation": [(255, 255, 204), (254, 217, 118), (253, 141, 60),
+                  (227, 26, 28), (128, 0, 38)],
+    # ColorBrewer YlGnBu
+    "wind": [(255, 255, 204), (161, 218, 180), (65, 182, 196),
+             (44, 127, 184), (37, 52, 148)],
+    # ColorBrewer YlGn
+    "humidity": [(255, 255, 229), (217, 240, 163), (120, 198, 121),
+                 (35, 132, 67), (0, 69, 41)],
+}
+# Colormap and value range of the thumbnails of each variable
+THUMBNAIL_STYLES: Dict[str, Tuple[str, float, float]] = {
+    "tmin": ("temperature", -45, 35),
+    "tmax": ("temperature", -35, 45),
+    "tavg": ("temperature", -40, 40),
+    "prec": ("precipitation", 0, 400),
+    "srad": ("radiation", 0, 30000),
+    "wind": ("wind", 0, 12),
+    "vapr": ("humidity", 0, 3.5),
+    "bio_1": ("temperature", -30, 30),
+    "bio_2": ("temperature", 0, 20),
+    "bio_3": ("temperature", 10, 90),
+    "bio_4": ("temperature", 0, 2000),
+    "bio_5": ("temperature", -20, 45),
+    "bio_6": ("temperature", -50, 25),
+    "bio_7": ("temperature", 0, 70),
+    "bio_8": ("temperature", -40, 35),
+    "bio_9": ("temperature", -40, 35),
+    "bio_10": ("temperature", -20, 40),
+    "bio_11": ("temperature", -50, 30),
+    "bio_12": ("precipitation", 0, 4000),
+    "bio_13": ("precipitation", 0, 800),
+    "bio_14": ("precipitation", 0, 200),
+    "bio_15": ("precipitation", 0, 150),
+    "bio_16": ("precipitation", 0, 2000),
+    "bio_17": ("precipitation", 0, 600),
+    "bio_18": ("precipitation", 0, 1500),
+    "bio_19": ("precipitation", 0, 1500),
+}
+
+# Raster shape (height, width) of the global grid at each resolution
+RESOLUTION_SHAPES = {
+    "10m": (1080, 2160),
+    "5m": (2160, 4320),
+    "2.5m": (4320, 8640),
+    "30s": (21600, 43200),
+}
+# Bytes per pixel of the largest source data type (float32)
+MAX_PIXEL_BYTES = 4
+# Source rows read at once when deriving coarser resolutions from 30s data; a
+# multiple of every aggregation factor (5, 10 and 20)
+AGGREGATION_WINDOW_ROWS = 120
+# Rough throughput of one worker converting to COG, used to estimate and order
+# work. Can be overridden from the command line with --pixels-per-second.
+CONVERSION_PIXELS_PER_SECOND = 5_000_000
+# Part size of multipart uploads to object storage; S3 needs at least 5 MiB
+UPLOAD_BLOCK_SIZE = 16 * 2**20
+# Number of files uploaded concurrently to object storage
+UPLOAD_WORKERS = 4
+# Times a file is converted again after a transient download or GDAL error,
+# and seconds waited before the first retry, doubled before each next one
+RETRIES = 2
+RETRY_BACKOFF_SECONDS = 10.0
+
+
+# WORLDCLIM_CRS_WKT, LICENSE_LINK and WORLDCLIM_PROVIDER need pyproj or pystac,
+# so they are built on first access through __getattr__ below.
+@lru_cache(maxsize=None)
+def _lazy_constant(name: str) -> Any:
+    if name == "WORLDCLIM_CRS_WKT":
+        from pyproj import CRS
+        return CRS.from_epsg(WORLDCLIM_EPSG).to_wkt()
+    if name == "LICENSE_LINK":
+        from pystac import Link
+        return Link(rel="license",
+                    target="https://creativecommons.org/licenses/by-sa/4.0/",
+                    title=title_string)
+    if name == "WORLDCLIM_PROVIDER":
+        from pystac import Provider
+        from pystac.provider import ProviderRole
+        return Provider(name="WorldClim",
+                        roles=[ProviderRole.PROCESSOR, ProviderRole.HOST],
+                        url="https://worldclim.org/data/worldclim21.html")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __getattr__(name: str) -> Any:
+    return _lazy_constant(name)
@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Files of a cube directory
+CUBE_HEADER_FILE = "cube.json"
+CUBE_DATA_FILE = "cube.f32"
+CUBE_VERSION = 1
+# Little endian float32, with NaN for nodata
+CUBE_DTYPE = "<f4"
+
+
+class Cube:
+    """A dense, uncompressed array of WorldClim layers on disk.
+
+    The values are stored in a raw float32 file laid out as (y, x, layer),
+    so the layers of one pixel are contiguous, and memory mapped read-only.
+    Processes opening the same cube share its pages through the operating
+    system's page cache, and nothing is decoded on lookup. A small JSON
+    header describes the grid and the layers.
+
+    Args:
+        directory (str): Directory of the cube, as written by
+            loader.export_cube.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, CUBE_HEADER_FILE)) as f:
+            self.header: Dict[str, Any] = json.load(f)
+        if self.header["version"] != CUBE_VERSION:
+            raise ValueError(
+                f"Unsupported cube version {self.header['version']}")
+        self.shape = tuple(self.header["shape"])
+        self.transform: List[float] = self.header["transform"]
+        self.layers: List[Tuple[str, Optional[int]]] = [
+            (layer["variable"], layer["month"])
+            for layer in self.header["layers"]
+        ]
+        self.data = np.memmap(os.path.join(directory, self.header["data"]),
+                              dtype=self.header["dtype"],
+                              mode="r",
+                              shape=self.shape)
+
+    def layer(self, variable: str, month: Optional[int] = None) -> int:
+        """Position of a layer in the last dimension.
+
+        Args:
+            variable (str): The variable, e.g. "prec" or "bio_12".
+            month (int, optional): The month of a monthly variable.
+
+        Returns:
+            int: The position of the layer.
+        """
+        try:
+            return self.layers.index((variable, month))
+        except ValueError:
+            raise KeyError(f"No layer {variable} month {month} in the cube")
+
+    def pixels(self, lon: Sequence[float],
+               lat: Sequence[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows and columns of the pixels containing points.
+
+        Args:
+            lon (Sequence[float]): Longitudes of the points.
+            lat (Sequence[float]): Latitudes of the points.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Rows and columns, -1 for points
+            outside the cube.
+        """
+        a, _, c, _, e, f = self.transform[:6]
+        cols = np.floor((np.asarray(lon, dtype=np.float64) - c) / a)
+        rows = np.floor((np.asarray(lat, dtype=np.float64) - f) / e)
+        outside = ((rows < 0) | (rows >= self.shape[0]) | (cols < 0)
+                   | (cols >= self.shape[1]) | np.isnan(rows)
+                   | np.isnan(cols))
+        rows[outside] = -1
+        cols[outside] = -1
+        return rows.astype(np.int64), cols.astype(np.int64)
+
+    def sample(
+        self,
+        lon: Sequence[float],
+        lat: Sequence[float],
+        layers: Optional[Sequence[int]] = None,
+    ) -> np.ndarray:
+        """Values of the layers at points.
+
+        Args:
+            lon (Sequence[float]): Longitudes of the points.
+            lat (Sequence[float]): Latitudes of the points.
+            layers (Sequence[int], optional): Positions of the layers to
+                read, e.g. from layer. Defaults to every layer.
+
+        Returns:
+            np.ndarray: float32 array of shape (points, layers), NaN for
+            nodata and for points outside the cube.
+        """
+        rows, cols = self.pixels(lon, lat)
+        inside = rows >= 0
+        columns = (slice(None) if layers is None else np.asarray(
+            layers, dtype=np.int64))
+        values = self.data[rows[inside], cols[inside]][:, columns]
+        result = np.full((len(rows), values.shape[1]),
+                         np.nan,
+                         dtype=np.float32)
+        result[inside] = values
+        return result
+
+
+def write_header(
+    directory: str,
+    shape: Tuple[int, int, int],
+    transform: Sequence[float],
+    layers: List[Tuple[str, Optional[int]]],
+    attributes: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Writes the header of a cube whose data file has been written.
+
+    The header is written last and atomically, so a cube with a header is
+    complete.
+
+    Args:
+        directory (str): Directory of the cube.
+        shape (Tuple[int, int, int]): Height, width and number of layers.
+        transform (Sequence[float]): Affine transform of the grid.
+        layers (List[Tuple[str, Optional[int]]]): Variable and month of
+            each layer, with None as the month of bioclimatic variables.
+        attributes (Dict[str, Any], optional): Other attributes to record,
+            e.g. the collection and resolution.
+    """
+    header = {
+        "version": CUBE_VERSION,
+        "data": CUBE_DATA_FILE,
+        "dtype": CUBE_DTYPE,
+        "shape": list(shape),
+        "dimensions": ["y", "x", "layer"],
+        "transform": list(transform)[:6],
+        "crs": "EPSG:4326",
+        "nodata": "NaN",
+        "layers": [{
+            "variable": variable,
+            "month": month
+        } for variable, month in layers],
+    }
+    header.update(attributes or {})
+    path = os.path.join(directory, CUBE_HEADER_FILE)
+    with open(f"{path}.partial", "w") as f:
+        json.dump(header, f, indent=2)
+    os.replace(f"{path}.partial", path)
@@ -21,3 +21,13 @@ class Month(Enum):
     OCTOBER = 10
     NOVEMBER = 11
     DECEMBER = 12
+
+
+class StatisticsMode(Enum):
+    EXACT = "exact"
+    APPROXIMATE = "approximate"
+
+
+class Encoding(Enum):
+    NATIVE = "native"
+    INT16 = "int16"
@@ -0,0 +1,61 @@
+import json
+import logging
+import os
+from typing import Any, Dict, List, Tuple
+
+from stactools.worldclim.planner import WorkUnit
+from stactools.worldclim.scheduler import TaskFailure, is_transient
+
+logger = logging.getLogger(__name__)
+
+FAILURE_REPORT_VERSION = 1
+
+
+def save_failure_report(path: str, failures: List[Tuple[WorkUnit,
+                                                        TaskFailure]]) -> None:
+    """Writes the units of work that failed as JSON.
+
+    The report is written even when nothing failed, so that it always
+    describes the last run, and atomically. load_failure_report reads the
+    units back to convert only them again.
+
+    Args:
+        path (str): Path of the report.
+        failures (List[Tuple[WorkUnit, TaskFailure]]): Each failed unit with
+            the failure of its task.
+    """
+    report: Dict[str, Any] = {
+        "version": FAILURE_REPORT_VERSION,
+        "failures": [{
+            "file_name": unit.file_name,
+            "unit": unit.to_dict(),
+            "error": type(failure.error).__name__,
+            "message": str(failure.error),
+            "transient": is_transient(failure.error),
+            "attempts": failure.attempts,
+        } for unit, failure in failures],
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{path}.partial", "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(f"{path}.partial", path)
+    logger.info(f"Wrote the report of {len(failures)} failed files to {path}")
+
+
+def load_failure_report(path: str) -> List[WorkUnit]:
+    """Reads the units of work of a report written by save_failure_report.
+
+    Args:
+        path (str): Path of the report.
+
+    Returns:
+        List[WorkUnit]: The units that failed.
+    """
+    with open(path) as f:
+        report = json.load(f)
+    if report.get("version") != FAILURE_REPORT_VERSION:
+        raise ValueError(
+            f"Unsupported failure report version {report.get('version')}")
+    return [WorkUnit.from_dict(failure["unit"]) for failure in report["failures"]]
@@ -0,0 +1,57 @@
+import logging
+from typing import Any, Dict, Optional
+
+from rasterio.features import shapes
+from rasterio.transform import Affine
+from shapely.geometry import MultiPolygon, mapping, shape
+from shapely.geometry.polygon import orient
+from shapely.ops import unary_union
+
+from stactools.worldclim.constants import FOOTPRINT_MAX_SIZE
+from stactools.worldclim.remote import open_dataset, overview_shape
+
+logger = logging.getLogger(__name__)
+
+
+def data_footprint(
+    href: str,
+    max_size: int = FOOTPRINT_MAX_SIZE,
+    tolerance: Optional[float] = None,
+) -> Optional[Dict[str, Any]]:
+    """Computes a simplified polygon of the valid data of a raster.
+
+    The nodata mask is read at the smallest overview, or decimated to at
+    most max_size pixels on its longest side, so only a few blocks are read.
+
+    Args:
+        href (str): HREF of the raster.
+        max_size (int, optional): Longest side of the mask in pixels.
+        tolerance (float, optional): Simplification tolerance in CRS units.
+            Defaults to one pixel of the mask.
+
+    Returns:
+        Optional[Dict[str, Any]]: GeoJSON Polygon or MultiPolygon, or None if
+        the raster has no valid data.
+    """
+    with open_dataset(href) as dataset:
+        height, width = overview_shape(dataset, max_size)
+        mask = dataset.read_masks(1, out_shape=(height, width))
+        transform = dataset.transform * Affine.scale(
+            dataset.width / width, dataset.height / height)
+
+    polygons = [
+        shape(geometry) for geometry, _ in shapes(
+            mask, mask=mask > 0, connectivity=8, transform=transform)
+    ]
+    if not polygons:
+        return None
+    if tolerance is None:
+        tolerance = abs(transform.a)
+    footprint = unary_union(polygons).simplify(tolerance,
+                                               preserve_topology=True)
+    if isinstance(footprint, MultiPolygon):
+        footprint = MultiPolygon([orient(p) for p in footprint.geoms])
+    else:
+        footprint = orient(footprint)
+    logger.debug(f"Footprint of {href} has {len(polygons)} parts")
+    return mapping(footprint)
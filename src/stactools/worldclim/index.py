@@ -0,0 +1,225 @@
+import logging
+import os
+import re
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Union,
+)
+
+import numpy as np
+
+from stactools.worldclim.constants import (
+    BIOCLIM_VARIABLES,
+    MONTHLY_DATA_VARIABLES,
+    WORLDCLIM_VERSION,
+)
+from stactools.worldclim.enum import Month, Resolution
+
+if TYPE_CHECKING:
+    from pystac import Item
+
+logger = logging.getLogger(__name__)
+
+# Name of the index saved next to the collection JSON
+INDEX_FILE_NAME = "items.npz"
+
+ITEM_ID_REGEX = re.compile(
+    rf"wc{WORLDCLIM_VERSION}_(?P<resolution>[^_]+)_"
+    r"(?:(?P<variable>bio_\d+)|(?P<month>\d+))(?:_\d+_\d+)?$")
+
+# Each variable is one bit of the variables column
+VARIABLES = list(MONTHLY_DATA_VARIABLES) + list(BIOCLIM_VARIABLES)
+RESOLUTIONS = list(Resolution)
+
+
+class ItemIndex:
+    """Columnar index of the items of a collection.
+
+    The ID, resolution, month, variables, bbox and asset HREFs of every item
+    are held in NumPy columns, saved together in one .npz file, so items can
+    be found with vectorized filters without reading any item JSON. Loading
+    and querying an index only needs NumPy.
+
+    Args:
+        columns (Dict[str, np.ndarray]): The columns, as built by from_items
+            or loaded by load.
+    """
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.ids = columns["ids"]
+        self.resolutions = columns["resolutions"]
+        self.months = columns["months"]
+        self.variables = columns["variables"]
+        self.bboxes = columns["bboxes"]
+        self.asset_offsets = columns["asset_offsets"]
+        self.asset_keys = columns["asset_keys"]
+        self.asset_hrefs = columns["asset_hrefs"]
+
+    @classmethod
+    def from_items(cls, items: Iterable["Item"]) -> "ItemIndex":
+        """Builds the index of monthly or bioclimatic items.
+
+        Args:
+            items (Iterable[Item]): The items, whose asset HREFs are held as
+                absolute HREFs, and saved relative to the index.
+
+        Returns:
+            ItemIndex: The index.
+        """
+        ids: List[str] = []
+        resolutions: List[int] = []
+        months: List[int] = []
+        variables: List[int] = []
+        bboxes: List[List[float]] = []
+        asset_offsets = [0]
+        asset_keys: List[str] = []
+        asset_hrefs: List[str] = []
+        for item in items:
+            match = ITEM_ID_REGEX.match(item.id)
+            if match is None:
+                raise ValueError(f"{item.id} is not a WorldClim item ID")
+            if match.group("variable") is not None:
+                month = 0
+                item_variables = [match.group("variable")]
+            else:
+                month = int(match.group("month"))
+                item_variables = [
+                    key for key in item.assets if key in MONTHLY_DATA_VARIABLES
+                ]
+            ids.append(item.id)
+            resolutions.append(
+                RESOLUTIONS.index(Resolution(match.group("resolution"))))
+            months.append(month)
+            variables.append(_variable_bits(item_variables))
+            bboxes.append(list(item.bbox or [np.nan] * 4))
+            for key, asset in item.assets.items():
+                asset_keys.append(key)
+                asset_hrefs.append(asset.get_absolute_href() or asset.href)
+            asset_offsets.append(len(asset_keys))
+        return cls({
+            "ids": np.array(ids, dtype=str),
+            "resolutions": np.array(resolutions, dtype=np.uint8),
+            "months": np.array(months, dtype=np.uint8),
+            "variables": np.array(variables, dtype=np.uint32),
+            "bboxes": np.array(bboxes, dtype=np.float64).reshape(-1, 4),
+            "asset_offsets": np.array(asset_offsets, dtype=np.int64),
+            "asset_keys": np.array(asset_keys, dtype=str),
+            "asset_hrefs": np.array(asset_hrefs, dtype=str),
+        })
+
+    @classmethod
+    def load(cls, path: str) -> "ItemIndex":
+        """Loads an index saved by save, resolving its asset HREFs against
+        the directory of the file."""
+        with np.load(path, allow_pickle=False) as columns:
+            loaded = {name: columns[name] for name in columns.files}
+        directory = os.path.dirname(os.path.abspath(path))
+        hrefs = [
+            href if "://" in href or os.path.isabs(href) else
+            os.path.normpath(os.path.join(directory, href))
+            for href in loaded["asset_hrefs"].tolist()
+        ]
+        loaded["asset_hrefs"] = np.array(hrefs, dtype=str)
+        return cls(loaded)
+
+    def save(self, path: str, href: Optional[str] = None) -> None:
+        """Saves the index as one compressed .npz file.
+
+        Asset HREFs are stored relative to the index, so the index still
+        resolves once the catalog is moved or uploaded.
+
+        Args:
+            path (str): Path of the file.
+            href (str, optional): HREF the file is published at, e.g. the URL
+                it is uploaded to. Defaults to path.
+        """
+        from pystac.utils import make_relative_href
+
+        start_href = href or os.path.abspath(path)
+        relative_hrefs = [
+            make_relative_href(asset_href, start_href)
+            for asset_href in self.asset_hrefs.tolist()
+        ]
+        np.savez_compressed(path,
+                            ids=self.ids,
+                            resolutions=self.resolutions,
+                            months=self.months,
+                            variables=self.variables,
+                            bboxes=self.bboxes,
+                            asset_offsets=self.asset_offsets,
+                            asset_keys=self.asset_keys,
+                            asset_hrefs=np.array(relative_hrefs, dtype=str))
+        logger.info(f"Saved the index of {len(self)} items to {path}")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def query(
+        self,
+        bbox: Optional[Sequence[float]] = None,
+        resolution: Optional[Union[Resolution, str]] = None,
+        variable: Optional[str] = None,
+        month: Optional[Union[Month, int]] = None,
+    ) -> np.ndarray:
+        """Finds the items matching every given filter.
+
+        Args:
+            bbox (Sequence[float], optional): Only items intersecting this
+                west, south, east, north bbox.
+            resolution (Resolution or str, optional): Only items of this
+                resolution, e.g. "30s".
+            variable (str, optional): Only items with this variable, e.g.
+                "prec" or "bio_12".
+            month (Month or int, optional): Only monthly items of this month.
+
+        Returns:
+            np.ndarray: Positions of the matching items in the index.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if resolution is not None:
+            mask &= self.resolutions == RESOLUTIONS.index(
+                Resolution(resolution))
+        if month is not None:
+            mask &= self.months == Month(month).value
+        if variable is not None:
+            mask &= (self.variables & _variable_bits([variable])) != 0
+        if bbox is not None:
+            west, south, east, north = bbox
+            mask &= ((self.bboxes[:, 0] <= east)
+                     & (self.bboxes[:, 2] >= west)
+                     & (self.bboxes[:, 1] <= north)
+                     & (self.bboxes[:, 3] >= south))
+        return np.flatnonzero(mask)
+
+    def assets(self, position: int) -> Dict[str, str]:
+        """HREFs of the assets of an item, by asset key."""
+        start, end = self.asset_offsets[position:position + 2]
+        return dict(
+            zip(self.asset_keys[start:end].tolist(),
+                self.asset_hrefs[start:end].tolist()))
+
+    def hrefs(self, positions: Iterable[int], variable: str) -> List[str]:
+        """HREFs of the COGs of a variable in items.
+
+        Args:
+            positions (Iterable[int]): Positions of items, e.g. from query.
+            variable (str): The variable, e.g. "prec" or "bio_12".
+
+        Returns:
+            List[str]: The HREF of the variable's COG in each item.
+        """
+        key = variable if variable in MONTHLY_DATA_VARIABLES else "data"
+        return [self.assets(position)[key] for position in positions]
+
+
+def _variable_bits(variables: Iterable[str]) -> int:
+    bits = 0
+    for variable in variables:
+        if variable not in VARIABLES:
+            raise ValueError(f"Unknown variable {variable}")
+        bits |= 1 << VARIABLES.index(variable)
+    return bits
@@ -0,0 +1,277 @@
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pystac import Collection
+from rasterio.windows import Window
+
+from stactools.worldclim.cog import tile_windows
+from stactools.worldclim.constants import (
+    BIOCLIM_VARIABLES,
+    COG_BLOCK_SIZE,
+    MONTHLY_DATA_VARIABLES,
+    RESOLUTION_SHAPES,
+    WORLDCLIM_BIOCLIM_ID,
+    WORLDCLIM_VERSION,
+)
+from stactools.worldclim.cube import (
+    CUBE_DATA_FILE,
+    CUBE_DTYPE,
+    CUBE_HEADER_FILE,
+    Cube,
+    write_header,
+)
+from stactools.worldclim.enum import Resolution
+from stactools.worldclim.remote import open_dataset
+from stactools.worldclim.stats import scale_offset
+
+try:
+    import dask.array as da
+    import xarray as xr
+except ImportError as e:
+    raise ImportError(
+        "Loading collections needs xarray and dask, install them with "
+        "pip install stactools-worldclim[xarray]") from e
+
+logger = logging.getLogger(__name__)
+
+# Monthly item IDs end with the month, bioclimatic ones with the variable,
+# and both with the "_<row>_<col>" suffix of their tile at 30s
+ITEM_ID_REGEX = re.compile(
+    rf"wc{WORLDCLIM_VERSION}_(?P<resolution>[^_]+)_(?P<key>bio_\d+|\d+)"
+    r"(?P<tile>_\d+_\d+)?$")
+
+
+class COGArray:
+    """Array interface over one band of a COG, reading only the requested
+    window.
+
+    Reads are converted to float32 with nodata as NaN, and int16 encoded
+    values are scaled back, so variables of different data types and the
+    empty areas of the grid stack into one array.
+
+    Args:
+        href (str): HREF of the COG.
+        shape (Tuple[int, int]): Height and width of the COG.
+    """
+    def __init__(self, href: str, shape: Tuple[int, int]):
+        self.href = href
+        self.shape = shape
+        self.dtype = np.dtype("float32")
+        self.ndim = 2
+
+    def __getitem__(self, key: Tuple[slice, slice]) -> np.ndarray:
+        rows, cols = key
+        row_start, row_stop, _ = rows.indices(self.shape[0])
+        col_start, col_stop, _ = cols.indices(self.shape[1])
+        window = Window(col_start, row_start, col_stop - col_start,
+                        row_stop - row_start)
+        with open_dataset(self.href) as dataset:
+            data = dataset.read(1, window=window, masked=True)
+            encoding = scale_offset(dataset)
+        data = data.astype("float32")
+        if encoding is not None:
+            scale, offset = encoding
+            data = data * np.float32(scale) + np.float32(offset)
+        return data.filled(np.nan)
+
+
+def load_collection(
+    collection: Collection,
+    resolution: Resolution = Resolution.TEN_MINUTES,
+    chunk_size: int = COG_BLOCK_SIZE,
+) -> "xr.Dataset":
+    """Opens a WorldClim collection as a lazy xarray Dataset.
+
+    Nothing is read until the data is computed, and then only the chunks
+    that are needed, each by its own dask task. Chunks are aligned to the
+    COG blocks of every tile, and 30s tiles are stitched into one global
+    grid without copying. Tiles that were dropped for being empty read as
+    NaN.
+
+    Args:
+        collection (Collection): A monthly or bioclimatic collection.
+        resolution (Resolution, optional): Resolution to load. Defaults to
+            10 minutes.
+        chunk_size (int, optional): Height and width of the chunks. Defaults
+            to the COG block size; use a multiple of it for larger chunks.
+
+    Returns:
+        xarray.Dataset: A "data" variable of float32 with NaN for nodata,
+        with dimensions ("variable", "month", "y", "x") for monthly
+        collections and ("variable", "y", "x") for bioclimatic ones.
+    """
+    bioclim = collection.id == WORLDCLIM_BIOCLIM_ID
+    height, width = RESOLUTION_SHAPES[resolution.value]
+    if resolution is Resolution.THIRTY_SECONDS:
+        tiles = tile_windows(height, width)
+    else:
+        tiles = [("", Window(0, 0, width, height))]
+
+    # HREF of the COG of each (variable, month, tile suffix); bioclimatic
+    # COGs have month 0
+    hrefs: Dict[Tuple[str, int, str], str] = {}
+    for item in collection.get_items(recursive=True):
+        match = ITEM_ID_REGEX.match(item.id)
+        if match is None:
+            raise ValueError(f"Could not parse WorldClim item ID {item.id}")
+        if match.group("resolution") != resolution.value:
+            continue
+        suffix = match.group("tile") or ""
+        if bioclim:
+            asset = item.assets["data"]
+            href = asset.get_absolute_href() or asset.href
+            hrefs[(match.group("key"), 0, suffix)] = href
+        else:
+            for variable, asset in item.assets.items():
+                href = asset.get_absolute_href() or asset.href
+                hrefs[(variable, int(match.group("key")), suffix)] = href
+    if not hrefs:
+        raise ValueError(
+            f"No {resolution.value} items in collection {collection.id}")
+
+    all_variables = BIOCLIM_VARIABLES if bioclim else MONTHLY_DATA_VARIABLES
+    found_variables = set(variable for variable, _, _ in hrefs)
+    variables = [v for v in all_variables if v in found_variables]
+    months = sorted(set(month for _, month, _ in hrefs))
+
+    def tile_array(variable: str, month: int, suffix: str,
+                   window: Window) -> Any:
+        shape = (window.height, window.width)
+        href = hrefs.get((variable, month, suffix))
+        if href is None:
+            return da.full(shape,
+                           np.nan,
+                           dtype="float32",
+                           chunks=chunk_size)
+        return da.from_array(COGArray(href, shape),
+                             chunks=chunk_size,
+                             name=f"worldclim-{href}-{chunk_size}",
+                             asarray=False,
+                             lock=False,
+                             meta=np.empty((0, 0), dtype="float32"))
+
+    rows = sorted(set(window.row_off for _, window in tiles))
+    cols = sorted(set(window.col_off for _, window in tiles))
+
+    def grid(variable: str, month: int) -> Any:
+        blocks: List[List[Any]] = [[None] * len(cols) for _ in rows]
+        for suffix, window in tiles:
+            row = rows.index(window.row_off)
+            col = cols.index(window.col_off)
+            blocks[row][col] = tile_array(variable, month, suffix, window)
+        return da.block(blocks)
+
+    coords: Dict[str, Any] = {"variable": variables}
+    if bioclim:
+        data = da.stack([grid(variable, 0) for variable in variables])
+        dims: Tuple[str, ...] = ("variable", "y", "x")
+    else:
+        data = da.stack([
+            da.stack([grid(variable, month) for month in months])
+            for variable in variables
+        ])
+        dims = ("variable", "month", "y", "x")
+        coords["month"] = months
+
+    # Pixel centers of the global grid
+    pixel_size = 360 / width
+    coords["y"] = 90 - (np.arange(height) + 0.5) * pixel_size
+    coords["x"] = -180 + (np.arange(width) + 0.5) * pixel_size
+    return xr.Dataset(
+        {"data": (dims, data)},
+        coords=coords,
+        attrs={
+            "collection": collection.id,
+            "resolution": resolution.value,
+            "crs": "EPSG:4326",
+        },
+    )
+
+
+def export_cube(
+    collection: Collection,
+    directory: str,
+    resolution: Resolution = Resolution.TEN_MINUTES,
+    variables: Optional[Sequence[str]] = None,
+    months: Optional[Sequence[int]] = None,
+    bbox: Optional[Sequence[float]] = None,
+) -> Cube:
+    """Writes variables, months and a region of a collection to a cube.
+
+    The COGs are decoded once, chunk by chunk with dask, into an uncompressed
+    float32 file that Cube memory maps for repeated point lookups.
+
+    Args:
+        collection (Collection): A monthly or bioclimatic collection.
+        directory (str): Directory of the cube, created if needed.
+        resolution (Resolution, optional): Resolution to export. Defaults to
+            10 minutes.
+        variables (Sequence[str], optional): Variables to export. Defaults
+            to every variable.
+        months (Sequence[int], optional): Months to export from a monthly
+            collection. Defaults to every month.
+        bbox (Sequence[float], optional): West, south, east, north bounds of
+            the region to export, which holds the pixels whose centers are
+            inside. Defaults to the whole grid.
+
+    Returns:
+        Cube: The exported cube.
+    """
+    data = load_collection(collection, resolution).data
+    if variables is not None:
+        data = data.sel(variable=list(variables))
+    if months is not None and "month" in data.dims:
+        data = data.sel(month=list(months))
+    if bbox is not None:
+        west, south, east, north = bbox
+        data = data.sel(x=slice(west, east), y=slice(north, south))
+    if data.sizes["y"] == 0 or data.sizes["x"] == 0:
+        raise ValueError(f"{bbox} does not contain any pixel")
+
+    layers: List[Tuple[str, Optional[int]]]
+    if "month" in data.dims:
+        layers = [(str(variable), int(month))
+                  for variable in data["variable"].values
+                  for month in data["month"].values]
+    else:
+        layers = [(str(variable), None)
+                  for variable in data["variable"].values]
+    height, width = data.sizes["y"], data.sizes["x"]
+    # (y, x, layer), with every layer of a block in one task so that each
+    # task writes whole pixels
+    array = data.data.reshape((len(layers), height, width))
+    array = da.moveaxis(array, 0, -1).rechunk({2: -1})
+
+    pixel_size = 360 / RESOLUTION_SHAPES[resolution.value][1]
+    transform = [
+        pixel_size, 0.0,
+        float(data["x"][0]) - pixel_size / 2, 0.0, -pixel_size,
+        float(data["y"][0]) + pixel_size / 2
+    ]
+
+    os.makedirs(directory, exist_ok=True)
+    shape = (height, width, len(layers))
+    logger.info(f"Exporting {len(layers)} layers of {height}x{width} pixels "
+                f"to {directory}")
+    # The header of a cube already in the directory would describe a
+    # partially written data file, and the data file may be mapped by readers
+    header_path = os.path.join(directory, CUBE_HEADER_FILE)
+    if os.path.exists(header_path):
+        os.remove(header_path)
+    data_path = os.path.join(directory, CUBE_DATA_FILE)
+    target = np.memmap(f"{data_path}.partial",
+                       dtype=CUBE_DTYPE,
+                       mode="w+",
+                       shape=shape)
+    da.store(array, target, lock=False)
+    target.flush()
+    del target
+    os.replace(f"{data_path}.partial", data_path)
+    write_header(directory, shape, transform, layers, {
+        "collection": collection.id,
+        "resolution": resolution.value,
+    })
+    return Cube(directory)
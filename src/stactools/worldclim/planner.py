@@ -0,0 +1,400 @@
+import heapq
+import logging
+import math
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from stactools.worldclim.constants import (
+    AGGREGATION_WINDOW_ROWS,
+    BIOCLIM_VARIABLES,
+    CONVERSION_PIXELS_PER_SECOND,
+    DATASET_URL_TEMPLATE,
+    MAX_PIXEL_BYTES,
+    MONTHLY_DATA_VARIABLES,
+    RESOLUTION_SHAPES,
+    TILING_PIXEL_SIZE,
+    WORLDCLIM_VERSION,
+)
+from stactools.worldclim.enum import Month, Resolution
+
+logger = logging.getLogger(__name__)
+
+# Coarser resolutions that can be derived from 30s data, finest first
+DERIVED_RESOLUTIONS = [
+    Resolution.TWO_POINT_FIVE_MINUTES,
+    Resolution.FIVE_MINUTES,
+    Resolution.TEN_MINUTES,
+]
+
+
+class WorkUnit:
+    """The conversion of one WorldClim file: a resolution, a variable and,
+    for monthly data, a month.
+
+    Args:
+        resolution (Resolution): Resolution of the file.
+        variable (str): Monthly variable name, or bioclimatic variable name
+            such as "bio_1".
+        month (Month, optional): Month of monthly data.
+        derived (Sequence[Resolution], optional): Coarser resolutions derived
+            from the file by block-mean aggregation instead of downloading
+            them. Defaults to none.
+    """
+    def __init__(
+        self,
+        resolution: Resolution,
+        variable: str,
+        month: Optional[Month] = None,
+        derived: Sequence[Resolution] = (),
+    ):
+        self.resolution = resolution
+        self.variable = variable
+        self.month = month
+        self.derived = list(derived)
+
+    @property
+    def archive_variable(self) -> str:
+        """Variable name in the archive URL."""
+        return "bio" if self.month is None else self.variable
+
+    @property
+    def url(self) -> str:
+        """URL of the archive containing the file."""
+        return DATASET_URL_TEMPLATE.format(resolution=self.resolution.value,
+                                           variable=self.archive_variable)
+
+    @property
+    def file_name(self) -> str:
+        """Name of the file in the archive."""
+        return self._file_name(self.resolution)
+
+    @property
+    def derived_file_names(self) -> List[str]:
+        """Names of the files derived from the file."""
+        return [self._file_name(resolution) for resolution in self.derived]
+
+    def _file_name(self, resolution: Resolution) -> str:
+        name = f"wc{WORLDCLIM_VERSION}_{resolution.value}_{self.variable}"
+        if self.month is not None:
+            name += f"_{self.month.value:02d}"
+        return f"{name}.tif"
+
+    @property
+    def item_group(self) -> str:
+        """Key shared by the units whose COGs end up in the same items.
+
+        Monthly items hold every variable of one month, bioclimatic items a
+        single variable.
+        """
+        if self.month is None:
+            return f"{self.resolution.value}_{self.variable}"
+        return f"{self.resolution.value}_{self.month.value:02d}"
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return RESOLUTION_SHAPES[self.resolution.value]
+
+    @property
+    def pixels(self) -> int:
+        height, width = self.shape
+        return height * width
+
+    @property
+    def derived_pixels(self) -> int:
+        """Pixels of the files derived from the file."""
+        return sum(RESOLUTION_SHAPES[resolution.value][0] *
+                   RESOLUTION_SHAPES[resolution.value][1]
+                   for resolution in self.derived)
+
+    @property
+    def scratch_bytes(self) -> int:
+        """Upper bound of the size of the extracted and derived files."""
+        return (self.pixels + self.derived_pixels) * MAX_PIXEL_BYTES
+
+    @property
+    def memory_bytes(self) -> int:
+        """Peak memory of the conversion, which reads at most one tile, or
+        one window of rows when deriving coarser files."""
+        tile_pixels = TILING_PIXEL_SIZE[0] * TILING_PIXEL_SIZE[1]
+        if self.resolution is Resolution.THIRTY_SECONDS:
+            memory = tile_pixels * MAX_PIXEL_BYTES
+        else:
+            memory = self.pixels * MAX_PIXEL_BYTES
+        if self.derived:
+            # The window, its float64 copy and its mask
+            window_pixels = AGGREGATION_WINDOW_ROWS * self.shape[1]
+            memory = max(memory, window_pixels * (MAX_PIXEL_BYTES + 9))
+        return memory
+
+    @property
+    def outputs(self) -> int:
+        """Number of COGs written, before empty tiles are dropped."""
+        if self.resolution is not Resolution.THIRTY_SECONDS:
+            return 1 + len(self.derived)
+        height, width = self.shape
+        return (math.ceil(height / TILING_PIXEL_SIZE[1]) *
+                math.ceil(width / TILING_PIXEL_SIZE[0]) + len(self.derived))
+
+    def estimated_seconds(
+            self,
+            pixels_per_second: float = CONVERSION_PIXELS_PER_SECOND) -> float:
+        return (self.pixels + self.derived_pixels) / pixels_per_second
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The unit as JSON, e.g. in a failure report."""
+        return {
+            "resolution": self.resolution.value,
+            "variable": self.variable,
+            "month": self.month.value if self.month is not None else None,
+            "derived": [resolution.value for resolution in self.derived],
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "WorkUnit":
+        """Reads a unit written by to_dict."""
+        return cls(
+            Resolution(d["resolution"]), d["variable"],
+            Month(d["month"]) if d.get("month") is not None else None,
+            [Resolution(resolution) for resolution in d.get("derived", [])])
+
+    def __repr__(self) -> str:
+        return f"WorkUnit({self.file_name!r})"
+
+
+def monthly_units(derive: bool = False) -> List[WorkUnit]:
+    """Every unit of work of the monthly dataset.
+
+    Args:
+        derive (bool, optional): Only convert the 30s files, deriving the
+            coarser resolutions from them. Defaults to False.
+    """
+    resolutions, derived = _resolutions(derive)
+    return [
+        WorkUnit(resolution, variable, month, derived)
+        for resolution in resolutions
+        for variable in MONTHLY_DATA_VARIABLES.keys() for month in Month
+    ]
+
+
+def bioclim_units(derive: bool = False) -> List[WorkUnit]:
+    """Every unit of work of the bioclimatic dataset.
+
+    Args:
+        derive (bool, optional): Only convert the 30s files, deriving the
+            coarser resolutions from them. Defaults to False.
+    """
+    resolutions, derived = _resolutions(derive)
+    return [
+        WorkUnit(resolution, variable, derived=derived)
+        for resolution in resolutions
+        for variable in BIOCLIM_VARIABLES.keys()
+    ]
+
+
+def _resolutions(
+        derive: bool) -> Tuple[List[Resolution], List[Resolution]]:
+    """Resolutions downloaded and resolutions derived from 30s files."""
+    if not derive:
+        return list(Resolution), []
+    return [Resolution.THIRTY_SECONDS], DERIVED_RESOLUTIONS
+
+
+class Plan:
+    """Largest first schedule of units of work across workers.
+
+    Units are started in decreasing order of estimated cost, each on the
+    worker that becomes free first, so the largest conversions never start
+    last. Ties keep the units of one archive together, so an archive can be
+    deleted as soon as its last file is converted.
+
+    Args:
+        units (List[WorkUnit]): Units of work to schedule.
+        workers (int, optional): Number of parallel workers. Defaults to 1.
+        pixels_per_second (float, optional): Conversion throughput of one
+            worker, used to estimate durations.
+        archive_bytes (Dict[str, int], optional): Size of each archive by
+            URL. Defaults to the size of its files uncompressed, an upper
+            bound.
+        archives_in_scratch (bool, optional): Whether archives are
+            downloaded to scratch space, rather than read from a cache.
+            Defaults to True.
+    """
+    def __init__(
+        self,
+        units: List[WorkUnit],
+        workers: int = 1,
+        pixels_per_second: float = CONVERSION_PIXELS_PER_SECOND,
+        archive_bytes: Optional[Dict[str, int]] = None,
+        archives_in_scratch: bool = True,
+    ):
+        self.workers = workers
+        self.archives_in_scratch = archives_in_scratch
+        self.pixels_per_second = pixels_per_second
+        self.order = sorted(units,
+                            key=lambda u: (-u.pixels, u.url, u.file_name))
+        self.archive_bytes: Dict[str, int] = defaultdict(int)
+        for unit in units:
+            if archive_bytes is not None and unit.url in archive_bytes:
+                self.archive_bytes[unit.url] = archive_bytes[unit.url]
+            else:
+                self.archive_bytes[unit.url] += unit.scratch_bytes
+
+        # (start, end, worker) of each unit, in self.order
+        self.schedule: List[Tuple[float, float, int]] = []
+        free_at = [(0.0, worker) for worker in range(workers)]
+        for unit in self.order:
+            start, worker = heapq.heappop(free_at)
+            end = start + unit.estimated_seconds(pixels_per_second)
+            self.schedule.append((start, end, worker))
+            heapq.heappush(free_at, (end, worker))
+
+    @property
+    def makespan(self) -> float:
+        """Estimated wall time in seconds."""
+        return max((end for _, end, _ in self.schedule), default=0.0)
+
+    @property
+    def peak_scratch_bytes(self) -> int:
+        """Estimated peak scratch disk usage of the schedule.
+
+        Each running unit holds its extracted file, and each archive is held
+        from the start of its first unit to the end of its last, unless
+        archives are read from a cache.
+        """
+        events: List[Tuple[float, int]] = []
+        archive_spans: Dict[str, List[float]] = {}
+        for unit, (start, end, _) in zip(self.order, self.schedule):
+            events.append((start, unit.scratch_bytes))
+            events.append((end, -unit.scratch_bytes))
+            span = archive_spans.setdefault(unit.url, [start, end])
+            span[0] = min(span[0], start)
+            span[1] = max(span[1], end)
+        if not self.archives_in_scratch:
+            archive_spans = {}
+        for url, (start, end) in archive_spans.items():
+            events.append((start, self.archive_bytes[url]))
+            events.append((end, -self.archive_bytes[url]))
+        # Releases sort before acquisitions at the same time
+        events.sort()
+        peak = usage = 0
+        for _, change in events:
+            usage += change
+            peak = max(peak, usage)
+        return peak
+
+    def describe(self) -> str:
+        """A human readable summary of the plan and its task graph."""
+        lines = []
+        units_by_archive: Dict[str, List[WorkUnit]] = defaultdict(list)
+        for unit in self.order:
+            units_by_archive[unit.url].append(unit)
+        outputs = sum(unit.outputs for unit in self.order)
+        lines.append(f"{len(self.order)} conversions from "
+                     f"{len(units_by_archive)} archives, up to {outputs} "
+                     f"COGs, on {self.workers} worker(s)")
+        lines.append("")
+        lines.append("Task graph:")
+        for url, units in units_by_archive.items():
+            lines.append(f"  download {url} "
+                         f"({_format_bytes(self.archive_bytes[url])})")
+            for unit in units:
+                seconds = unit.estimated_seconds(self.pixels_per_second)
+                lines.append(f"    -> convert {unit.file_name} "
+                             f"({unit.outputs} COG(s), "
+                             f"~{_format_seconds(seconds)})")
+                for name in unit.derived_file_names:
+                    lines.append(f"      -> derive {name}")
+        lines.append("  -> items -> collection")
+        lines.append("")
+        lines.append("Schedule (largest first):")
+        for unit, (start, end, worker) in zip(self.order, self.schedule):
+            lines.append(f"  worker {worker}: {_format_seconds(start)} - "
+                         f"{_format_seconds(end)} {unit.file_name}")
+        lines.append("")
+        lines.append("Expected peak scratch usage: "
+                     f"{_format_bytes(self.peak_scratch_bytes)}")
+        lines.append("Expected peak memory usage: "
+                     f"{_format_bytes(self.peak_memory_bytes)}")
+        lines.append(
+            f"Estimated wall time: {_format_seconds(self.makespan)}")
+        return "\n".join(lines)
+
+    @property
+    def peak_memory_bytes(self) -> int:
+        """Memory of the largest units that can run at once."""
+        largest = sorted((unit.memory_bytes for unit in self.order),
+                         reverse=True)
+        return sum(largest[:self.workers])
+
+
+class Shard:
+    """One of a fixed number of deterministic partitions of the work.
+
+    Units are partitioned by item group, so every COG of an item is built by
+    the same shard, and groups are balanced across shards largest first. Any
+    node computes the same partition from the same shard count.
+
+    Args:
+        index (int): Index of the shard, from 1 to count.
+        count (int): Number of shards.
+    """
+    def __init__(self, index: int, count: int):
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f"Invalid shard {index}/{count}")
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def parse(cls, shard: str) -> "Shard":
+        """Parses a shard given as "i/N", such as "2/8"."""
+        match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", shard)
+        if match is None:
+            raise ValueError(f"Could not parse shard {shard}, expected i/N")
+        return cls(int(match.group(1)), int(match.group(2)))
+
+    @property
+    def name(self) -> str:
+        return f"shard-{self.index}-of-{self.count}"
+
+    def select(self, units: List[WorkUnit]) -> List[WorkUnit]:
+        """The units of work of this shard.
+
+        Args:
+            units (List[WorkUnit]): Every unit of work.
+
+        Returns:
+            List[WorkUnit]: The units assigned to this shard.
+        """
+        groups: Dict[str, List[WorkUnit]] = defaultdict(list)
+        for unit in units:
+            groups[unit.item_group].append(unit)
+        costs = {
+            key: sum(unit.pixels for unit in group)
+            for key, group in groups.items()
+        }
+        loads = [(0, index) for index in range(1, self.count + 1)]
+        selected = []
+        for key in sorted(groups, key=lambda k: (-costs[k], k)):
+            load, index = heapq.heappop(loads)
+            if index == self.index:
+                selected.extend(groups[key])
+            heapq.heappush(loads, (load + costs[key], index))
+        return selected
+
+    def __repr__(self) -> str:
+        return f"Shard({self.index}, {self.count})"
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TiB"
+
+
+def _format_seconds(seconds: float) -> str:
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
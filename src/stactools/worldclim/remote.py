@@ -0,0 +1,81 @@
+import contextlib
+import math
+from typing import ContextManager, Iterator, Tuple
+from urllib.parse import urlparse
+
+import rasterio
+from rasterio.io import DatasetReader
+
+REMOTE_SCHEMES = ["http", "https", "s3", "gs", "az"]
+
+# GDAL configuration for reading COG headers over HTTP/S3 with as few
+# requests as possible
+REMOTE_READ_OPTIONS = {
+    # Don't list the parent "directory" or probe for sidecar files
+    "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+    "CPL_VSIL_CURL_ALLOWED_EXTENSIONS": ".tif",
+    # Fetch the whole COG header, with the IFDs and tile offsets of a
+    # 10800x10800 tile with 512x512 blocks and its overviews, in one request
+    "GDAL_INGESTED_BYTES_AT_OPEN": 32768,
+    # Reuse connections and merge adjacent block reads
+    "GDAL_HTTP_MULTIPLEX": "YES",
+    "GDAL_HTTP_VERSION": "2",
+    "GDAL_HTTP_MERGE_CONSECUTIVE_RANGES": "YES",
+    "VSI_CACHE": "TRUE",
+}
+
+
+def is_remote(href: str) -> bool:
+    """Whether an HREF is read over the network."""
+    return (urlparse(href).scheme in REMOTE_SCHEMES
+            or href.startswith("/vsicurl") or href.startswith("/vsis3"))
+
+
+def read_env(href: str) -> ContextManager:
+    """A rasterio environment tuned for reading an HREF.
+
+    Remote HREFs get REMOTE_READ_OPTIONS, local files the default GDAL
+    configuration.
+
+    Args:
+        href (str): HREF of the raster that will be read.
+
+    Returns:
+        ContextManager: The rasterio environment.
+    """
+    if is_remote(href):
+        return rasterio.Env(**REMOTE_READ_OPTIONS)
+    return contextlib.nullcontext()
+
+
+@contextlib.contextmanager
+def open_dataset(href: str) -> Iterator[DatasetReader]:
+    """Opens a raster with read_env, in about one request for remote COGs.
+
+    Args:
+        href (str): HREF of the raster to open.
+
+    Returns:
+        Iterator[DatasetReader]: The open dataset.
+    """
+    with read_env(href):
+        with rasterio.open(href) as dataset:
+            yield dataset
+
+
+def overview_shape(dataset: DatasetReader, max_size: int) -> Tuple[int, int]:
+    """Shape of a decimated read of a dataset that GDAL serves from its
+    smallest overview, with at most max_size pixels on the longest side.
+
+    Args:
+        dataset (DatasetReader): The open dataset.
+        max_size (int): Longest side of the read in pixels.
+
+    Returns:
+        Tuple[int, int]: Height and width of the read.
+    """
+    factor = max(
+        dataset.overviews(1)[-1:] +
+        [math.ceil(max(dataset.width, dataset.height) / max_size)])
+    return (max(1, math.ceil(dataset.height / factor)),
+            max(1, math.ceil(dataset.width / factor)))
@@ -0,0 +1,357 @@
+import logging
+import re
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from http.client import HTTPException
+from subprocess import CalledProcessError, TimeoutExpired
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.error import HTTPError
+
+from stactools.worldclim.constants import RETRY_BACKOFF_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SIZE_UNITS = {
+    "": 1,
+    "K": 1024,
+    "M": 1024**2,
+    "G": 1024**3,
+    "T": 1024**4,
+}
+
+
+def parse_size(size: str) -> int:
+    """Parses a human readable size such as "500M" or "1.5G" into bytes.
+
+    Args:
+        size (str): A number of bytes, optionally suffixed with K, M, G or T.
+
+    Returns:
+        int: The size in bytes.
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*",
+                         size.upper())
+    if match is None:
+        raise ValueError(f"Could not parse size {size}")
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[unit])
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether an error may not happen again when its task is retried.
+
+    Network errors, server errors, timeouts and failures of GDAL processes
+    or I/O are transient. Missing files, client errors and errors in the
+    data, such as a ValueError, are not.
+
+    Args:
+        error (BaseException): The error raised by a task.
+
+    Returns:
+        bool: True if the task is worth retrying.
+    """
+    if isinstance(error, HTTPError):
+        return error.code >= 500 or error.code in (408, 429)
+    if isinstance(error, (CalledProcessError, TimeoutExpired, HTTPException)):
+        return True
+    if isinstance(error, (FileNotFoundError, FileExistsError, PermissionError,
+                          IsADirectoryError, NotADirectoryError)):
+        return False
+    # Including URLError, ConnectionError, TimeoutError and rasterio's
+    # RasterioIOError
+    return isinstance(error, OSError)
+
+
+class RetryPolicy:
+    """How tasks are retried after transient errors.
+
+    Args:
+        retries (int, optional): Times a task is retried after a transient
+            error, see is_transient. Defaults to 0.
+        backoff (float, optional): Seconds waited before the first retry,
+            doubled before each of the next ones.
+        timeout (float, optional): Seconds after which a download or GDAL
+            process of a task is abandoned with a transient error. Other
+            steps of a task, e.g. rasterio reads, are not interrupted.
+            Defaults to no timeout.
+    """
+    def __init__(
+        self,
+        retries: int = 0,
+        backoff: float = RETRY_BACKOFF_SECONDS,
+        timeout: Optional[float] = None,
+    ):
+        if retries < 0:
+            raise ValueError(f"Retries must not be negative, got {retries}")
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait before retrying after a failed attempt, from 1."""
+        return self.backoff * 2**(attempt - 1)
+
+    def __repr__(self) -> str:
+        return (f"RetryPolicy(retries={self.retries}, "
+                f"backoff={self.backoff}, timeout={self.timeout})")
+
+
+class TaskFailure:
+    """A task that failed, after all of its attempts.
+
+    Args:
+        task (Task): The task.
+        error (BaseException): The error of its last attempt.
+        attempts (int): Number of times it was run.
+    """
+    def __init__(self, task: "Task", error: BaseException, attempts: int):
+        self.task = task
+        self.error = error
+        self.attempts = attempts
+
+    def __repr__(self) -> str:
+        return (f"TaskFailure({self.task.name!r}, {self.error!r}, "
+                f"attempts={self.attempts})")
+
+
+class _TaskError(Exception):
+    # Carries the number of attempts of a failed task out of its worker
+    def __init__(self, error: BaseException, attempts: int):
+        super().__init__(str(error))
+        self.error = error
+        self.attempts = attempts
+
+
+class SharedResource:
+    """Scratch disk used by several tasks, such as a downloaded archive.
+
+    The resource is reserved when the first of its tasks starts and released
+    when the last one finishes.
+
+    Args:
+        name (str): Name used in log messages.
+        scratch_bytes (int): Scratch disk used by the resource.
+        release (Callable, optional): Called once the last task using the
+            resource has finished, to delete it.
+    """
+    def __init__(
+        self,
+        name: str,
+        scratch_bytes: int,
+        release: Optional[Callable[[], None]] = None,
+    ):
+        self.name = name
+        self.scratch_bytes = scratch_bytes
+        self.release = release
+
+    def __repr__(self) -> str:
+        return (f"SharedResource({self.name!r}, "
+                f"scratch_bytes={self.scratch_bytes})")
+
+
+class Task:
+    """A unit of work with its peak scratch disk and memory requirements.
+
+    Args:
+        name (str): Name used in log messages.
+        run (Callable): Function doing the work. It must delete its
+            intermediate files before returning.
+        scratch_bytes (int, optional): Peak scratch disk used by the task.
+        memory_bytes (int, optional): Peak memory used by the task.
+        resource (SharedResource, optional): Scratch disk the task shares
+            with other tasks.
+    """
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[], None],
+        scratch_bytes: int = 0,
+        memory_bytes: int = 0,
+        resource: Optional[SharedResource] = None,
+    ):
+        self.name = name
+        self.run = run
+        self.scratch_bytes = scratch_bytes
+        self.memory_bytes = memory_bytes
+        self.resource = resource
+
+    def __repr__(self) -> str:
+        return (f"Task({self.name!r}, scratch_bytes={self.scratch_bytes}, "
+                f"memory_bytes={self.memory_bytes})")
+
+
+class BudgetScheduler:
+    """Runs tasks in parallel without exceeding scratch disk and memory budgets.
+
+    A task is only started once its scratch and memory requirements fit in
+    what is left of the budgets, and its reservation is released as soon as
+    it finishes. When the next task does not fit, a later one that does is
+    started instead, so small conversions fill the gaps left by large ones.
+    Shared resources are reserved from the start of their first task to the
+    end of their last.
+
+    Args:
+        scratch_budget (int, optional): Scratch disk budget in bytes.
+            Defaults to no limit.
+        memory_budget (int, optional): Memory budget in bytes. Defaults to no
+            limit.
+        max_workers (int, optional): Maximum number of concurrent tasks.
+            Defaults to 1.
+        retry (RetryPolicy, optional): How tasks are retried after transient
+            errors. Defaults to not retrying.
+
+    Tasks run in threads of the calling process, so they are not isolated
+    from each other: a task that hangs or crashes the interpreter outside of
+    a subprocess or a download stalls or stops the whole run.
+    """
+    def __init__(
+        self,
+        scratch_budget: Optional[int] = None,
+        memory_budget: Optional[int] = None,
+        max_workers: int = 1,
+        retry: Optional[RetryPolicy] = None,
+    ):
+        self.scratch_budget = scratch_budget
+        self.memory_budget = memory_budget
+        self.max_workers = max_workers
+        self.retry = retry or RetryPolicy()
+        self.scratch_in_use = 0
+        self.memory_in_use = 0
+        self._lock = threading.Lock()
+        # Number of unfinished tasks of each resource held
+        self._holders: Dict[SharedResource, int] = {}
+
+    def _scratch_needed(self, task: Task) -> int:
+        scratch_bytes = task.scratch_bytes
+        if task.resource is not None and task.resource not in self._holders:
+            scratch_bytes += task.resource.scratch_bytes
+        return scratch_bytes
+
+    def check(self, task: Task) -> None:
+        """Raises a ValueError if a task can never fit in the budgets."""
+        scratch_bytes = task.scratch_bytes
+        if task.resource is not None:
+            scratch_bytes += task.resource.scratch_bytes
+        if (self.scratch_budget is not None
+                and scratch_bytes > self.scratch_budget):
+            raise ValueError(
+                f"{task.name} needs {scratch_bytes} bytes of scratch "
+                f"disk, more than the budget of {self.scratch_budget}")
+        if (self.memory_budget is not None
+                and task.memory_bytes > self.memory_budget):
+            raise ValueError(
+                f"{task.name} needs {task.memory_bytes} bytes of memory, "
+                f"more than the budget of {self.memory_budget}")
+
+    def fits(self, task: Task) -> bool:
+        with self._lock:
+            if (self.scratch_budget is not None
+                    and self.scratch_in_use + self._scratch_needed(task) >
+                    self.scratch_budget):
+                return False
+            if (self.memory_budget is not None and
+                    self.memory_in_use + task.memory_bytes > self.memory_budget):
+                return False
+            return True
+
+    def _reserve(self, task: Task, remaining: Dict[SharedResource,
+                                                   int]) -> None:
+        with self._lock:
+            self.scratch_in_use += self._scratch_needed(task)
+            self.memory_in_use += task.memory_bytes
+            if (task.resource is not None
+                    and task.resource not in self._holders):
+                self._holders[task.resource] = remaining[task.resource]
+
+    def _release(self, task: Task) -> None:
+        released = None
+        with self._lock:
+            self.scratch_in_use -= task.scratch_bytes
+            self.memory_in_use -= task.memory_bytes
+            if task.resource is not None:
+                self._holders[task.resource] -= 1
+                if self._holders[task.resource] == 0:
+                    del self._holders[task.resource]
+                    self.scratch_in_use -= task.resource.scratch_bytes
+                    released = task.resource
+        if released is not None and released.release is not None:
+            logger.info(f"Releasing {released.name}")
+            released.release()
+
+    def _attempt(self, task: Task) -> None:
+        # Runs a task in a worker, retrying it after transient errors. Its
+        # reservation is held while it waits to be retried.
+        attempt = 1
+        while True:
+            try:
+                task.run()
+                return
+            except Exception as e:
+                if attempt > self.retry.retries or not is_transient(e):
+                    raise _TaskError(e, attempt) from e
+                delay = self.retry.delay(attempt)
+                logger.warning(f"{task.name} failed with {e!r}, retrying in "
+                               f"{delay:.1f}s ({attempt}/{self.retry.retries})")
+                time.sleep(delay)
+                attempt += 1
+
+    def run(self,
+            tasks: Iterable[Task],
+            keep_going: bool = False) -> List[TaskFailure]:
+        """Runs all tasks.
+
+        Args:
+            tasks (Iterable[Task]): Tasks in their preferred start order.
+            keep_going (bool, optional): Run every other task when a task
+                fails, instead of raising its error once the running tasks
+                have been cancelled. Defaults to False.
+
+        Returns:
+            List[TaskFailure]: The tasks that failed, only with keep_going.
+        """
+        pending: List[Task] = list(tasks)
+        remaining: Dict[SharedResource, int] = {}
+        for task in pending:
+            self.check(task)
+            if task.resource is not None:
+                remaining[task.resource] = remaining.get(task.resource,
+                                                         0) + 1
+
+        failures: List[TaskFailure] = []
+        running: Dict[Future, Task] = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            try:
+                while pending or running:
+                    while len(running) < self.max_workers:
+                        fitting = [t for t in pending if self.fits(t)]
+                        if not fitting:
+                            break
+                        pending.remove(fitting[0])
+                        self._reserve(fitting[0], remaining)
+                        logger.info(f"Starting {fitting[0].name}")
+                        running[executor.submit(self._attempt,
+                                                fitting[0])] = fitting[0]
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        task = running.pop(future)
+                        self._release(task)
+                        try:
+                            future.result()
+                        except _TaskError as e:
+                            if not keep_going:
+                                raise e.error
+                            logger.error(f"{task.name} failed after "
+                                         f"{e.attempts} attempts: {e.error!r}")
+                            failures.append(
+                                TaskFailure(task, e.error, e.attempts))
+            except BaseException:
+                for future in running:
+                    future.cancel()
+                raise
+        return failures
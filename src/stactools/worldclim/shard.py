@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+from glob import glob
+from tempfile import NamedTemporaryFile
+from typing import Any, Dict, List
+
+from pystac import Collection, Item
+
+from stactools.worldclim.planner import Shard
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_GLOB = "shard-*-of-*.json"
+
+
+def manifest_path(destination: str, shard: Shard) -> str:
+    return os.path.join(destination, f"{shard.name}.json")
+
+
+def save_shard(
+    collection: Collection,
+    items: List[Item],
+    destination: str,
+    shard: Shard,
+) -> None:
+    """Saves the items of a shard and the manifest listing them.
+
+    Items are laid out as they are in a full collection, with links to the
+    collection JSON that merge_shards writes once every shard is done.
+
+    Args:
+        collection (Collection): The collection the items will belong to.
+        items (List[Item]): Items created by the shard.
+        destination (str): Directory of the collection.
+        shard (Shard): The shard.
+    """
+    collection.add_items(items)
+    collection.normalize_hrefs(destination)
+    collection.make_all_asset_hrefs_relative()
+    item_hrefs = []
+    for item in items:
+        item.save_object(include_self_link=False)
+        item_hrefs.append(os.path.relpath(item.self_href, destination))
+
+    manifest = {
+        "collection": collection.id,
+        "index": shard.index,
+        "count": shard.count,
+        "items": item_hrefs,
+    }
+    # Written last and atomically, so a manifest means a finished shard
+    with NamedTemporaryFile("w", dir=destination, delete=False) as tmp_file:
+        json.dump(manifest, tmp_file, indent=2)
+    os.replace(tmp_file.name, manifest_path(destination, shard))
+    logger.info(f"Saved {len(item_hrefs)} items of {shard.name}")
+
+
+def read_manifests(destination: str,
+                   collection_id: str) -> List[Dict[str, Any]]:
+    """Reads the manifests of every shard of a run.
+
+    Args:
+        destination (str): Directory of the collection.
+        collection_id (str): ID of the collection the shards belong to.
+
+    Returns:
+        List[Dict[str, Any]]: The manifests, ordered by shard index.
+    """
+    manifests = []
+    for path in glob(os.path.join(destination, MANIFEST_GLOB)):
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest["collection"] == collection_id:
+            manifests.append(manifest)
+    if not manifests:
+        raise FileNotFoundError(
+            f"No shards of {collection_id} found in {destination}")
+
+    counts = set(manifest["count"] for manifest in manifests)
+    if len(counts) > 1:
+        raise ValueError(
+            f"Shards of runs with different shard counts {sorted(counts)} "
+            f"found in {destination}")
+    count = counts.pop()
+    found = set(manifest["index"] for manifest in manifests)
+    missing = sorted(set(range(1, count + 1)) - found)
+    if missing:
+        raise ValueError(f"Shards {missing} of {count} have not finished")
+    return sorted(manifests, key=lambda manifest: manifest["index"])
+
+
+def merge_shards(collection: Collection, destination: str) -> Collection:
+    """Assembles the items saved by every shard into one collection.
+
+    Only the item JSON files are read, not the rasters.
+
+    Args:
+        collection (Collection): The empty collection.
+        destination (str): Directory of the collection, where the shards
+            saved their items.
+
+    Returns:
+        Collection: The saved collection.
+    """
+    for manifest in read_manifests(destination, collection.id):
+        items = [
+            Item.from_file(os.path.join(destination, href))
+            for href in manifest["items"]
+        ]
+        collection.add_items(items)
+        logger.info(f"Merged {len(items)} items of shard "
+                    f"{manifest['index']}/{manifest['count']}")
+    logger.info("Saving collection")
+    collection.normalize_hrefs(destination)
+    collection.make_all_asset_hrefs_relative()
+    collection.save(dest_href=destination)
+    return collection
@@ -3,10 +3,12 @@ import logging
 import os
 import re
 from datetime import datetime, timedelta, timezone
-from typing import Callable, Optional
+from functools import lru_cache
+from glob import glob
+from typing import Any, Callable, Dict, List, Optional
 
-import rasterio
 import shapely
+import stactools.core
 from pystac import (
     Asset,
     CatalogType,
@@ -19,6 +21,7 @@ from pystac import (
 )
 from pystac.extensions.item_assets import AssetDefinition, ItemAssetsExtension
 from pystac.extensions.projection import ProjectionExtension
+from pystac.extensions.raster import DataType, RasterBand, RasterExtension
 from pystac.extensions.scientific import ScientificExtension
 from pystac.extensions.version import VersionExtension
 from stactools.core.io import ReadHrefModifier
@@ -30,6 +33,8 @@ from stactools.worldclim.constants import (
     DESCRIPTION,
     DOI,
     END_YEAR,
+    INT16_ENCODINGS,
+    INT16_NODATA,
     LICENSE,
     LICENSE_LINK,
     MONTHLY_DATA_VARIABLES,
@@ -43,10 +48,31 @@ from stactools.worldclim.constants import (
     WORLDCLIM_TITLE,
     WORLDCLIM_VERSION,
 )
-from stactools.worldclim.enum import Month, Resolution
+from stactools.worldclim.enum import (
+    Encoding,
+    Month,
+    Resolution,
+    StatisticsMode,
+)
+from stactools.worldclim.footprint import data_footprint
+from stactools.worldclim.remote import open_dataset
+from stactools.worldclim.stats import compute_raster_band, scale_offset
+from stactools.worldclim.templates import ItemTemplate
+from stactools.worldclim.utils import cog_output_path
 
 logger = logging.getLogger(__name__)
 
+# Projection extension fields that assets inherit from their item
+PROJECTION_FIELDS = [
+    "proj:code", "proj:epsg", "proj:wkt2", "proj:bbox", "proj:transform",
+    "proj:shape"
+]
+# Fields identifying a CRS by code, which recent versions of the projection
+# extension name proj:code instead of proj:epsg
+PROJECTION_CODE_FIELDS = ["proj:code", "proj:epsg"]
+
+stactools.core.use_fsspec()
+
 
 def create_monthly_collection() -> Collection:
     #  Creates a STAC collection for a WorldClim dataset
@@ -111,12 +137,27 @@ def create_monthly_collection() -> Collection:
 def create_monthly_item(
     cog_href: str,
     cog_href_modifier: Optional[Callable] = None,
+    statistics: Optional[StatisticsMode] = None,
+    footprint: bool = False,
+    compact: bool = False,
+    encoding: Optional[Encoding] = None,
 ) -> Item:
     """Creates a STAC item for a WorldClim dataset.
 
     Args:
         cog_dir_href (str): Directory containing COGs
         cog_href_modifier (ReadHrefModifier, optional): Funtion to apply to the cog_dir_href
+        statistics (StatisticsMode, optional): If set, add raster extension
+            band statistics and histograms to each asset. Defaults to None.
+        footprint (bool, optional): Use the outline of the valid data as the
+            geometry instead of the bounds. Defaults to False.
+        compact (bool, optional): Only keep the projection fields at the
+            item level, without proj:wkt2, as compact_projection does.
+            Defaults to False.
+        encoding (Encoding, optional): Encoding of the item's COGs, whose
+            scales and offsets are then taken from INT16_ENCODINGS. Defaults
+            to the encoding of the given COG, which is always native for
+            prec and srad.
 
     Returns:
         pystac.Item: STAC Item object.
@@ -135,76 +176,166 @@ def create_monthly_item(
     resolution = Resolution(res)
     month = Month(int(m))
 
-    item = None
-    for (data_var, data_var_desc) in MONTHLY_DATA_VARIABLES.items():
-        start_datetime = datetime(
-            START_YEAR,
-            month.value,
+    start_datetime = datetime(
+        START_YEAR,
+        month.value,
+        1,
+        tzinfo=timezone.utc,
+    )
+    if month is Month.DECEMBER:
+        end_datetime = datetime(
+            END_YEAR + 1,
+            1,
             1,
             tzinfo=timezone.utc,
-        )
-        if month is Month.DECEMBER:
-            end_datetime = datetime(
-                END_YEAR + 1,
-                1,
-                1,
-                tzinfo=timezone.utc,
-            ) - timedelta(seconds=1)
-        else:
-            end_datetime = datetime(
-                END_YEAR,
-                month.value + 1,
-                1,
-                tzinfo=timezone.utc,
-            ) - timedelta(seconds=1)
-
-        # use rasterio to open tiff file
-        with rasterio.open(cog_access_href) as dataset:
-            bbox = list(dataset.bounds)
-            geometry = shapely.geometry.mapping(
-                shapely.geometry.box(*bbox, ccw=True))
-            transform = list(dataset.transform)
-            shape = [dataset.height, dataset.width]
-
-        if item is None:
-            # Create item
-            id = f"wc{WORLDCLIM_VERSION}_{resolution.value}_{month.value}"
-            if tile_str:
-                # If tile numbers are found, append them to the id
-                # Should be of format "_i_j"
-                id += tile_str
-            properties = {
-                "title":
-                f"Worldclim {resolution.value} {calendar.month_name[month.value]}",
-                "description": DESCRIPTION,
-            }
-            item = Item(
-                id=id,
-                geometry=geometry,
-                bbox=bbox,
-                datetime=start_datetime,
-                properties=properties,
-                stac_extensions=[],
-            )
-
-            if start_datetime and end_datetime:
-                item.common_metadata.start_datetime = start_datetime
-                item.common_metadata.end_datetime = end_datetime
-
-            item_projection = ProjectionExtension.ext(item,
-                                                      add_if_missing=True)
-            item_projection.epsg = WORLDCLIM_EPSG
-            item_projection.wkt2 = WORLDCLIM_CRS_WKT
-            item_projection.bbox = bbox
-            item_projection.transform = transform
-            item_projection.shape = shape
+        ) - timedelta(seconds=1)
+    else:
+        end_datetime = datetime(
+            END_YEAR,
+            month.value + 1,
+            1,
+            tzinfo=timezone.utc,
+        ) - timedelta(seconds=1)
+
+    # All variables share one grid, so only the given COG's header is read
+    with open_dataset(cog_access_href) as dataset:
+        bbox = list(dataset.bounds)
+        transform = list(dataset.transform)
+        shape = [dataset.height, dataset.width]
+        encoded = scale_offset(dataset) is not None
+    if encoding is not None:
+        encoded = encoding is Encoding.INT16
+
+    # Create item
+    id = f"wc{WORLDCLIM_VERSION}_{resolution.value}_{month.value}"
+    if tile_str:
+        # If tile numbers are found, append them to the id
+        # Should be of format "_i_j"
+        id += tile_str
+
+    title = f"Worldclim {resolution.value} {calendar.month_name[month.value]}"
+    item = _monthly_template(compact).render(
+        id=id,
+        title=title,
+        start_datetime=start_datetime,
+        end_datetime=end_datetime,
+        bbox=bbox,
+        transform=transform,
+        shape=shape,
+        asset_hrefs={
+            data_var: cog_href.replace(cog_var, data_var)
+            for data_var in MONTHLY_DATA_VARIABLES.keys()
+        },
+    )
+
+    if statistics is not None:
+        for cog_asset in item.assets.values():
+            _add_raster_band(cog_asset, cog_href_modifier, statistics)
+    elif encoded:
+        # The variables of an item are converted together, so they share
+        # one encoding
+        for data_var, cog_asset in item.assets.items():
+            if data_var in INT16_ENCODINGS:
+                _add_encoding(cog_asset, *INT16_ENCODINGS[data_var])
+    if footprint:
+        # All variables share one land mask
+        _set_footprint(item, cog_access_href)
+
+    return item
+
+
+def create_monthly_items(
+    cog_directory: str,
+    destination: str,
+    statistics: Optional[StatisticsMode] = None,
+    footprint: bool = False,
+    compact: bool = False,
+    encoding: Optional[Encoding] = None,
+) -> List[Item]:
+    """Moves monthly COGs into one directory per item and creates the items.
+
+    COGs already in their item directory, as the conversion pipeline writes
+    them with item_directories, are used in place. Others are renamed, never
+    copied, so cog_directory must be on the file system of destination.
+
+    Args:
+        cog_directory (str): Directory containing the converted COGs, either
+            directly or in item directories.
+        destination (str): Directory of the collection, in which the item
+            directories are created.
+        statistics (StatisticsMode, optional): If set, add raster extension
+            band statistics and histograms to each asset. Defaults to None.
+        footprint (bool, optional): Use the outline of the valid data as the
+            geometry instead of the bounds. Defaults to False.
+        compact (bool, optional): Only keep the projection fields at the
+            item level, without proj:wkt2. Defaults to False.
+        encoding (Encoding, optional): Encoding of the COGs, as in
+            create_monthly_item. Defaults to reading it from the tmin COGs.
+
+    Returns:
+        List[pystac.Item]: The items, with asset HREFs in their directories.
+    """
+    items = []
+    for file_name in _find_cogs(cog_directory, "*tmin*.tif"):
+        logger.info(f"Processing {file_name}")
+        directory, base_name = os.path.split(file_name)
+        for data_var in MONTHLY_DATA_VARIABLES.keys():
+            _move_to_item_directory(
+                os.path.join(directory, base_name.replace("tmin", data_var)),
+                destination)
+        items.append(
+            create_monthly_item(cog_output_path(destination, base_name, True),
+                                statistics=statistics,
+                                footprint=footprint,
+                                compact=compact,
+                                encoding=encoding))
+    return items
+
+
+def _build_monthly_item(
+    id: str,
+    title: str,
+    start_datetime: datetime,
+    end_datetime: datetime,
+    bbox: List[float],
+    transform: List[float],
+    shape: List[int],
+    asset_hrefs: Dict[str, str],
+) -> Item:
+    # Builds a monthly item field by field with pystac. Used once to make the
+    # template that create_monthly_item renders.
+    geometry = shapely.geometry.mapping(shapely.geometry.box(*bbox, ccw=True))
+    properties = {
+        "title": title,
+        "description": DESCRIPTION,
+    }
+    item = Item(
+        id=id,
+        geometry=geometry,
+        bbox=bbox,
+        datetime=start_datetime,
+        properties=properties,
+        stac_extensions=[],
+    )
 
+    if start_datetime and end_datetime:
+        item.common_metadata.start_datetime = start_datetime
+        item.common_metadata.end_datetime = end_datetime
+
+    item_projection = ProjectionExtension.ext(item, add_if_missing=True)
+    item_projection.epsg = WORLDCLIM_EPSG
+    item_projection.wkt2 = WORLDCLIM_CRS_WKT
+    item_projection.bbox = bbox
+    item_projection.transform = transform
+    item_projection.shape = shape
+
+    for (data_var, data_var_desc) in MONTHLY_DATA_VARIABLES.items():
         cog_asset = Asset(
             title=data_var,
             description=data_var_desc,
             media_type=MediaType.TIFF,
             roles=["data"],
-            href=cog_href.replace(cog_var, data_var),
+            href=asset_hrefs[data_var],
         )
         item.add_asset(data_var, cog_asset)
 
@@ -217,8 +348,6 @@ def create_monthly_item(
         cog_asset_proj.bbox = item_projection.bbox
         cog_asset_proj.shape = item_projection.shape
 
-    assert (item is not None)
-
     # scientific extension
     sci_ext = ScientificExtension.ext(item, add_if_missing=True)
     sci_ext.doi = DOI
@@ -227,6 +356,27 @@ def create_monthly_item(
     return item
 
 
+@lru_cache(maxsize=None)
+def _monthly_template(compact: bool = False) -> ItemTemplate:
+    prototype = _build_monthly_item(
+        id="template",
+        title="",
+        start_datetime=datetime(START_YEAR, 1, 1, tzinfo=timezone.utc),
+        end_datetime=datetime(START_YEAR, 1, 1, tzinfo=timezone.utc),
+        bbox=[0., 0., 0., 0.],
+        transform=[0.] * 9,
+        shape=[0, 0],
+        asset_hrefs={
+            data_var: ""
+            for data_var in MONTHLY_DATA_VARIABLES.keys()
+        },
+    )
+    if compact:
+        # Every asset is rendered with the grid of the item
+        compact_projection(prototype)
+    return ItemTemplate(prototype)
+
+
 # create collection for bioclim variables
 # month data not stored in bioclim variables
 def create_bioclim_collection() -> Collection:
@@ -289,12 +439,22 @@ def create_bioclim_collection() -> Collection:
 def create_bioclim_item(
     cog_href: str,
     cog_href_modifier: Optional[ReadHrefModifier] = None,
+    statistics: Optional[StatisticsMode] = None,
+    footprint: bool = False,
+    compact: bool = False,
 ) -> Item:
     """Creates a STAC item for a WorldClim Bioclimatic dataset.
 
     Args:
         cog_dir_href (str): Directory containing COGs
         cog_href_modifier (ReadHrefModifier, optional): Funtion to apply to the cog_dir_href
+        statistics (StatisticsMode, optional): If set, add raster extension
+            band statistics and histograms to the asset. Defaults to None.
+        footprint (bool, optional): Use the outline of the valid data as the
+            geometry instead of the bounds. Defaults to False.
+        compact (bool, optional): Only keep the projection fields at the
+            item level, without proj:wkt2, as compact_projection does.
+            Defaults to False.
 
     Returns:
         pystac.Item: STAC Item object.
@@ -327,12 +487,11 @@ def create_bioclim_item(
     ) - timedelta(seconds=1)
 
     # use rasterio to open tiff file
-    with rasterio.open(cog_access_href) as dataset:
+    with open_dataset(cog_access_href) as dataset:
         bbox = list(dataset.bounds)
-        geometry = shapely.geometry.mapping(
-            shapely.geometry.box(*bbox, ccw=True))
         transform = list(dataset.transform)
         shape = [dataset.height, dataset.width]
+        encoding = scale_offset(dataset)
 
     # Create item
     id = f"wc{WORLDCLIM_VERSION}_{resolution.value}_{bio_var}"
@@ -341,6 +500,96 @@ def create_bioclim_item(
         # Should be of format "_i_j"
         id += tile_str
 
+    item = _bioclim_template(bio_var, compact).render(
+        id=id,
+        title=f"Worldclim {bio_var_desc}",
+        start_datetime=start_datetime,
+        end_datetime=end_datetime,
+        bbox=bbox,
+        transform=transform,
+        shape=shape,
+        asset_hrefs={"data": cog_href},
+    )
+
+    if statistics is not None:
+        _add_raster_band(item.assets["data"], cog_href_modifier, statistics)
+    elif encoding is not None:
+        _add_encoding(item.assets["data"], *encoding)
+    if footprint:
+        _set_footprint(item, cog_access_href)
+
+    return item
+
+
+def create_bioclim_items(
+    cog_directory: str,
+    destination: str,
+    statistics: Optional[StatisticsMode] = None,
+    footprint: bool = False,
+    compact: bool = False,
+) -> List[Item]:
+    """Moves bioclimatic COGs into one directory per item and creates the
+    items.
+
+    COGs already in their item directory are used in place, and others are
+    renamed, as in create_monthly_items.
+
+    Args:
+        cog_directory (str): Directory containing the converted COGs, either
+            directly or in item directories.
+        destination (str): Directory of the collection, in which the item
+            directories are created.
+        statistics (StatisticsMode, optional): If set, add raster extension
+            band statistics and histograms to the asset. Defaults to None.
+        footprint (bool, optional): Use the outline of the valid data as the
+            geometry instead of the bounds. Defaults to False.
+        compact (bool, optional): Only keep the projection fields at the
+            item level, without proj:wkt2. Defaults to False.
+
+    Returns:
+        List[pystac.Item]: The items, with asset HREFs in their directories.
+    """
+    items = []
+    for file_name in _find_cogs(cog_directory, "*.tif"):
+        logger.info(f"Processing {file_name}")
+        items.append(
+            create_bioclim_item(_move_to_item_directory(file_name, destination),
+                                statistics=statistics,
+                                footprint=footprint,
+                                compact=compact))
+    return items
+
+
+def _find_cogs(cog_directory: str, pattern: str) -> List[str]:
+    """COGs directly in a directory or in its item directories."""
+    return sorted(
+        glob(os.path.join(cog_directory, pattern)) +
+        glob(os.path.join(cog_directory, "*", pattern)))
+
+
+def _move_to_item_directory(file_name: str, destination: str) -> str:
+    """Renames a COG into its item directory unless it is there already."""
+    path = cog_output_path(destination, os.path.basename(file_name), True)
+    if os.path.abspath(file_name) != os.path.abspath(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(file_name, path)
+    return path
+
+
+def _build_bioclim_item(
+    id: str,
+    bio_var: str,
+    start_datetime: datetime,
+    end_datetime: datetime,
+    bbox: List[float],
+    transform: List[float],
+    shape: List[int],
+    href: str,
+) -> Item:
+    # Builds a bioclim item field by field with pystac. Used once per
+    # variable to make the template that create_bioclim_item renders.
+    bio_var_desc = BIOCLIM_VARIABLES[bio_var]
+    geometry = shapely.geometry.mapping(shapely.geometry.box(*bbox, ccw=True))
     properties = {
         "title": f"Worldclim {bio_var_desc}",
         "description": BIOCLIM_DESCRIPTION,
@@ -370,7 +619,7 @@ def create_bioclim_item(
         description=bio_var_desc,
         media_type=MediaType.TIFF,
         roles=["data"],
-        href=cog_href,
+        href=href,
     )
     item.add_asset("data", cog_asset)
 
@@ -388,3 +637,92 @@ def create_bioclim_item(
     sci_ext.citation = CITATION
 
     return item
+
+
+@lru_cache(maxsize=None)
+def _bioclim_template(bio_var: str, compact: bool = False) -> ItemTemplate:
+    prototype = _build_bioclim_item(
+        id="template",
+        bio_var=bio_var,
+        start_datetime=datetime(START_YEAR, 1, 1, tzinfo=timezone.utc),
+        end_datetime=datetime(START_YEAR, 1, 1, tzinfo=timezone.utc),
+        bbox=[0., 0., 0., 0.],
+        transform=[0.] * 9,
+        shape=[0, 0],
+        href="",
+    )
+    if compact:
+        compact_projection(prototype)
+    return ItemTemplate(prototype)
+
+
+def compact_projection(item: Item) -> Item:
+    """Removes repeated projection fields from an item and its assets.
+
+    Assets inherit the projection fields of their item, so a field that
+    every asset shares is kept on the item only. proj:wkt2, most of the
+    bytes of the projection fields, is dropped wherever proj:code or
+    proj:epsg already identifies the CRS. The item stays valid STAC.
+
+    Args:
+        item (Item): The item, modified in place.
+
+    Returns:
+        pystac.Item: The item.
+    """
+    assets = list(item.assets.values())
+    item_has_code = _has_projection_code(item.properties)
+    if item_has_code:
+        item.properties.pop("proj:wkt2", None)
+    for asset in assets:
+        if item_has_code or _has_projection_code(asset.extra_fields):
+            asset.extra_fields.pop("proj:wkt2", None)
+
+    for field in PROJECTION_FIELDS:
+        values = [asset.extra_fields.get(field) for asset in assets]
+        if not values or values[0] is None or any(value != values[0]
+                                                  for value in values):
+            continue
+        if item.properties.setdefault(field, values[0]) != values[0]:
+            continue
+        for asset in assets:
+            del asset.extra_fields[field]
+    return item
+
+
+def _has_projection_code(fields: Dict[str, Any]) -> bool:
+    return any(fields.get(field) is not None for field in PROJECTION_CODE_FIELDS)
+
+
+def _add_raster_band(
+    asset: Asset,
+    cog_href_modifier: Optional[ReadHrefModifier],
+    statistics: StatisticsMode,
+) -> None:
+    # Adds raster extension band statistics read from the asset's COG
+    href = asset.href
+    if cog_href_modifier is not None:
+        href = cog_href_modifier(href)
+    asset_raster = RasterExtension.ext(asset, add_if_missing=True)
+    asset_raster.bands = [compute_raster_band(href, statistics)]
+
+
+def _add_encoding(asset: Asset, scale: float, offset: float) -> None:
+    # Records the int16 encoding of the asset's COG in raster:bands
+    asset_raster = RasterExtension.ext(asset, add_if_missing=True)
+    asset_raster.bands = [
+        RasterBand.create(nodata=INT16_NODATA,
+                          data_type=DataType.INT16,
+                          scale=scale,
+                          offset=offset)
+    ]
+
+
+def _set_footprint(item: Item, href: str) -> None:
+    # Replaces the item's bounding box geometry with its data footprint
+    geometry = data_footprint(href)
+    if geometry is None:
+        logger.warning(f"{href} has no valid data, keeping its bounds")
+        return
+    item.geometry = geometry
+    item.bbox = list(shapely.geometry.shape(geometry).bounds)
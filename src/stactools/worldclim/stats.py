@@ -0,0 +1,221 @@
+import logging
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+import rasterio
+from pystac.extensions.raster import (
+    DataType,
+    Histogram,
+    RasterBand,
+    Statistics,
+)
+from rasterio.windows import Window
+
+from stactools.worldclim.constants import (
+    APPROXIMATE_STATISTICS_MAX_SIZE,
+    HISTOGRAM_BUCKETS,
+)
+from stactools.worldclim.enum import StatisticsMode
+from stactools.worldclim.remote import open_dataset, overview_shape, read_env
+
+logger = logging.getLogger(__name__)
+
+
+class _Accumulator:
+    """Running count, mean, sum of squared deviations, extrema and histogram
+    of the valid pixels seen so far.
+
+    Partial accumulators computed on separate blocks are combined with
+    Chan's parallel algorithm, so blocks can be processed in any order.
+    Without a histogram range, no histogram is computed.
+    """
+    def __init__(self, hist_range: Optional[Tuple[float, float]],
+                 buckets: int):
+        self.hist_range = hist_range
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.buckets = np.zeros(buckets, dtype=np.int64)
+
+    def add_values(self, values: np.ndarray) -> None:
+        if values.size == 0:
+            return
+        values = values.astype(np.float64)
+        block = _Accumulator(self.hist_range, len(self.buckets))
+        block.count = values.size
+        block.mean = float(values.mean())
+        block.m2 = float(((values - block.mean)**2).sum())
+        block.minimum = float(values.min())
+        block.maximum = float(values.max())
+        if self.hist_range is not None:
+            block.buckets, _ = np.histogram(values,
+                                            bins=len(self.buckets),
+                                            range=self.hist_range)
+        self.merge(block)
+
+    def merge(self, other: "_Accumulator") -> None:
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.buckets += other.buckets
+
+    def to_raster_band(
+        self,
+        total_pixels: int,
+        nodata: Optional[float],
+        data_type: Optional[DataType],
+        scale: Optional[float] = None,
+        offset: Optional[float] = None,
+    ) -> RasterBand:
+        valid_percent = 0.0
+        if total_pixels:
+            valid_percent = 100.0 * self.count / total_pixels
+        statistics = Statistics.create(valid_percent=valid_percent)
+        histogram = None
+        if self.count:
+            statistics.minimum = self.minimum
+            statistics.maximum = self.maximum
+            statistics.mean = self.mean
+            statistics.stddev = math.sqrt(self.m2 / self.count)
+        if self.count and self.hist_range is not None:
+            low, high = self.hist_range
+            histogram = Histogram.create(count=len(self.buckets),
+                                         min=low,
+                                         max=high,
+                                         buckets=self.buckets.tolist())
+        return RasterBand.create(nodata=nodata,
+                                 data_type=data_type,
+                                 statistics=statistics,
+                                 histogram=histogram,
+                                 scale=scale,
+                                 offset=offset)
+
+
+def _data_type(dtype: str) -> Optional[DataType]:
+    try:
+        return DataType(dtype)
+    except ValueError:
+        return None
+
+
+def scale_offset(dataset) -> Optional[Tuple[float, float]]:
+    """Scale and offset of the first band of a dataset.
+
+    None if the values are stored unscaled; int16 encoded COGs return their
+    scale and offset."""
+    scale, offset = dataset.scales[0], dataset.offsets[0]
+    if (scale, offset) == (1.0, 0.0):
+        return None
+    return scale, offset
+
+
+def _histogram_range(minimum: float, maximum: float) -> Tuple[float, float]:
+    """Histogram range of values between minimum and maximum, which are inf
+    and -inf if there are no values."""
+    if minimum > maximum:
+        return (0.0, 1.0)
+    if minimum == maximum:
+        return (minimum, minimum + 1.0)
+    return (minimum, maximum)
+
+
+def compute_raster_band(
+    href: str,
+    mode: StatisticsMode = StatisticsMode.EXACT,
+    buckets: int = HISTOGRAM_BUCKETS,
+    max_workers: Optional[int] = None,
+) -> RasterBand:
+    """Computes statistics and a histogram for the first band of a raster.
+
+    In exact mode every block of the full resolution image is read twice, in
+    parallel, and the partial results are merged: once for the minimum and
+    maximum, which are the histogram range, and once for the statistics and
+    histogram. In approximate mode only the smallest overview is read.
+    Nodata pixels are ignored in both modes.
+
+    Args:
+        href (str): HREF of the raster to read.
+        mode (StatisticsMode, optional): Whether to compute exact or
+            approximate statistics. Defaults to StatisticsMode.EXACT.
+        buckets (int, optional): Number of histogram buckets.
+        max_workers (int, optional): Number of threads reading blocks in
+            exact mode. Defaults to the ThreadPoolExecutor default.
+
+    Returns:
+        RasterBand: Raster extension band with statistics and histogram.
+    """
+    logger.info(f"Computing {mode.value} statistics for {href}")
+    with open_dataset(href) as dataset:
+        nodata = dataset.nodata
+        data_type = _data_type(dataset.dtypes[0])
+        scale, offset = scale_offset(dataset) or (None, None)
+        if mode is StatisticsMode.APPROXIMATE:
+            shape = overview_shape(dataset, APPROXIMATE_STATISTICS_MAX_SIZE)
+            overview = dataset.read(1, out_shape=shape,
+                                    masked=True).compressed().astype(
+                                        np.float64)
+            result = _Accumulator(
+                _histogram_range(float(overview.min(initial=np.inf)),
+                                 float(overview.max(initial=-np.inf))),
+                buckets)
+            result.add_values(overview)
+            return result.to_raster_band(shape[0] * shape[1], nodata,
+                                         data_type, scale, offset)
+        windows = [window for _, window in dataset.block_windows(1)]
+        total_pixels = dataset.height * dataset.width
+
+    extrema = _Accumulator(None, buckets)
+    for partial in _map_blocks(href, windows, None, buckets, max_workers):
+        extrema.merge(partial)
+    hist_range = _histogram_range(extrema.minimum, extrema.maximum)
+    result = _Accumulator(hist_range, buckets)
+    for partial in _map_blocks(href, windows, hist_range, buckets,
+                               max_workers):
+        result.merge(partial)
+    return result.to_raster_band(total_pixels, nodata, data_type, scale,
+                                 offset)
+
+
+def _map_blocks(
+    href: str,
+    windows: List[Window],
+    hist_range: Optional[Tuple[float, float]],
+    buckets: int,
+    max_workers: Optional[int],
+) -> Iterator[_Accumulator]:
+    # Dataset handles are not thread safe, so each thread opens its own
+    local = threading.local()
+    datasets = []
+    lock = threading.Lock()
+
+    def read_block(window: Window) -> _Accumulator:
+        partial = _Accumulator(hist_range, buckets)
+        with read_env(href):
+            dataset = getattr(local, "dataset", None)
+            if dataset is None:
+                dataset = rasterio.open(href)
+                local.dataset = dataset
+                with lock:
+                    datasets.append(dataset)
+            partial.add_values(
+                dataset.read(1, window=window, masked=True).compressed())
+        return partial
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for partial in executor.map(read_block, windows):
+                yield partial
+    finally:
+        for dataset in datasets:
+            dataset.close()
@@ -0,0 +1,241 @@
+import logging
+import os
+import posixpath
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from pystac import Collection, Item
+from pystac.stac_io import DefaultStacIO
+
+from stactools.worldclim.constants import UPLOAD_BLOCK_SIZE, UPLOAD_WORKERS
+from stactools.worldclim.utils import item_id
+
+try:
+    import fsspec
+except ImportError as e:
+    raise ImportError(
+        "Writing to object storage needs fsspec and the filesystem of the "
+        "destination, e.g. s3fs, install them with "
+        "pip install stactools-worldclim[storage] s3fs") from e
+
+logger = logging.getLogger(__name__)
+
+
+def is_url(href: str) -> bool:
+    """Whether an HREF is an fsspec URL rather than a local path."""
+    return "://" in href and not href.startswith("file://")
+
+
+class FsspecStacIO(DefaultStacIO):
+    """Reads and writes STAC JSON through fsspec, so collections can be saved
+    to any URL fsspec supports.
+
+    Args:
+        storage_options (Dict[str, Any], optional): Options of the
+            filesystems, e.g. endpoint_url for S3 compatible storage.
+    """
+    def __init__(self, storage_options: Optional[Dict[str, Any]] = None):
+        super().__init__()
+        self.storage_options = storage_options or {}
+
+    def read_text_from_href(self, href: str) -> str:
+        with fsspec.open(href, "r", **self.storage_options) as f:
+            return f.read()
+
+    def write_text_to_href(self, href: str, txt: str) -> None:
+        fs, path = fsspec.core.url_to_fs(href, **self.storage_options)
+        fs.makedirs(posixpath.dirname(path), exist_ok=True)
+        with fs.open(path, "w") as f:
+            f.write(txt)
+
+
+class Uploader:
+    """Uploads files of a local staging directory to a URL in the background.
+
+    Each file is streamed in parts of block_size, which S3 compatible
+    filesystems upload as a multipart upload, and up to max_workers files are
+    uploaded at once while the caller goes on converting the next ones. The
+    layout of the staging directory is kept under the URL.
+
+    Args:
+        staging_dir (str): Local directory mirrored to the URL.
+        url (str): fsspec URL of the destination, e.g. s3://bucket/worldclim.
+        max_workers (int, optional): Number of files uploaded concurrently.
+        block_size (int, optional): Size in bytes of each uploaded part.
+        storage_options (Dict[str, Any], optional): Options of the
+            filesystem, e.g. endpoint_url for S3 compatible storage.
+    """
+    def __init__(
+        self,
+        staging_dir: str,
+        url: str,
+        max_workers: int = UPLOAD_WORKERS,
+        block_size: int = UPLOAD_BLOCK_SIZE,
+        storage_options: Optional[Dict[str, Any]] = None,
+    ):
+        self.staging_dir = staging_dir
+        self.url = url.rstrip("/")
+        self.block_size = block_size
+        self.storage_options = storage_options or {}
+        self.fs, self.root = fsspec.core.url_to_fs(self.url,
+                                                   **self.storage_options)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._futures: List[Future] = []
+        self._uploaded: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def url_for(self, local_path: str) -> str:
+        """URL a file of the staging directory is uploaded to."""
+        relative_path = os.path.relpath(local_path, self.staging_dir)
+        return f"{self.url}/{relative_path.replace(os.sep, '/')}"
+
+    def upload(self, local_path: str, remove: bool = False) -> None:
+        """Starts uploading a file of the staging directory.
+
+        Suitable as the post_hook of the conversion pipeline.
+
+        Args:
+            local_path (str): Path of the file.
+            remove (bool, optional): Delete the file once it is uploaded, so
+                staged files don't build up on the scratch disk. Defaults to
+                False.
+        """
+        relative_path = os.path.relpath(local_path, self.staging_dir)
+        remote_path = posixpath.join(self.root,
+                                     relative_path.replace(os.sep, "/"))
+        future = self._executor.submit(
+            partial(self._put, local_path, remote_path, remove))
+        with self._lock:
+            self._futures.append(future)
+            self._uploaded.add(os.path.abspath(local_path))
+
+    def is_uploaded(self, local_path: str) -> bool:
+        """Whether upload was already called for a file."""
+        with self._lock:
+            return os.path.abspath(local_path) in self._uploaded
+
+    def _put(self, local_path: str, remote_path: str, remove: bool) -> None:
+        self.fs.makedirs(posixpath.dirname(remote_path), exist_ok=True)
+        with open(local_path, "rb") as src:
+            with self.fs.open(remote_path, "wb",
+                              block_size=self.block_size) as dst:
+                for chunk in iter(partial(src.read, self.block_size), b""):
+                    dst.write(chunk)
+        logger.info(f"Uploaded {remote_path}")
+        if remove:
+            os.remove(local_path)
+
+    def wait(self) -> None:
+        """Waits for every upload started so far, raising the first error."""
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self) -> None:
+        """Waits for the uploads and stops the upload threads."""
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> "Uploader":
+        return self
+
+    def __exit__(self, exc_type: Any, *args: Any) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            # Don't start queued uploads of a failed run
+            with self._lock:
+                for future in self._futures:
+                    future.cancel()
+            self._executor.shutdown(wait=True)
+
+
+class StagedItems:
+    """Creates each item as soon as every COG of it is staged, then uploads
+    its COGs and removes them from the staging directory.
+
+    Items read the headers, and with statistics, footprints or thumbnails the
+    pixels, of their COGs. Creating them once the whole run is converted would
+    keep the entire dataset on the scratch disk until the end.
+
+    Args:
+        uploader (Uploader): The uploader of the staging directory.
+        create_item (Callable[[List[str]], Item]): Creates an item from the
+            sorted paths of its COGs.
+        cogs_per_item (int): Number of COGs of each item.
+    """
+    def __init__(
+        self,
+        uploader: Uploader,
+        create_item: Callable[[List[str]], Item],
+        cogs_per_item: int,
+    ):
+        self.uploader = uploader
+        self.create_item = create_item
+        self.cogs_per_item = cogs_per_item
+        self._staged: Dict[str, Set[str]] = defaultdict(set)
+        self._items: List[Item] = []
+        self._lock = threading.Lock()
+
+    def add(self, local_path: str) -> None:
+        """Records a staged COG, creating its item if it is the last one.
+
+        Suitable as the post_hook of the conversion pipeline.
+
+        Args:
+            local_path (str): Path of the COG in the staging directory.
+        """
+        key = item_id(local_path)
+        with self._lock:
+            # A retried file may be staged twice
+            self._staged[key].add(local_path)
+            if len(self._staged[key]) < self.cogs_per_item:
+                return
+            paths = sorted(self._staged.pop(key))
+        item = self.create_item(paths)
+        for path in paths:
+            self.uploader.upload(path, remove=True)
+        with self._lock:
+            self._items.append(item)
+
+    @property
+    def items(self) -> List[Item]:
+        """The items created so far, sorted by ID."""
+        with self._lock:
+            return sorted(self._items, key=lambda item: item.id)
+
+
+def publish_collection(collection: Collection, uploader: Uploader) -> None:
+    """Saves a collection built from staged COGs to the uploader's URL.
+
+    Asset HREFs are pointed at the uploaded COGs, local assets that were not
+    uploaded during the conversion, e.g. thumbnails, are uploaded now, and
+    the JSON is written only once every upload has finished, so published
+    items never link to missing files.
+
+    Args:
+        collection (Collection): Collection whose items were created from
+            COGs in the staging directory.
+        uploader (Uploader): The uploader of the COGs.
+    """
+    for item in collection.get_items(recursive=True):
+        for asset in item.assets.values():
+            href = asset.get_absolute_href() or asset.href
+            if not is_url(href):
+                if not uploader.is_uploaded(href):
+                    uploader.upload(href)
+                asset.href = uploader.url_for(href)
+    uploader.wait()
+
+    logger.info(f"Saving collection to {uploader.url}")
+    destination = f"{uploader.url}/"
+    collection.normalize_hrefs(destination)
+    collection.make_all_asset_hrefs_relative()
+    collection.save(dest_href=destination,
+                    stac_io=FsspecStacIO(uploader.storage_options))
@@ -0,0 +1,99 @@
+from datetime import datetime
+from typing import Any, Dict, List
+
+from pystac import Item
+from pystac.utils import datetime_to_str
+
+
+def box_geometry(bbox: List[float]) -> Dict[str, Any]:
+    """GeoJSON of shapely.geometry.box(*bbox, ccw=True), without shapely."""
+    minx, miny, maxx, maxy = bbox
+    ring = (
+        (maxx, miny),
+        (maxx, maxy),
+        (minx, maxy),
+        (minx, miny),
+        (maxx, miny),
+    )
+    return {"type": "Polygon", "coordinates": (ring, )}
+
+
+class ItemTemplate:
+    """The content shared by a family of items, prepared once.
+
+    The template is the dictionary of a prototype item built with pystac's
+    extension machinery. Rendering copies it, fills in the fields that are
+    specific to one file, and loads the result with Item.from_dict, which
+    skips the extension and asset plumbing of building items field by field.
+
+    Args:
+        prototype (Item): An item of the family. Its file specific fields
+            are replaced on rendering.
+    """
+    def __init__(self, prototype: Item):
+        self.template = prototype.to_dict(include_self_link=False)
+
+    def render(
+        self,
+        id: str,
+        title: str,
+        start_datetime: datetime,
+        end_datetime: datetime,
+        bbox: List[float],
+        transform: List[float],
+        shape: List[int],
+        asset_hrefs: Dict[str, str],
+    ) -> Item:
+        """Creates an item from the template.
+
+        Args:
+            id (str): Item ID.
+            title (str): Item title.
+            start_datetime (datetime): Start of the item's time range, also
+                used as its datetime.
+            end_datetime (datetime): End of the item's time range.
+            bbox (List[float]): Bounds of the COGs.
+            transform (List[float]): Affine transform of the COGs.
+            shape (List[int]): Height and width of the COGs.
+            asset_hrefs (Dict[str, str]): HREF of each asset, by asset key.
+
+        Returns:
+            pystac.Item: STAC Item object.
+        """
+        template = self.template
+        d = dict(template)
+        d["id"] = id
+        d["geometry"] = box_geometry(bbox)
+        d["bbox"] = list(bbox)
+
+        file_fields: Dict[str, List[Any]] = {
+            "proj:bbox": list(bbox),
+            "proj:transform": list(transform),
+            "proj:shape": list(shape),
+        }
+        properties = dict(template["properties"])
+        properties["title"] = title
+        properties["start_datetime"] = datetime_to_str(start_datetime)
+        properties["end_datetime"] = datetime_to_str(end_datetime)
+        properties["datetime"] = properties["start_datetime"]
+        for key, value in file_fields.items():
+            if key in properties:
+                properties[key] = value
+        d["properties"] = properties
+
+        assets = {}
+        for key, template_asset in template["assets"].items():
+            asset = {
+                k: list(v) if isinstance(v, list) else v
+                for k, v in template_asset.items()
+            }
+            asset["href"] = asset_hrefs[key]
+            for field, value in file_fields.items():
+                if field in asset:
+                    asset[field] = list(value)
+            assets[key] = asset
+        d["assets"] = assets
+        d["links"] = [dict(link) for link in template["links"]]
+        d["stac_extensions"] = list(template["stac_extensions"])
+
+        return Item.from_dict(d, migrate=False, preserve_dict=False)
@@ -0,0 +1,153 @@
+import logging
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+import rasterio
+from pystac import Asset, Item, MediaType
+from rasterio.errors import NotGeoreferencedWarning
+
+from stactools.worldclim.constants import (
+    COLORMAPS,
+    MONTHLY_THUMBNAIL_VARIABLE,
+    THUMBNAIL_MAX_SIZE,
+    THUMBNAIL_STYLES,
+)
+from stactools.worldclim.remote import open_dataset, overview_shape
+from stactools.worldclim.stats import scale_offset
+from stactools.worldclim.utils import file_variable
+
+logger = logging.getLogger(__name__)
+
+# rasterio driver, file extension and media type of each thumbnail format
+THUMBNAIL_FORMATS = {
+    "png": ("PNG", "png", MediaType.PNG),
+    "webp": ("WEBP", "webp", "image/webp"),
+}
+
+
+def colorize(data: np.ma.MaskedArray, variable: str) -> np.ndarray:
+    """Applies the colormap of a variable to its values.
+
+    Args:
+        data (np.ma.MaskedArray): Values of the variable, with nodata masked.
+        variable (str): The variable, e.g. tavg or bio_12.
+
+    Returns:
+        np.ndarray: RGBA uint8 array of shape (4, height, width), transparent
+        where the data is masked.
+    """
+    colormap, low, high = THUMBNAIL_STYLES[variable]
+    stops = np.array(COLORMAPS[colormap], dtype=np.float64)
+    position = np.clip((data.filled(low) - low) / (high - low), 0, 1)
+    position = position * (len(stops) - 1)
+    rgba = np.empty((4, ) + data.shape, dtype=np.uint8)
+    for band in range(3):
+        rgba[band] = np.round(
+            np.interp(position, np.arange(len(stops)), stops[:, band]))
+    rgba[3] = np.where(np.ma.getmaskarray(data), 0, 255)
+    return rgba
+
+
+def create_thumbnail(
+    href: str,
+    output_path: str,
+    variable: str,
+    max_size: int = THUMBNAIL_MAX_SIZE,
+    image_format: str = "png",
+) -> None:
+    """Renders a colormapped thumbnail of a COG.
+
+    Only the smallest overview is read, or a decimated read of at most
+    max_size pixels on its longest side, so each thumbnail costs one small
+    read.
+
+    Args:
+        href (str): HREF of the COG.
+        output_path (str): Path of the thumbnail.
+        variable (str): Variable of the COG, which selects the colormap.
+        max_size (int, optional): Longest side of the thumbnail in pixels.
+        image_format (str, optional): "png" or "webp". Defaults to "png".
+    """
+    with open_dataset(href) as dataset:
+        data = dataset.read(1,
+                            out_shape=overview_shape(dataset, max_size),
+                            masked=True)
+        encoding = scale_offset(dataset)
+    data = data.astype(np.float64)
+    if encoding is not None:
+        scale, offset = encoding
+        data = data * scale + offset
+
+    rgba = colorize(data, variable)
+    driver, _, _ = THUMBNAIL_FORMATS[image_format]
+    with warnings.catch_warnings():
+        # Thumbnails are plain images without a geotransform
+        warnings.simplefilter("ignore", NotGeoreferencedWarning)
+        with rasterio.open(output_path,
+                           "w",
+                           driver=driver,
+                           width=rgba.shape[2],
+                           height=rgba.shape[1],
+                           count=4,
+                           dtype="uint8") as dst:
+            dst.write(rgba)
+    logger.debug(f"Wrote thumbnail {output_path}")
+
+
+def add_thumbnail(
+    item: Item,
+    max_size: int = THUMBNAIL_MAX_SIZE,
+    image_format: str = "png",
+) -> None:
+    """Renders a thumbnail next to an item's COG and adds it as an asset.
+
+    Monthly items show MONTHLY_THUMBNAIL_VARIABLE, bioclimatic items their
+    variable.
+
+    Args:
+        item (Item): A monthly or bioclimatic item with local COGs.
+        max_size (int, optional): Longest side of the thumbnail in pixels.
+        image_format (str, optional): "png" or "webp". Defaults to "png".
+    """
+    if MONTHLY_THUMBNAIL_VARIABLE in item.assets:
+        cog = item.assets[MONTHLY_THUMBNAIL_VARIABLE]
+    else:
+        cog = item.assets["data"]
+    href = cog.get_absolute_href() or cog.href
+    variable = file_variable(href)
+
+    _, extension, media_type = THUMBNAIL_FORMATS[image_format]
+    path = os.path.join(os.path.dirname(href), f"{item.id}.{extension}")
+    create_thumbnail(href, path, variable, max_size, image_format)
+    item.add_asset(
+        "thumbnail",
+        Asset(href=path,
+              title="Thumbnail",
+              media_type=media_type,
+              roles=["thumbnail"]))
+
+
+def add_thumbnails(
+    items: List[Item],
+    max_size: int = THUMBNAIL_MAX_SIZE,
+    image_format: str = "png",
+    max_workers: Optional[int] = None,
+) -> None:
+    """Adds thumbnails to items in parallel.
+
+    Args:
+        items (List[Item]): Monthly or bioclimatic items with local COGs.
+        max_size (int, optional): Longest side of the thumbnails in pixels.
+        image_format (str, optional): "png" or "webp". Defaults to "png".
+        max_workers (int, optional): Number of thumbnails rendered at once.
+            Defaults to the ThreadPoolExecutor default.
+    """
+    logger.info(f"Creating {len(items)} thumbnails")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(
+            executor.map(
+                lambda item: add_thumbnail(item, max_size, image_format),
+                items))
@@ -0,0 +1,61 @@
+import os
+import re
+
+from stactools.worldclim.constants import WORLDCLIM_VERSION
+
+MONTHLY_FILE_REGEX = re.compile(
+    rf"wc{WORLDCLIM_VERSION}_(?P<resolution>[^_]+)_(?P<variable>[^_]+)_"
+    r"(?P<month>\d\d)(?P<tile>(?:_\d+_\d+)?)\.tif$")
+BIOCLIM_FILE_REGEX = re.compile(
+    rf"wc{WORLDCLIM_VERSION}_(?P<resolution>[^_]+)_(?P<variable>bio_\d+)"
+    r"(?P<tile>(?:_\d+_\d+)?)\.tif$")
+
+
+def item_id(file_name: str) -> str:
+    """ID of the item a WorldClim COG belongs to
+
+    Args:
+        file_name (str): Name of the COG, e.g. wc2.1_10m_tmin_01.tif or
+            wc2.1_30s_bio_1_1_2.tif.
+
+    Returns:
+        str: The item ID, e.g. wc2.1_10m_1 or wc2.1_30s_bio_1_1_2.
+    """
+    base_name = os.path.basename(file_name)
+    match = BIOCLIM_FILE_REGEX.match(base_name)
+    if match is not None:
+        return os.path.splitext(base_name)[0]
+    match = MONTHLY_FILE_REGEX.match(base_name)
+    if match is None:
+        raise ValueError(f"Not a WorldClim file name: {base_name}")
+    return (f"wc{WORLDCLIM_VERSION}_{match.group('resolution')}_"
+            f"{int(match.group('month'))}{match.group('tile')}")
+
+
+def file_variable(file_name: str) -> str:
+    """Variable of a WorldClim file, e.g. tmin or bio_1"""
+    base_name = os.path.basename(file_name)
+    match = (BIOCLIM_FILE_REGEX.match(base_name)
+             or MONTHLY_FILE_REGEX.match(base_name))
+    if match is None:
+        raise ValueError(f"Not a WorldClim file name: {base_name}")
+    return match.group("variable")
+
+
+def cog_output_path(output_path: str,
+                    file_name: str,
+                    item_directories: bool = False) -> str:
+    """Path a COG is written to in an output directory
+
+    Args:
+        output_path (str): The output directory.
+        file_name (str): Name of the COG.
+        item_directories (bool, optional): Whether the COG goes into the
+            directory of its item. Defaults to False.
+
+    Returns:
+        str: The path of the COG.
+    """
+    if item_directories:
+        return os.path.join(output_path, item_id(file_name), file_name)
+    return os.path.join(output_path, file_name)
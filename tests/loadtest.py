@@ -0,0 +1,434 @@
+"""End-to-end load test of the create-full commands.
+
+A local HTTP server stands in for the WorldClim download server, serving
+synthetic archives laid out like DATASET_URL_TEMPLATE, with configurable
+raster sizes, latency and bandwidth. A create-full command downloads,
+converts, tiles and catalogs them in a subprocess pointed at the server
+through WORLDCLIM_DATASET_URL, and the throughput and peak memory and disk
+usage of the run are reported.
+
+Run it with scripts/load-test, or python -m tests.loadtest --help.
+"""
+
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import zipfile
+import zlib
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from tempfile import TemporaryDirectory
+from typing import Any, BinaryIO, Dict, List, Optional, Sequence, Tuple
+
+import click
+import numpy as np
+import rasterio
+from affine import Affine
+
+from stactools.worldclim.constants import (
+    BIOCLIM_VARIABLES,
+    MONTHLY_DATA_VARIABLES,
+    RESOLUTION_SHAPES,
+    WORLDCLIM_VERSION,
+)
+from stactools.worldclim.enum import Month, Resolution
+
+logger = logging.getLogger(__name__)
+
+# Path of the archives under the server root, as in DATASET_URL_TEMPLATE
+ARCHIVE_DIRECTORY = f"v{WORLDCLIM_VERSION}/base"
+# Data type and nodata of the variables whose files are not float32
+VARIABLE_TYPES = {"prec": ("int16", -32768), "srad": ("uint16", 65535)}
+FLOAT_NODATA = -3.4e38
+# Chunk written at once by the server, and by which bandwidth is throttled
+SERVER_CHUNK_SIZE = 64 * 2**10
+
+
+def archive_files(dataset: str) -> Dict[str, List[Tuple[str, str]]]:
+    """Names of the archives of a dataset and of their files.
+
+    Args:
+        dataset (str): "monthly" or "bioclim".
+
+    Returns:
+        Dict[str, List[Tuple[str, str]]]: Resolution and file name of each
+        file of each archive, by archive name.
+    """
+    archives: Dict[str, List[Tuple[str, str]]] = {}
+    prefix = f"wc{WORLDCLIM_VERSION}"
+    for resolution in Resolution:
+        if dataset == "bioclim":
+            archives[f"{prefix}_{resolution.value}_bio.zip"] = [
+                (resolution.value, f"{prefix}_{resolution.value}_{variable}.tif")
+                for variable in BIOCLIM_VARIABLES
+            ]
+        else:
+            for variable in MONTHLY_DATA_VARIABLES:
+                archives[f"{prefix}_{resolution.value}_{variable}.zip"] = [
+                    (resolution.value,
+                     f"{prefix}_{resolution.value}_{variable}_"
+                     f"{month.value:02d}.tif") for month in Month
+                ]
+    return archives
+
+
+def write_synthetic_file(path: str, resolution: str, downscale: int) -> int:
+    """Writes a global raster shaped like a WorldClim file.
+
+    The grid is the global grid of the resolution with pixels downscale
+    times larger, filled with a smooth field over land and nodata over the
+    oceans, so it compresses and converts like the real files.
+
+    Args:
+        path (str): Path of the GeoTIFF to write.
+        resolution (str): Resolution of the file, e.g. "10m".
+        downscale (int): Factor by which the height and width are divided.
+
+    Returns:
+        int: Number of pixels of the file.
+    """
+    full_height, full_width = RESOLUTION_SHAPES[resolution]
+    height, width = full_height // downscale, full_width // downscale
+    variable = os.path.basename(path).split("_")[2]
+    dtype, nodata = VARIABLE_TYPES.get(variable, ("float32", FLOAT_NODATA))
+    lat = np.linspace(np.pi / 2, -np.pi / 2, height)[:, np.newaxis]
+    lon = np.linspace(-np.pi, np.pi, width)[np.newaxis, :]
+    seed = zlib.crc32(os.path.basename(path).encode())
+    phase = np.random.default_rng(seed).uniform(0, np.pi)
+    field = np.cos(lat) * (1 + 0.5 * np.sin(3 * lon + phase))
+    land = np.sin(2 * lon) * np.cos(3 * lat) + np.cos(lat) > 0.6
+    data = np.full((height, width), nodata, dtype=dtype)
+    data[land] = (field[land] * 1000).astype(dtype)
+    with rasterio.open(path,
+                       "w",
+                       driver="GTiff",
+                       height=height,
+                       width=width,
+                       count=1,
+                       dtype=dtype,
+                       nodata=nodata,
+                       crs="EPSG:4326",
+                       transform=Affine(360 / width, 0, -180, 0,
+                                        -180 / height, 90),
+                       compress="deflate") as dst:
+        dst.write(data, 1)
+    return height * width
+
+
+def build_archives(root: str, dataset: str, downscale: int) -> Dict[str, int]:
+    """Writes the synthetic archives of a dataset.
+
+    Args:
+        root (str): Root directory of the server; the archives are written
+            under ARCHIVE_DIRECTORY.
+        dataset (str): "monthly" or "bioclim".
+        downscale (int): Factor by which the height and width of every file
+            are divided. Must divide 1080 so that the 30s files can still be
+            aggregated to the coarser resolutions.
+
+    Returns:
+        Dict[str, int]: Number of archives, files and pixels, and total size
+        in bytes of the archives.
+    """
+    if RESOLUTION_SHAPES[Resolution.TEN_MINUTES.value][0] % downscale:
+        raise ValueError(f"The downscale factor {downscale} must divide 1080")
+    directory = os.path.join(root, ARCHIVE_DIRECTORY)
+    os.makedirs(directory, exist_ok=True)
+    totals = {"archives": 0, "files": 0, "pixels": 0, "archive_bytes": 0}
+    with TemporaryDirectory() as tmp_dir:
+        for archive, files in archive_files(dataset).items():
+            path = os.path.join(directory, archive)
+            with zipfile.ZipFile(path, "w") as zip_file:
+                for resolution, file_name in files:
+                    file_path = os.path.join(tmp_dir, file_name)
+                    totals["pixels"] += write_synthetic_file(
+                        file_path, resolution, downscale)
+                    zip_file.write(file_path, file_name)
+                    os.remove(file_path)
+            totals["archives"] += 1
+            totals["files"] += len(files)
+            totals["archive_bytes"] += os.path.getsize(path)
+    logger.info(f"Built {totals['archives']} archives in {directory}")
+    return totals
+
+
+class _ArchiveRequestHandler(SimpleHTTPRequestHandler):
+    server: "ArchiveServer"
+
+    def send_head(self) -> Optional[BinaryIO]:  # type: ignore[override]
+        time.sleep(self.server.latency)
+        self.server.count(requests=1)
+        return super().send_head()  # type: ignore[return-value]
+
+    def copyfile(self, source: Any, outputfile: Any) -> None:
+        while True:
+            chunk = source.read(SERVER_CHUNK_SIZE)
+            if not chunk:
+                break
+            self.server.count(bytes_sent=len(chunk))
+            outputfile.write(chunk)
+            if self.server.bandwidth:
+                time.sleep(len(chunk) / self.server.bandwidth)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(format, *args)
+
+
+class ArchiveServer(ThreadingHTTPServer):
+    """Local stand-in for the WorldClim download server.
+
+    Serves the files of a directory on a free port of 127.0.0.1 from a
+    background thread while used as a context manager, answering HEAD
+    requests with the Content-Length and conditional GETs with 304 like the
+    real server.
+
+    Args:
+        root (str): Directory served, e.g. as written by build_archives.
+        latency (float): Seconds waited before answering each request.
+        bandwidth (float, optional): Bytes per second sent to each client.
+            Defaults to unlimited.
+    """
+    daemon_threads = True
+
+    def __init__(self,
+                 root: str,
+                 latency: float = 0.0,
+                 bandwidth: Optional[float] = None):
+        super().__init__(("127.0.0.1", 0),
+                         partial(_ArchiveRequestHandler, directory=root))
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        daemon=True)
+
+    @property
+    def url(self) -> str:
+        """URL to use as WORLDCLIM_DATASET_URL."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, requests: int = 0, bytes_sent: int = 0) -> None:
+        with self._lock:
+            self.requests += requests
+            self.bytes_sent += bytes_sent
+
+    def __enter__(self) -> "ArchiveServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.shutdown()
+        self._thread.join()
+        self.server_close()
+
+
+class DiskSampler:
+    """Samples the total size of directories in a background thread.
+
+    Args:
+        directories (Sequence[str]): Directories whose files are counted.
+        interval (float): Seconds between samples.
+    """
+    def __init__(self, directories: Sequence[str], interval: float = 0.2):
+        self.directories = directories
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def size(self) -> int:
+        """Current total size in bytes of the files of the directories."""
+        total = 0
+        for directory in self.directories:
+            for root, _, files in os.walk(directory):
+                for name in files:
+                    try:
+                        total += os.path.getsize(os.path.join(root, name))
+                    except FileNotFoundError:
+                        pass
+        return total
+
+    def _run(self) -> None:
+        while True:
+            self.peak_bytes = max(self.peak_bytes, self.size())
+            if self._stop.wait(self.interval):
+                break
+
+    def __enter__(self) -> "DiskSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, self.size())
+
+
+def run_command(args: List[str], env: Dict[str, str],
+                directories: Sequence[str]) -> Dict[str, int]:
+    """Runs a command and measures its peak memory and disk usage.
+
+    Args:
+        args (List[str]): The command.
+        env (Dict[str, str]): Its environment.
+        directories (Sequence[str]): Directories whose size is sampled.
+
+    Returns:
+        Dict[str, int]: Peak resident memory of the command and of its own
+        subprocesses, and peak total size of the directories, in bytes.
+    """
+    with DiskSampler(directories) as sampler:
+        process = subprocess.Popen(args, env=env)
+        # wait4 gives the resource usage of this process and of the
+        # processes it waited for, such as gdal_translate
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = (os.WEXITSTATUS(status) if os.WIFEXITED(status)
+                              else -os.WTERMSIG(status))
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, args)
+    return {
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_bytes": usage.ru_maxrss * 1024,
+        "peak_disk_bytes": sampler.peak_bytes,
+    }
+
+
+def run_load_test(
+    work_dir: str,
+    dataset: str = "bioclim",
+    downscale: int = 40,
+    latency: float = 0.0,
+    bandwidth: Optional[float] = None,
+    workers: int = 1,
+    options: Sequence[str] = (),
+) -> Dict[str, float]:
+    """Runs a create-full command against synthetic archives.
+
+    Args:
+        work_dir (str): Directory for the archives, the scratch directory
+            and the destination of the collection.
+        dataset (str): "monthly" or "bioclim".
+        downscale (int): Factor by which the height and width of the files
+            are divided, see build_archives.
+        latency (float): Seconds the server waits before each response.
+        bandwidth (float, optional): Bytes per second the server sends to
+            each client. Defaults to unlimited.
+        workers (int): Number of concurrent workers of the command.
+        options (Sequence[str]): Other options of the command, e.g.
+            ["--derive"].
+
+    Returns:
+        Dict[str, float]: The report: the sizes of the synthetic dataset,
+        what was served and produced, the duration and throughput of the
+        command, and its peak memory and disk usage.
+    """
+    root = os.path.join(work_dir, "server")
+    scratch_dir = os.path.join(work_dir, "scratch")
+    destination = os.path.join(work_dir, "destination")
+    os.makedirs(scratch_dir, exist_ok=True)
+    report: Dict[str, float] = dict(build_archives(root, dataset, downscale))
+
+    args = [
+        sys.executable, "-m", "stactools.cli", "worldclim",
+        f"create-full-{dataset}-collection", "-d", destination,
+        "--scratch-dir", scratch_dir, "--workers",
+        str(workers), "--no-validate", *options
+    ]
+    with ArchiveServer(root, latency, bandwidth) as server:
+        env = dict(os.environ, WORLDCLIM_DATASET_URL=server.url)
+        start = time.perf_counter()
+        report.update(run_command(args, env, [scratch_dir, destination]))
+        report["seconds"] = time.perf_counter() - start
+        report["requests"] = server.requests
+        report["bytes_served"] = server.bytes_sent
+
+    with open(os.path.join(destination, "collection.json")) as f:
+        links = json.load(f)["links"]
+    report["items"] = sum(link["rel"] == "item" for link in links)
+    report["cogs"] = sum(
+        name.endswith(".tif") for _, _, files in os.walk(destination)
+        for name in files)
+    report["bytes_per_second"] = report["bytes_served"] / report["seconds"]
+    report["pixels_per_second"] = report["pixels"] / report["seconds"]
+    return report
+
+
+def format_report(report: Dict[str, float]) -> str:
+    """Formats a report of run_load_test as aligned lines."""
+    lines = []
+    for key, value in report.items():
+        if key.endswith("bytes") or key == "bytes_served":
+            text = f"{value / 2**20:.1f} MiB"
+        elif key == "bytes_per_second":
+            text = f"{value / 2**20:.2f} MiB/s"
+        elif key == "pixels_per_second":
+            text = f"{value / 1e6:.2f} Mpixel/s"
+        elif isinstance(value, float):
+            text = f"{value:.2f}"
+        else:
+            text = str(value)
+        lines.append(f"{key:<18} {text}")
+    return "\n".join(lines)
+
+
+@click.command(context_settings={"ignore_unknown_options": True})
+@click.option("--dataset",
+              type=click.Choice(["bioclim", "monthly"]),
+              default="bioclim",
+              show_default=True)
+@click.option("--downscale",
+              type=int,
+              default=40,
+              show_default=True,
+              help="Divide the height and width of every file by this "
+              "factor, which must divide 1080")
+@click.option("--latency",
+              type=float,
+              default=0.0,
+              show_default=True,
+              help="Seconds the server waits before each response")
+@click.option("--bandwidth",
+              type=float,
+              default=None,
+              help="Bytes per second the server sends to each client")
+@click.option("--workers", type=int, default=1, show_default=True)
+@click.option("--work-dir",
+              default=None,
+              help="Directory to keep the archives and outputs in; a "
+              "temporary directory by default")
+@click.option("--json",
+              "json_path",
+              default=None,
+              help="Also write the report to this JSON file")
+@click.argument("options", nargs=-1, type=click.UNPROCESSED)
+def main(dataset: str, downscale: int, latency: float,
+         bandwidth: Optional[float], workers: int, work_dir: Optional[str],
+         json_path: Optional[str], options: Tuple[str, ...]) -> None:
+    """Load test create-full-DATASET-collection against a local server.
+
+    OPTIONS are passed on to the command, e.g. --derive.
+    """
+    logging.basicConfig(level=logging.INFO)
+    with TemporaryDirectory() as tmp_dir:
+        report = run_load_test(work_dir or tmp_dir,
+                               dataset=dataset,
+                               downscale=downscale,
+                               latency=latency,
+                               bandwidth=bandwidth,
+                               workers=workers,
+                               options=options)
+    click.echo(format_report(report))
+    if json_path is not None:
+        with open(json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
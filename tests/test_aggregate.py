@@ -0,0 +1,137 @@
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from stactools.worldclim.aggregate import (
+    aggregate,
+    aggregation_factor,
+    compare,
+    derived_file_name,
+    validate_derived,
+)
+from stactools.worldclim.enum import Resolution
+
+
+def write_source(path: str, data: np.ndarray, nodata: float) -> None:
+    with rasterio.open(path,
+                       "w",
+                       driver="GTiff",
+                       height=data.shape[0],
+                       width=data.shape[1],
+                       count=1,
+                       dtype=data.dtype,
+                       nodata=nodata,
+                       crs="EPSG:4326",
+                       transform=from_origin(-180, 90, 0.5, 0.5)) as dst:
+        dst.write(data, 1)
+
+
+def block_mean(data: np.ma.MaskedArray, factor: int) -> np.ma.MaskedArray:
+    height, width = data.shape
+    means = np.ma.masked_all((height // factor, width // factor))
+    for row in range(height // factor):
+        for col in range(width // factor):
+            block = data[row * factor:(row + 1) * factor,
+                         col * factor:(col + 1) * factor]
+            if block.count():
+                means[row, col] = block.mean()
+    return means
+
+
+class AggregateTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.data = rng.normal(10, 5, (40, 80)).astype("float32")
+        self.data[:20, :20] = -9999
+        self.data[rng.random((40, 80)) < 0.3] = -9999
+        self.masked = np.ma.masked_equal(self.data, -9999)
+
+    def test_names_and_factors(self):
+        self.assertEqual(
+            derived_file_name("wc2.1_30s_tmin_01.tif",
+                              Resolution.TEN_MINUTES), "wc2.1_10m_tmin_01.tif")
+        self.assertEqual(
+            derived_file_name("wc2.1_30s_bio_1.tif",
+                              Resolution.TWO_POINT_FIVE_MINUTES),
+            "wc2.1_2.5m_bio_1.tif")
+        self.assertEqual(aggregation_factor(Resolution.TWO_POINT_FIVE_MINUTES),
+                         5)
+        self.assertEqual(aggregation_factor(Resolution.FIVE_MINUTES), 10)
+        self.assertEqual(aggregation_factor(Resolution.TEN_MINUTES), 20)
+
+    def test_block_means(self):
+        for max_workers in [1, 3]:
+            with TemporaryDirectory() as tmp_dir:
+                source = os.path.join(tmp_dir, "source.tif")
+                write_source(source, self.data, -9999)
+                outputs = {
+                    factor: os.path.join(tmp_dir, f"{factor}.tif")
+                    for factor in [5, 10, 20]
+                }
+                aggregate(source,
+                          outputs,
+                          window_rows=20,
+                          max_workers=max_workers)
+                for factor, path in outputs.items():
+                    with rasterio.open(path) as dataset:
+                        self.assertEqual(dataset.shape,
+                                         (40 // factor, 80 // factor))
+                        self.assertEqual(dataset.nodata, -9999)
+                        self.assertEqual(dataset.transform.a, 0.5 * factor)
+                        self.assertEqual(dataset.transform.c, -180)
+                        result = dataset.read(1, masked=True)
+                    expected = block_mean(self.masked, factor)
+                    np.testing.assert_array_equal(result.mask, expected.mask)
+                    np.testing.assert_allclose(result.compressed(),
+                                               expected.compressed(),
+                                               rtol=1e-6)
+
+    def test_integer_means_are_rounded(self):
+        data = np.array([[1, 2, 5, 5], [2, 2, -1, -1]], dtype="int16")
+        with TemporaryDirectory() as tmp_dir:
+            source = os.path.join(tmp_dir, "source.tif")
+            write_source(source, data, -1)
+            output = os.path.join(tmp_dir, "2.tif")
+            aggregate(source, {2: output})
+            with rasterio.open(output) as dataset:
+                self.assertEqual(dataset.dtypes[0], "int16")
+                self.assertEqual(dataset.read(1).tolist(), [[2, 5]])
+
+    def test_indivisible_shape(self):
+        with TemporaryDirectory() as tmp_dir:
+            source = os.path.join(tmp_dir, "source.tif")
+            write_source(source, self.data, -9999)
+            with self.assertRaises(ValueError):
+                aggregate(source, {3: os.path.join(tmp_dir, "3.tif")})
+
+    def test_compare(self):
+        with TemporaryDirectory() as tmp_dir:
+            first = os.path.join(tmp_dir, "first.tif")
+            write_source(first, self.data, -9999)
+            comparison = compare(first, first, window_rows=7)
+            self.assertEqual(comparison.pixels, 40 * 80)
+            self.assertEqual(comparison.nodata_mismatches, 0)
+            self.assertEqual(comparison.max_abs_diff, 0)
+            self.assertTrue(comparison.within(0))
+
+            data = self.data.copy()
+            rows, cols = np.nonzero(~self.masked.mask)
+            data[rows[0], cols[0]] = -9999
+            data[rows[-1], cols[-1]] += 0.5
+            second = os.path.join(tmp_dir, "second.tif")
+            write_source(second, data, -9999)
+            comparison = compare(first, second, window_rows=7)
+            self.assertEqual(comparison.nodata_mismatches, 1)
+            self.assertAlmostEqual(comparison.max_abs_diff, 0.5, places=5)
+            self.assertFalse(comparison.within(1))
+
+    def test_validate_derived_needs_a_coarser_resolution(self):
+        with TemporaryDirectory() as tmp_dir:
+            source = os.path.join(tmp_dir, "source.tif")
+            write_source(source, self.data, -9999)
+            with self.assertRaises(ValueError):
+                validate_derived(source, source)
@@ -0,0 +1,125 @@
+import hashlib
+import os
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+
+from stactools.worldclim.cache import ArchiveCache
+from stactools.worldclim.cog import archive_sizes
+
+
+class ArchiveHandler(BaseHTTPRequestHandler):
+    content = b"archive v1"
+    requests = []
+
+    def do_GET(self):
+        etag = '"{}"'.format(hashlib.md5(self.content).hexdigest())
+        self.requests.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(self.content)))
+        self.end_headers()
+        self.wfile.write(self.content)
+
+    def do_HEAD(self):
+        self.requests.append("HEAD")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.content)))
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class ArchiveCacheTest(unittest.TestCase):
+    def setUp(self):
+        ArchiveHandler.content = b"archive v1"
+        ArchiveHandler.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ArchiveHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = "http://127.0.0.1:{}/wc2.1_10m_bio.zip".format(
+            self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_revalidation(self):
+        with TemporaryDirectory() as tmp_dir:
+            cache = ArchiveCache(tmp_dir)
+            path = cache.fetch(self.url)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), b"archive v1")
+            self.assertEqual(os.path.basename(path),
+                             hashlib.sha256(b"archive v1").hexdigest())
+
+            self.assertEqual(ArchiveCache(tmp_dir).fetch(self.url), path)
+            self.assertIsNone(ArchiveHandler.requests[0])
+            self.assertIsNotNone(ArchiveHandler.requests[1])
+
+            ArchiveHandler.content = b"archive v2"
+            new_path = ArchiveCache(tmp_dir).fetch(self.url)
+            self.assertNotEqual(new_path, path)
+            with open(new_path, "rb") as f:
+                self.assertEqual(f.read(), b"archive v2")
+
+    def test_offline(self):
+        with TemporaryDirectory() as tmp_dir:
+            with self.assertRaises(FileNotFoundError):
+                ArchiveCache(tmp_dir, offline=True).fetch(self.url)
+            path = ArchiveCache(tmp_dir).fetch(self.url)
+            self.assertEqual(
+                ArchiveCache(tmp_dir, offline=True).fetch(self.url), path)
+            self.assertEqual(len(ArchiveHandler.requests), 1)
+
+    def test_offline_sizes(self):
+        units = [SimpleNamespace(url=self.url)]
+        with TemporaryDirectory() as tmp_dir:
+            self.assertEqual(
+                archive_sizes(units, ArchiveCache(tmp_dir, offline=True)), {})
+            self.assertEqual(ArchiveHandler.requests, [])
+            ArchiveCache(tmp_dir).fetch(self.url)
+            self.assertEqual(
+                archive_sizes(units, ArchiveCache(tmp_dir, offline=True)),
+                {self.url: len(b"archive v1")})
+            self.assertEqual(archive_sizes(units), {self.url: 10})
+            self.assertEqual(ArchiveHandler.requests, [None, "HEAD"])
+
+    def test_shared_cache(self):
+        with TemporaryDirectory() as tmp_dir:
+            paths = []
+            threads = [
+                threading.Thread(target=lambda: paths.append(
+                    ArchiveCache(tmp_dir).fetch(self.url))) for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(set(paths)), 1)
+            self.assertEqual(ArchiveHandler.requests.count(None), 1)
+
+    def test_fetch_once_per_instance(self):
+        with TemporaryDirectory() as tmp_dir:
+            cache = ArchiveCache(tmp_dir)
+            path = cache.fetch(self.url)
+            self.assertEqual(cache.fetch(self.url), path)
+            self.assertEqual(len(ArchiveHandler.requests), 1)
+
+    def test_remove(self):
+        with TemporaryDirectory() as tmp_dir:
+            cache = ArchiveCache(tmp_dir)
+            path = cache.fetch(self.url)
+            cache.remove(self.url)
+            self.assertFalse(os.path.exists(path))
+            self.assertIsNone(cache.entry(self.url))
+            cache.fetch(self.url)
+            self.assertEqual(ArchiveHandler.requests, [None, None])
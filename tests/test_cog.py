@@ -0,0 +1,39 @@
+import unittest
+
+from stactools.worldclim.cog import tile_windows
+from stactools.worldclim.utils import cog_output_path, item_id
+
+
+class CogTest(unittest.TestCase):
+    def test_tile_windows(self):
+        tiles = tile_windows(21600, 43200)
+        self.assertEqual(len(tiles), 8)
+        suffix, window = tiles[0]
+        self.assertEqual(suffix, "_1_1")
+        self.assertEqual((window.col_off, window.row_off), (0, 0))
+        suffix, window = tiles[-1]
+        self.assertEqual(suffix, "_2_4")
+        self.assertEqual((window.col_off, window.row_off), (32400, 10800))
+        self.assertEqual((window.width, window.height), (10800, 10800))
+
+    def test_partial_tile_windows(self):
+        tiles = tile_windows(10800, 15000)
+        self.assertEqual([suffix for suffix, _ in tiles], ["_1_1", "_1_2"])
+        self.assertEqual(tiles[-1][1].width, 4200)
+
+    def test_item_id(self):
+        self.assertEqual(item_id("wc2.1_10m_tmin_01.tif"), "wc2.1_10m_1")
+        self.assertEqual(item_id("wc2.1_30s_prec_12_1_2.tif"),
+                         "wc2.1_30s_12_1_2")
+        self.assertEqual(item_id("wc2.1_5m_bio_10.tif"), "wc2.1_5m_bio_10")
+        self.assertEqual(item_id("wc2.1_30s_bio_1_2_4.tif"),
+                         "wc2.1_30s_bio_1_2_4")
+        with self.assertRaises(ValueError):
+            item_id("other.tif")
+
+    def test_cog_output_path(self):
+        self.assertEqual(cog_output_path("out", "wc2.1_10m_tmin_01.tif"),
+                         "out/wc2.1_10m_tmin_01.tif")
+        self.assertEqual(
+            cog_output_path("out", "wc2.1_10m_tmin_01.tif", True),
+            "out/wc2.1_10m_1/wc2.1_10m_tmin_01.tif")
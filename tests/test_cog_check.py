@@ -0,0 +1,118 @@
+import os
+import shutil
+import unittest
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.transform import from_origin
+from stactools.testing import CliTestCase
+
+from stactools.worldclim.cog import create_cog
+from stactools.worldclim.cog_check import assert_cog, check_cog, check_cogs
+from stactools.worldclim.commands import create_worldclim_command
+
+DATA_FILES = os.path.join(os.path.dirname(__file__), "data-files")
+
+
+def write_gtiff(path: str, **options) -> None:
+    data = np.arange(1024 * 1024, dtype="int32").reshape(1024, 1024)
+    with rasterio.open(path,
+                       "w",
+                       driver="GTiff",
+                       height=1024,
+                       width=1024,
+                       count=1,
+                       dtype="int32",
+                       crs="EPSG:4326",
+                       transform=from_origin(0, 90, 0.1, 0.1),
+                       **options) as dst:
+        dst.write(data, 1)
+
+
+def write_cog(source: str, path: str, bigtiff: str = "NO") -> None:
+    with rasterio.open(source) as src:
+        profile = dict(src.profile,
+                       driver="COG",
+                       blocksize=256,
+                       bigtiff=bigtiff)
+        with rasterio.open(path, "w", **profile) as dst:
+            dst.write(src.read())
+
+
+class CogCheckTest(CliTestCase):
+    def create_subcommand_functions(self):
+        return [create_worldclim_command]
+
+    def test_valid_cogs(self):
+        for name in os.listdir(DATA_FILES):
+            self.assertEqual(check_cog(os.path.join(DATA_FILES, name)), [])
+
+    def test_created_cog(self):
+        with TemporaryDirectory() as tmp_dir:
+            source = os.path.join(tmp_dir, "source.tif")
+            write_gtiff(source)
+            for bigtiff in ["NO", "YES"]:
+                path = os.path.join(tmp_dir, f"cog-{bigtiff}.tif")
+                write_cog(source, path, bigtiff)
+                self.assertEqual(check_cog(path), [])
+
+    def test_stripped_tiff(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "stripped.tif")
+            write_gtiff(path)
+            self.assertEqual(check_cog(path), ["Main image is not tiled"])
+            with self.assertRaisesRegex(ValueError, "not a valid COG"):
+                assert_cog(path)
+
+    def test_overviews_added_later(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "tiled.tif")
+            write_gtiff(path, tiled=True, blockxsize=256, blockysize=256)
+            self.assertEqual(len(check_cog(path)), 1)
+            with rasterio.open(path, "r+") as dst:
+                dst.build_overviews([2, 4], Resampling.nearest)
+            errors = check_cog(path)
+            self.assertIn("IFDs are not all before the image data", errors)
+            self.assertIn("Data of image 0 is not after the data of image 1",
+                          errors)
+
+    def test_not_a_tiff(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "text.tif")
+            with open(path, "w") as f:
+                f.write("not a tiff")
+            self.assertEqual(len(check_cog(path)), 1)
+
+    @unittest.skipIf(
+        shutil.which("gdal_translate") is None, "gdal_translate is not installed")
+    def test_post_hook(self):
+        checked = []
+        with TemporaryDirectory() as tmp_dir:
+            source = os.path.join(tmp_dir, "source.tif")
+            write_gtiff(source)
+            output = os.path.join(tmp_dir, "cog.tif")
+            create_cog(source, output, post_hook=checked.append)
+            self.assertEqual(checked, [output])
+            create_cog(source, output, post_hook=assert_cog)
+
+    def test_check_tree(self):
+        with TemporaryDirectory() as tmp_dir:
+            os.makedirs(os.path.join(tmp_dir, "item"))
+            valid = os.path.join(tmp_dir, "item", "valid.tif")
+            write_cog(os.path.join(DATA_FILES, "wc2.1_10m_bio_1.tif"), valid)
+            invalid = os.path.join(tmp_dir, "item", "stripped.tif")
+            write_gtiff(invalid)
+
+            failures = check_cogs([valid, invalid], max_workers=2)
+            self.assertEqual(list(failures), [invalid])
+
+            result = self.run_command(["worldclim", "check-cogs", tmp_dir])
+            self.assertEqual(result.exit_code, 1)
+            self.assertIn(invalid, result.output)
+            self.assertIn("1 of 2 files are valid COGs", result.output)
+
+            os.remove(invalid)
+            result = self.run_command(["worldclim", "check-cogs", tmp_dir])
+            self.assertEqual(result.exit_code, 0, msg=result.output)
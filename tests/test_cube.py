@@ -0,0 +1,142 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import unittest
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+import numpy as np
+import rasterio
+from stactools.testing import CliTestCase
+
+from stactools.worldclim import stac
+from stactools.worldclim.commands import create_worldclim_command
+from stactools.worldclim.constants import MONTHLY_DATA_VARIABLES
+from stactools.worldclim.cube import CUBE_DATA_FILE, Cube, write_header
+
+try:
+    from stactools.worldclim.loader import export_cube
+except ImportError:
+    export_cube = None
+
+PREC_TIF = os.path.join(os.path.dirname(__file__), "data-files",
+                        "wc2.1_10m_prec_01.tif")
+
+
+def write_cube(directory: str, data: np.ndarray) -> None:
+    height, width, layers = data.shape
+    data.astype("<f4").tofile(os.path.join(directory, CUBE_DATA_FILE))
+    write_header(directory, data.shape, [1.0, 0.0, -10.0, 0.0, -1.0, 5.0],
+                 [(f"bio_{i + 1}", None) for i in range(layers)])
+
+
+class CubeTest(CliTestCase):
+    def create_subcommand_functions(self):
+        return [create_worldclim_command]
+
+    def test_sample(self):
+        data = np.arange(5 * 20 * 3, dtype="float32").reshape(5, 20, 3)
+        data[0, 0, 1] = np.nan
+        with TemporaryDirectory() as tmp_dir:
+            write_cube(tmp_dir, data)
+            cube = Cube(tmp_dir)
+            self.assertEqual(cube.shape, (5, 20, 3))
+            self.assertEqual(cube.layer("bio_2"), 1)
+            with self.assertRaises(KeyError):
+                cube.layer("bio_2", 1)
+
+            lon = [-9.5, 9.99, 0.0, -10.5, 0.0]
+            lat = [4.5, 0.01, 2.5, 4.5, 5.5]
+            values = cube.sample(lon, lat)
+            np.testing.assert_array_equal(values[0], data[0, 0])
+            np.testing.assert_array_equal(values[1], data[4, 19])
+            np.testing.assert_array_equal(values[2], data[2, 10])
+            self.assertTrue(np.isnan(values[3:]).all())
+            np.testing.assert_array_equal(
+                cube.sample(lon[:3], lat[:3], [2, 0]),
+                values[:3][:, [2, 0]])
+
+            # Other processes map the same file
+            code = ("import sys\n"
+                    "from stactools.worldclim.cube import Cube\n"
+                    f"cube = Cube({tmp_dir!r})\n"
+                    "print(cube.sample([0.0], [2.5])[0].tolist())\n"
+                    "print([m for m in ['pystac', 'rasterio'] "
+                    "if m in sys.modules])")
+            output = subprocess.check_output([sys.executable, "-c", code])
+            self.assertEqual(output.decode().split("\n")[:2],
+                             [str(data[2, 10].tolist()), "[]"])
+
+    def test_header(self):
+        with TemporaryDirectory() as tmp_dir:
+            write_cube(tmp_dir, np.zeros((2, 3, 1), dtype="float32"))
+            with open(os.path.join(tmp_dir, "cube.json")) as f:
+                header = json.load(f)
+            self.assertEqual(header["shape"], [2, 3, 1])
+            self.assertEqual(header["dimensions"], ["y", "x", "layer"])
+            self.assertEqual(header["layers"], [{
+                "variable": "bio_1",
+                "month": None
+            }])
+            self.assertFalse(
+                os.path.exists(os.path.join(tmp_dir, "cube.json.partial")))
+
+    @unittest.skipIf(export_cube is None, "xarray and dask are not installed")
+    def test_export(self):
+        with TemporaryDirectory() as tmp_dir:
+            collection = stac.create_monthly_collection()
+            for month in [1, 2]:
+                for variable in MONTHLY_DATA_VARIABLES:
+                    shutil.copy(
+                        PREC_TIF,
+                        os.path.join(tmp_dir,
+                                     f"wc2.1_10m_{variable}_{month:02d}.tif"))
+                collection.add_item(
+                    stac.create_monthly_item(
+                        os.path.join(tmp_dir,
+                                     f"wc2.1_10m_tmin_{month:02d}.tif")))
+
+            destination = os.path.join(tmp_dir, "cube")
+            cube = export_cube(collection,
+                               destination,
+                               variables=["prec", "tmax"],
+                               months=[2],
+                               bbox=[-10, 35, 5, 45])
+            self.assertEqual(cube.layers, [("prec", 2), ("tmax", 2)])
+            self.assertEqual(cube.shape, (60, 90, 2))
+            np.testing.assert_allclose(cube.transform,
+                                       [1 / 6, 0, -10, 0, -1 / 6, 45])
+
+            with rasterio.open(PREC_TIF) as src:
+                expected = src.read(1, masked=True).astype("float32")
+                rows, cols = zip(*(src.index(x, y)
+                                   for x, y in [(-3.7, 40.4), (2.35, 43.3)]))
+            values = cube.sample([-3.7, 2.35], [40.4, 43.3])
+            np.testing.assert_array_equal(
+                values[:, 0], expected[list(rows), list(cols)].filled(np.nan))
+            np.testing.assert_array_equal(values[:, 0], values[:, 1])
+
+            collection.normalize_hrefs(tmp_dir)
+            collection.save()
+            result = self.run_command([
+                "worldclim", "export-cube",
+                os.path.join(tmp_dir, "collection.json"), "-d", destination,
+                "-v", "srad", "--bbox", "0,0,1,1"
+            ])
+            self.assertEqual(result.exit_code, 0, msg=result.output)
+            self.assertIn("Exported 2 layers of 6x6 pixels", result.output)
+            self.assertEqual(Cube(destination).layers, [("srad", 1),
+                                                        ("srad", 2)])
+
+            # A failed export into an existing cube leaves no header behind
+            with mock.patch("dask.array.store", side_effect=OSError("full")):
+                with self.assertRaises(OSError):
+                    export_cube(collection, destination, variables=["prec"])
+            self.assertFalse(
+                os.path.exists(os.path.join(destination, "cube.json")))
+            # and the data of the previous cube untouched
+            self.assertEqual(
+                os.path.getsize(os.path.join(destination, CUBE_DATA_FILE)),
+                6 * 6 * 2 * 4)
@@ -0,0 +1,176 @@
+import os
+import shutil
+import unittest
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import rasterio
+from pystac.extensions.raster import RasterExtension
+
+from stactools.worldclim import stac
+from stactools.worldclim.cog import (
+    create_cog,
+    int16_options,
+    int16_scale_offset,
+)
+from stactools.worldclim.constants import (
+    BIOCLIM_VARIABLES,
+    INT16_ENCODINGS,
+    INT16_NODATA,
+    MONTHLY_DATA_VARIABLES,
+)
+from stactools.worldclim.enum import Encoding, StatisticsMode
+
+try:
+    from stactools.worldclim.loader import COGArray
+except ImportError:
+    COGArray = None
+
+BIOCLIM_TIF = os.path.join(os.path.dirname(__file__), "data-files",
+                           "wc2.1_10m_bio_1.tif")
+
+
+def write_encoded(source: str, path: str, scale: float,
+                  offset: float) -> None:
+    """Writes what create_cog writes with int16_options, without GDAL's
+    command line tools."""
+    with rasterio.open(source) as src:
+        data = src.read(1, masked=True)
+        profile = dict(src.profile, dtype="int16", nodata=INT16_NODATA)
+    raw = np.round((data.astype(np.float64) - offset) / scale)
+    with rasterio.open(path, "w", **profile) as dst:
+        dst.write(raw.filled(INT16_NODATA).astype("int16"), 1)
+        dst.scales = (scale, )
+        dst.offsets = (offset, )
+
+
+class EncodingTest(unittest.TestCase):
+    def test_float_variables_have_encodings(self):
+        self.assertEqual(
+            set(MONTHLY_DATA_VARIABLES) - set(INT16_ENCODINGS),
+            {"prec", "srad"})
+        self.assertLessEqual(set(BIOCLIM_VARIABLES), set(INT16_ENCODINGS))
+
+    def test_int16_scale_offset(self):
+        self.assertIsNone(int16_scale_offset("wc2.1_10m_tmin_01.tif"))
+        self.assertEqual(
+            int16_scale_offset("wc2.1_30s_tmin_01.tif", Encoding.INT16),
+            (0.01, 0.0))
+        self.assertEqual(
+            int16_scale_offset("wc2.1_5m_bio_12.tif", Encoding.INT16),
+            (0.5, 0.0))
+        self.assertIsNone(
+            int16_scale_offset("wc2.1_10m_prec_01.tif", Encoding.INT16))
+
+    def test_int16_options(self):
+        options = int16_options(0.01, 5.0)
+        self.assertEqual(options[options.index("-ot") + 1], "Int16")
+        self.assertEqual(options[options.index("-a_nodata") + 1], "-32768")
+        self.assertEqual(options[options.index("-a_scale") + 1], "0.01")
+        self.assertEqual(options[options.index("-a_offset") + 1], "5.0")
+        i = options.index("-scale")
+        src_min, src_max, dst_min, dst_max = map(float, options[i + 1:i + 5])
+        self.assertEqual((dst_min, dst_max), (-32767, 32767))
+
+        # gdal_translate maps values linearly from the source range onto the
+        # destination range
+        def raw(value: float) -> float:
+            return dst_min + (value - src_min) * (dst_max - dst_min) / (
+                src_max - src_min)
+
+        self.assertAlmostEqual(raw(5.0), 0)
+        self.assertAlmostEqual(raw(17.5), 1250)
+
+    @unittest.skipUnless(shutil.which("gdal_translate"),
+                         "gdal_translate is needed")
+    def test_create_cog_int16(self):
+        scale, offset = INT16_ENCODINGS["bio_1"]
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "wc2.1_10m_bio_1.tif")
+            create_cog(BIOCLIM_TIF, path, scale_offset=(scale, offset))
+            with rasterio.open(BIOCLIM_TIF) as src:
+                original = src.read(1, masked=True)
+            with rasterio.open(path) as dst:
+                self.assertEqual(dst.dtypes[0], "int16")
+                self.assertEqual(dst.nodata, INT16_NODATA)
+                self.assertEqual((dst.scales[0], dst.offsets[0]),
+                                 (scale, offset))
+                raw = dst.read(1)
+        # The source nodata, -3.4e38, is not scaled and clipped into a valid
+        # value
+        np.testing.assert_array_equal(raw == INT16_NODATA, original.mask)
+        decoded = raw[~original.mask].astype(np.float64) * scale + offset
+        np.testing.assert_allclose(decoded,
+                                   original.compressed(),
+                                   atol=scale)
+
+    def test_bioclim_item(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "wc2.1_10m_bio_1.tif")
+            write_encoded(BIOCLIM_TIF, path, 0.01, 0.0)
+            with rasterio.open(BIOCLIM_TIF) as src:
+                original = src.read(1, masked=True)
+            with rasterio.open(path) as dst:
+                decoded = dst.read(1, masked=True) * dst.scales[0]
+            np.testing.assert_array_equal(decoded.mask, original.mask)
+            self.assertLessEqual(
+                float(np.abs(decoded - original).max()), 0.005 + 1e-6)
+
+            item = stac.create_bioclim_item(path)
+            band = RasterExtension.ext(item.assets["data"]).bands[0]
+            self.assertEqual(band.scale, 0.01)
+            self.assertEqual(band.offset, 0.0)
+            self.assertEqual(band.nodata, INT16_NODATA)
+            self.assertEqual(band.data_type.value, "int16")
+
+            item = stac.create_bioclim_item(
+                path, statistics=StatisticsMode.APPROXIMATE)
+            band = RasterExtension.ext(item.assets["data"]).bands[0]
+            self.assertEqual(band.scale, 0.01)
+            self.assertIsNotNone(band.statistics)
+
+    def test_native_item_has_no_encoding(self):
+        item = stac.create_bioclim_item(BIOCLIM_TIF)
+        self.assertNotIn("raster:bands", item.assets["data"].extra_fields)
+
+    def test_monthly_item(self):
+        with TemporaryDirectory() as tmp_dir:
+            for variable in MONTHLY_DATA_VARIABLES:
+                path = os.path.join(tmp_dir, f"wc2.1_10m_{variable}_01.tif")
+                if variable in INT16_ENCODINGS:
+                    write_encoded(BIOCLIM_TIF, path,
+                                  *INT16_ENCODINGS[variable])
+                else:
+                    shutil.copy(BIOCLIM_TIF, path)
+            # prec is never encoded, so the encoding of its item is given
+            items = [
+                stac.create_monthly_item(
+                    os.path.join(tmp_dir, "wc2.1_10m_tmin_01.tif")),
+                stac.create_monthly_item(os.path.join(tmp_dir,
+                                                      "wc2.1_10m_prec_01.tif"),
+                                         encoding=Encoding.INT16),
+            ]
+            item = stac.create_monthly_item(
+                os.path.join(tmp_dir, "wc2.1_10m_prec_01.tif"))
+            for asset in item.assets.values():
+                self.assertNotIn("raster:bands", asset.extra_fields)
+        for item in items:
+            for variable, asset in item.assets.items():
+                if variable in INT16_ENCODINGS:
+                    band = RasterExtension.ext(asset).bands[0]
+                    self.assertEqual((band.scale, band.offset),
+                                     INT16_ENCODINGS[variable])
+                else:
+                    self.assertNotIn("raster:bands", asset.extra_fields)
+
+    @unittest.skipIf(COGArray is None, "xarray and dask are not installed")
+    def test_loader_decodes(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "wc2.1_10m_bio_1.tif")
+            write_encoded(BIOCLIM_TIF, path, 0.01, 0.0)
+            with rasterio.open(BIOCLIM_TIF) as src:
+                original = src.read(1, masked=True).astype("float32")
+            data = COGArray(path, original.shape)[:, :]
+        np.testing.assert_allclose(data,
+                                   original.filled(np.nan),
+                                   atol=0.005 + 1e-5)
@@ -0,0 +1,174 @@
+import json
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from stactools.testing import CliTestCase
+
+from stactools.worldclim.cache import ArchiveCache
+from stactools.worldclim.cog import (
+    download_convert_bioclim_dataset,
+    download_convert_units,
+)
+from stactools.worldclim.commands import create_worldclim_command
+from stactools.worldclim.enum import Month, Resolution
+from stactools.worldclim.failures import (
+    load_failure_report,
+    save_failure_report,
+)
+from stactools.worldclim.planner import Shard, WorkUnit, bioclim_units
+from stactools.worldclim.scheduler import RetryPolicy, Task, TaskFailure
+
+try:
+    import fsspec
+except ImportError:
+    fsspec = None
+
+
+class FailuresTest(CliTestCase):
+    def create_subcommand_functions(self):
+        return [create_worldclim_command]
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.units = [
+            WorkUnit(Resolution.THIRTY_SECONDS, "tmin", Month.MAY,
+                     [Resolution.TEN_MINUTES]),
+            WorkUnit(Resolution.TEN_MINUTES, "bio_12"),
+        ]
+
+    def test_report_round_trip(self):
+        path = os.path.join(self.tmp_dir.name, "reports", "failures.json")
+        save_failure_report(path, [
+            (unit, TaskFailure(Task(unit.file_name, lambda: None),
+                               ConnectionResetError("reset"), 3))
+            for unit in self.units
+        ])
+        with open(path) as f:
+            report = json.load(f)
+        self.assertEqual(report["failures"][0]["file_name"],
+                         "wc2.1_30s_tmin_05.tif")
+        self.assertEqual(report["failures"][0]["error"],
+                         "ConnectionResetError")
+        self.assertTrue(report["failures"][0]["transient"])
+        self.assertEqual(report["failures"][1]["attempts"], 3)
+
+        units = load_failure_report(path)
+        self.assertEqual([unit.to_dict() for unit in units],
+                         [unit.to_dict() for unit in self.units])
+        self.assertEqual(units[0].derived_file_names,
+                         ["wc2.1_10m_tmin_05.tif"])
+
+    def test_failed_units_are_reported(self):
+        # Nothing is in the offline cache, so every unit fails
+        cache = ArchiveCache(os.path.join(self.tmp_dir.name, "cache"),
+                             offline=True)
+        path = os.path.join(self.tmp_dir.name, "failures.json")
+        failed = download_convert_units(self.units,
+                                        self.tmp_dir.name,
+                                        scratch_dir=self.tmp_dir.name,
+                                        max_workers=2,
+                                        cache=cache,
+                                        retry=RetryPolicy(retries=2,
+                                                          backoff=0),
+                                        failure_report=path)
+        self.assertEqual(sorted(unit.file_name for unit in failed),
+                         sorted(unit.file_name for unit in self.units))
+        with open(path) as f:
+            failures = json.load(f)["failures"]
+        self.assertEqual({failure["error"]
+                          for failure in failures}, {"FileNotFoundError"})
+        self.assertEqual({failure["attempts"] for failure in failures}, {1})
+
+        with self.assertRaises(FileNotFoundError):
+            download_convert_units(self.units,
+                                   self.tmp_dir.name,
+                                   scratch_dir=self.tmp_dir.name,
+                                   cache=cache)
+
+    def test_retry_failed_command(self):
+        report = os.path.join(self.tmp_dir.name, "failures.json")
+        save_failure_report(report, [
+            (self.units[1],
+             TaskFailure(Task(self.units[1].file_name, lambda: None),
+                         TimeoutError(), 3))
+        ])
+        args = [
+            "worldclim", "create-all-bioclim-cogs", "-d",
+            os.path.join(self.tmp_dir.name, "cogs"), "--cache-dir",
+            os.path.join(self.tmp_dir.name, "cache"), "--offline",
+            "--retry-failed", report, "--failure-report", report
+        ]
+        result = self.run_command(args + ["--plan"])
+        self.assertEqual(result.exit_code, 0, msg=result.output)
+        self.assertIn("wc2.1_10m_bio_12.tif", result.output)
+        self.assertNotIn("wc2.1_10m_bio_1.tif", result.output)
+
+        # The archive is not in the offline cache, so it fails again
+        result = self.run_command(args)
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn(f"1 files failed, see {report}", result.output)
+        self.assertEqual(
+            [unit.file_name for unit in load_failure_report(report)],
+            ["wc2.1_10m_bio_12.tif"])
+
+        result = self.run_command([
+            "worldclim", "create-all-bioclim-cogs", "-d",
+            os.path.join(self.tmp_dir.name, "cogs"), "--retry-failed",
+            os.path.join(self.tmp_dir.name, "missing.json")
+        ])
+        self.assertEqual(result.exit_code, 2)
+
+    def test_retry_sharded_run(self):
+        # A shard's report only lists units of that shard, which are all
+        # converted again rather than partitioned a second time
+        shard = Shard(2, 4)
+        units = shard.select(bioclim_units())
+        self.assertGreater(len(units), 1)
+        self.assertLess(len(shard.select(units)), len(units))
+        report = os.path.join(self.tmp_dir.name, "failures.json")
+        save_failure_report(report, [
+            (unit, TaskFailure(Task(unit.file_name, lambda: None),
+                               TimeoutError(), 3)) for unit in units
+        ])
+        cache = ArchiveCache(os.path.join(self.tmp_dir.name, "cache"),
+                             offline=True)
+        failed = download_convert_bioclim_dataset(
+            self.tmp_dir.name,
+            scratch_dir=self.tmp_dir.name,
+            cache=cache,
+            shard=shard,
+            retry=RetryPolicy(retries=0, backoff=0),
+            failure_report=report,
+            units=load_failure_report(report))
+        self.assertEqual(sorted(unit.file_name for unit in failed),
+                         sorted(unit.file_name for unit in units))
+
+        result = self.run_command([
+            "worldclim", "create-all-bioclim-cogs", "-d",
+            os.path.join(self.tmp_dir.name, "cogs"), "--shard", "2/4",
+            "--retry-failed", report, "--plan"
+        ])
+        self.assertEqual(result.exit_code, 0, msg=result.output)
+        for unit in units:
+            self.assertIn(unit.file_name, result.output)
+
+    @unittest.skipIf(fsspec is None, "fsspec is not installed")
+    def test_retry_failed_needs_a_local_destination(self):
+        report = os.path.join(self.tmp_dir.name, "failures.json")
+        save_failure_report(report, [
+            (self.units[1], TaskFailure(Task("bio_12", lambda: None),
+                                        ConnectionResetError("reset"), 3))
+        ])
+        destination = "memory://worldclim-retry-test/bioclim"
+        result = self.run_command([
+            "worldclim", "create-full-bioclim-collection", "-d", destination,
+            "--retry-failed", report
+        ])
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn("--retry-failed", result.output)
+        self.assertFalse(
+            fsspec.filesystem("memory").exists(
+                "/worldclim-retry-test/bioclim/collection.json"))
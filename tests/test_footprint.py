@@ -0,0 +1,59 @@
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+from shapely.geometry import Point, shape
+
+from stactools.worldclim import stac
+from stactools.worldclim.footprint import data_footprint
+
+DATA_FILES = os.path.join(os.path.dirname(__file__), "data-files")
+
+
+def write_tile(path: str, data: np.ndarray) -> None:
+    with rasterio.open(path,
+                       "w",
+                       driver="GTiff",
+                       height=data.shape[0],
+                       width=data.shape[1],
+                       count=1,
+                       dtype="int16",
+                       nodata=-32768,
+                       crs="EPSG:4326",
+                       transform=from_origin(0, 90, 1, 1)) as dst:
+        dst.write(data, 1)
+
+
+class FootprintTest(unittest.TestCase):
+    def test_global_footprint(self):
+        footprint = shape(
+            data_footprint(os.path.join(DATA_FILES,
+                                        "wc2.1_10m_prec_01.tif")))
+        self.assertTrue(footprint.is_valid)
+        self.assertLess(footprint.area, 0.6 * 360 * 180)
+        # Central Europe is land, the middle of the Atlantic is not
+        self.assertTrue(footprint.contains(Point(10, 50)))
+        self.assertFalse(footprint.contains(Point(-30, 0)))
+
+    def test_mostly_empty_tile(self):
+        data = np.full((90, 90), -32768, dtype="int16")
+        data[60:, :20] = 1
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "wc2.1_30s_bio_1_1_1.tif")
+            write_tile(path, data)
+            item = stac.create_bioclim_item(path, footprint=True)
+            self.assertEqual(item.bbox, [0.0, 0.0, 20.0, 30.0])
+            self.assertAlmostEqual(shape(item.geometry).area, 600)
+            # The projection fields keep the bounds of the file
+            self.assertEqual(item.assets["data"].extra_fields.get(
+                "proj:bbox", item.properties.get("proj:bbox")),
+                             [0.0, 0.0, 90.0, 90.0])
+
+    def test_empty_raster(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "empty.tif")
+            write_tile(path, np.full((10, 10), -32768, dtype="int16"))
+            self.assertIsNone(data_footprint(path))
@@ -0,0 +1,136 @@
+import os
+import shutil
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from stactools.testing import CliTestCase
+
+from stactools.worldclim import stac
+from stactools.worldclim.commands import create_worldclim_command
+from stactools.worldclim.constants import MONTHLY_DATA_VARIABLES
+from stactools.worldclim.enum import Month, Resolution
+from stactools.worldclim.index import ItemIndex
+
+BIOCLIM_TIF = os.path.join(os.path.dirname(__file__), "data-files",
+                           "wc2.1_10m_bio_1.tif")
+
+
+class IndexTest(CliTestCase):
+    def create_subcommand_functions(self):
+        return [create_worldclim_command]
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.items = []
+        for month in ["01", "06"]:
+            for tile, bbox in [("_1_1", [-180, 0, -90, 90]),
+                               ("_2_3", [0, -90, 90, 0])]:
+                for variable in MONTHLY_DATA_VARIABLES:
+                    shutil.copy(
+                        BIOCLIM_TIF,
+                        os.path.join(self.tmp_dir.name,
+                                     f"wc2.1_30s_{variable}_{month}{tile}.tif"))
+                item = stac.create_monthly_item(
+                    os.path.join(self.tmp_dir.name,
+                                 f"wc2.1_30s_tmin_{month}{tile}.tif"))
+                item.bbox = bbox
+                self.items.append(item)
+        for name in ["wc2.1_10m_bio_1.tif", "wc2.1_10m_bio_12.tif"]:
+            path = os.path.join(self.tmp_dir.name, name)
+            shutil.copy(BIOCLIM_TIF, path)
+            self.items.append(stac.create_bioclim_item(path))
+        self.index = ItemIndex.from_items(self.items)
+
+    def ids(self, positions) -> list:
+        return self.index.ids[positions].tolist()
+
+    def test_query(self):
+        self.assertEqual(len(self.index), 6)
+        self.assertEqual(
+            self.ids(
+                self.index.query(bbox=[-100, 10, -95, 20],
+                                 resolution=Resolution.THIRTY_SECONDS,
+                                 variable="prec",
+                                 month=Month.JUNE)), ["wc2.1_30s_6_1_1"])
+        self.assertEqual(self.ids(self.index.query(resolution="10m")),
+                         ["wc2.1_10m_bio_1", "wc2.1_10m_bio_12"])
+        self.assertEqual(self.ids(self.index.query(variable="bio_12")),
+                         ["wc2.1_10m_bio_12"])
+        self.assertEqual(len(self.index.query(month=1)), 2)
+        self.assertEqual(len(self.index.query(bbox=[170, 80, 175, 85])), 2)
+        self.assertEqual(len(self.index.query(bbox=[-89, 1, -1, 89])), 2)
+        with self.assertRaises(ValueError):
+            self.index.query(variable="snow")
+
+    def test_hrefs(self):
+        positions = self.index.query(variable="prec", month=6)
+        self.assertEqual(self.index.hrefs(positions, "prec"), [
+            os.path.join(self.tmp_dir.name, "wc2.1_30s_prec_06_1_1.tif"),
+            os.path.join(self.tmp_dir.name, "wc2.1_30s_prec_06_2_3.tif"),
+        ])
+        position = self.index.query(variable="bio_1")[0]
+        self.assertEqual(self.index.assets(position), {
+            "data": os.path.join(self.tmp_dir.name, "wc2.1_10m_bio_1.tif")
+        })
+
+    def test_save_and_load(self):
+        path = os.path.join(self.tmp_dir.name, "items.npz")
+        self.index.save(path)
+        loaded = ItemIndex.load(path)
+        for name in ["ids", "months", "variables", "bboxes", "asset_hrefs"]:
+            np.testing.assert_array_equal(getattr(loaded, name),
+                                          getattr(self.index, name))
+        self.assertEqual(self.ids(loaded.query(variable="wind", month=6)),
+                         ["wc2.1_30s_6_1_1", "wc2.1_30s_6_2_3"])
+
+        result = self.run_command([
+            "worldclim", "query", path, "--bbox", "-100,10,-95,20", "-r",
+            "30s", "-v", "prec", "-m", "6"
+        ])
+        self.assertEqual(result.exit_code, 0, msg=result.output)
+        self.assertEqual(result.output.split(), [
+            "wc2.1_30s_6_1_1",
+            os.path.join(self.tmp_dir.name, "wc2.1_30s_prec_06_1_1.tif")
+        ])
+
+        result = self.run_command(
+            ["worldclim", "query", path, "--bbox", "1,2,3"])
+        self.assertEqual(result.exit_code, 2)
+
+    def test_moved_index(self):
+        with TemporaryDirectory() as tmp_dir:
+            path = os.path.join(self.tmp_dir.name, "items.npz")
+            self.index.save(path)
+            with np.load(path) as columns:
+                self.assertIn("./wc2.1_10m_bio_1.tif",
+                              columns["asset_hrefs"].tolist())
+            moved_path = os.path.join(tmp_dir, "items.npz")
+            shutil.move(path, moved_path)
+            position = self.index.query(variable="bio_1")[0]
+            self.assertEqual(
+                ItemIndex.load(moved_path).assets(position),
+                {"data": os.path.join(tmp_dir, "wc2.1_10m_bio_1.tif")})
+
+            # Uploaded indexes are relative to their URL
+            hrefs = self.index.asset_hrefs.tolist()
+            self.index.asset_hrefs = np.array([
+                "s3://bucket/worldclim/" + os.path.basename(href)
+                for href in hrefs
+            ])
+            self.index.save(moved_path, "s3://bucket/worldclim/items.npz")
+            self.assertEqual(
+                ItemIndex.load(moved_path).asset_hrefs.tolist(),
+                [os.path.join(tmp_dir, os.path.basename(href))
+                 for href in hrefs])
+
+    def test_loading_needs_only_numpy(self):
+        code = ("import sys\n"
+                "from stactools.worldclim.index import ItemIndex\n"
+                "print([m for m in ['pystac', 'rasterio'] "
+                "if m in sys.modules])")
+        output = subprocess.check_output([sys.executable, "-c", code])
+        self.assertEqual(output.decode().strip(), "[]")
@@ -0,0 +1,91 @@
+import os
+import shutil
+import unittest
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from stactools.worldclim import stac
+from stactools.worldclim.constants import MONTHLY_DATA_VARIABLES
+from stactools.worldclim.enum import Resolution
+
+try:
+    from stactools.worldclim.loader import load_collection
+except ImportError:
+    load_collection = None
+
+DATA_FILES = os.path.join(os.path.dirname(__file__), "data-files")
+
+
+@unittest.skipIf(load_collection is None, "xarray and dask are not installed")
+class LoaderTest(unittest.TestCase):
+    def test_monthly(self):
+        source = os.path.join(DATA_FILES, "wc2.1_10m_prec_01.tif")
+        with TemporaryDirectory() as tmp_dir:
+            collection = stac.create_monthly_collection()
+            for month in [1, 2]:
+                for variable in MONTHLY_DATA_VARIABLES:
+                    shutil.copy(
+                        source,
+                        os.path.join(tmp_dir,
+                                     f"wc2.1_10m_{variable}_{month:02d}.tif"))
+                collection.add_item(
+                    stac.create_monthly_item(
+                        os.path.join(tmp_dir, f"wc2.1_10m_tmin_{month:02d}.tif")))
+
+            dataset = load_collection(collection)
+            data = dataset.data
+            self.assertEqual(data.dims, ("variable", "month", "y", "x"))
+            self.assertEqual(data.shape, (7, 2, 1080, 2160))
+            self.assertEqual(list(dataset.month.values), [1, 2])
+            self.assertEqual(data.chunks[2], (512, 512, 56))
+            self.assertEqual(data.chunks[3], (512, 512, 512, 512, 112))
+
+            with rasterio.open(source) as src:
+                expected = src.read(1, masked=True).astype("float32")
+            np.testing.assert_array_equal(
+                data.sel(variable="prec", month=2).values,
+                expected.filled(np.nan))
+            self.assertAlmostEqual(float(dataset.x[0]), -180 + 1 / 12)
+            self.assertAlmostEqual(float(dataset.y[0]), 90 - 1 / 12)
+
+    def test_thirty_seconds_tiles_are_stitched(self):
+        shapes = mock.patch.dict(
+            "stactools.worldclim.loader.RESOLUTION_SHAPES", {"30s": (4, 12)})
+        tiling = mock.patch("stactools.worldclim.cog.TILING_PIXEL_SIZE",
+                            (4, 4))
+        with TemporaryDirectory() as tmp_dir, shapes, tiling:
+            collection = stac.create_bioclim_collection()
+            # The middle tile is empty and was not written
+            for col, value in [(1, 1), (3, 3)]:
+                path = os.path.join(tmp_dir, f"wc2.1_30s_bio_1_1_{col}.tif")
+                with rasterio.open(path,
+                                   "w",
+                                   driver="GTiff",
+                                   height=4,
+                                   width=4,
+                                   count=1,
+                                   dtype="int16",
+                                   nodata=-32768,
+                                   crs="EPSG:4326",
+                                   transform=from_origin(
+                                       -180 + (col - 1) * 120, 90, 30,
+                                       45)) as dst:
+                    dst.write(np.full((1, 4, 4), value, dtype="int16"))
+                collection.add_item(stac.create_bioclim_item(path))
+
+            data = load_collection(collection,
+                                   Resolution.THIRTY_SECONDS,
+                                   chunk_size=3).data
+            self.assertEqual(data.dims, ("variable", "y", "x"))
+            self.assertEqual(data.shape, (1, 4, 12))
+            # Chunks restart at every tile boundary
+            self.assertEqual(data.chunks[2], (3, 1, 3, 1, 3, 1))
+
+            values = data.values[0]
+            np.testing.assert_array_equal(values[:, :4], 1)
+            self.assertTrue(np.isnan(values[:, 4:8]).all())
+            np.testing.assert_array_equal(values[:, 8:], 3)
@@ -0,0 +1,89 @@
+import os
+import shutil
+import subprocess
+import sys
+import time
+import unittest
+import zipfile
+from tempfile import TemporaryDirectory
+from urllib.request import urlopen
+
+import rasterio
+
+from stactools.worldclim.cache import ArchiveCache
+from stactools.worldclim.cog import remote_size
+from stactools.worldclim.constants import DATASET_URL_MAIN
+from stactools.worldclim.planner import bioclim_units
+from tests.loadtest import ArchiveServer, build_archives, run_load_test
+
+
+class LoadTestTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.root = os.path.join(self.tmp_dir.name, "server")
+
+    def test_archives_are_laid_out_like_the_server(self):
+        totals = build_archives(self.root, "bioclim", 120)
+        self.assertEqual(totals["archives"], 4)
+        self.assertEqual(totals["files"], 4 * 19)
+        for unit in bioclim_units():
+            path = os.path.join(self.root,
+                                unit.url[len(DATASET_URL_MAIN) + 1:])
+            with zipfile.ZipFile(path) as zip_file:
+                self.assertIn(unit.file_name, zip_file.namelist())
+        with zipfile.ZipFile(
+                os.path.join(self.root, "v2.1/base/wc2.1_30s_bio.zip")) as f:
+            f.extract("wc2.1_30s_bio_12.tif", self.tmp_dir.name)
+        with rasterio.open(
+                os.path.join(self.tmp_dir.name,
+                             "wc2.1_30s_bio_12.tif")) as dataset:
+            self.assertEqual(dataset.shape, (180, 360))
+            self.assertEqual(dataset.bounds, (-180, -90, 180, 90))
+        with self.assertRaises(ValueError):
+            build_archives(self.root, "bioclim", 7)
+
+    def test_url_override(self):
+        code = ("from stactools.worldclim.planner import bioclim_units\n"
+                "print(bioclim_units()[0].url)")
+        output = subprocess.check_output(
+            [sys.executable, "-c", code],
+            env=dict(os.environ, WORLDCLIM_DATASET_URL="http://localhost:1"))
+        self.assertEqual(output.decode().strip(),
+                         "http://localhost:1/v2.1/base/wc2.1_10m_bio.zip")
+
+    def test_server(self):
+        path = os.path.join(self.root, "v2.1/base/wc2.1_10m_bio.zip")
+        os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as f:
+            f.write(os.urandom(200_000))
+        with ArchiveServer(self.root, latency=0.1,
+                           bandwidth=2_000_000) as server:
+            url = f"{server.url}/v2.1/base/wc2.1_10m_bio.zip"
+            self.assertEqual(remote_size(url), 200_000)
+            start = time.perf_counter()
+            with urlopen(url) as response:
+                self.assertEqual(len(response.read()), 200_000)
+            self.assertGreater(time.perf_counter() - start, 0.15)
+
+            # Cached archives are revalidated without downloading them again
+            cache_dir = os.path.join(self.tmp_dir.name, "cache")
+            ArchiveCache(cache_dir).fetch(url)
+            self.assertEqual(server.bytes_sent, 400_000)
+            ArchiveCache(cache_dir).fetch(url)
+            self.assertEqual(server.bytes_sent, 400_000)
+            self.assertEqual(server.requests, 4)
+
+    @unittest.skipIf(
+        shutil.which("gdal_translate") is None, "gdal_translate is needed")
+    def test_load_test(self):
+        report = run_load_test(self.tmp_dir.name,
+                               downscale=120,
+                               workers=2,
+                               options=["--derive"])
+        self.assertEqual(report["items"], 4 * 19)
+        self.assertEqual(report["cogs"], 4 * 19)
+        # Only the 30s archive is downloaded
+        self.assertEqual(report["requests"], 2)
+        self.assertGreater(report["peak_rss_bytes"], 0)
+        self.assertGreater(report["peak_disk_bytes"], 0)
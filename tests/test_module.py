@@ -1,11 +1,50 @@
+import subprocess
+import sys
 import unittest
 
 import stactools.worldclim
+from stactools.worldclim import constants
+
+HEAVY_MODULES = [
+    "rasterio", "pystac", "pyproj", "shapely", "stactools.core", "xarray",
+    "dask", "fsspec"
+]
 
 
 class TestModule(unittest.TestCase):
     def test_version(self):
         self.assertIsNotNone(stactools.worldclim.__version__)
 
+    def test_lazy_imports(self):
+        # Startup must stay cheap for plugin registration and short commands
+        code = ("import sys\n"
+                "import stactools.worldclim\n"
+                "import stactools.worldclim.commands\n"
+                f"print([m for m in {HEAVY_MODULES!r} if m in sys.modules])")
+        output = subprocess.check_output([sys.executable, "-c", code])
+        self.assertEqual(output.decode().strip(), "[]")
+
+    def test_items_without_the_pipeline(self):
+        # Creating items must not need the conversion pipeline, whose archive
+        # cache locks with fcntl
+        pipeline = [
+            "stactools.worldclim.cog", "stactools.worldclim.cache",
+            "stactools.worldclim.planner", "stactools.worldclim.scheduler"
+        ]
+        code = ("import sys\n"
+                "import stactools.worldclim.stac\n"
+                f"print([m for m in {pipeline!r} if m in sys.modules])")
+        output = subprocess.check_output([sys.executable, "-c", code])
+        self.assertEqual(output.decode().strip(), "[]")
+
+    def test_lazy_attributes(self):
+        self.assertTrue(callable(stactools.worldclim.create_cog))
+        self.assertTrue(callable(stactools.worldclim.create_monthly_item))
+        self.assertIn("WGS 84", constants.WORLDCLIM_CRS_WKT)
+        self.assertIs(constants.LICENSE_LINK, constants.LICENSE_LINK)
+        self.assertEqual(constants.WORLDCLIM_PROVIDER.name, "WorldClim")
+        with self.assertRaises(AttributeError):
+            constants.NOT_A_CONSTANT
+
 
 # run other tests here
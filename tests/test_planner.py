@@ -0,0 +1,78 @@
+import unittest
+
+from stactools.worldclim.enum import Month, Resolution
+from stactools.worldclim.planner import (
+    Plan,
+    WorkUnit,
+    bioclim_units,
+    monthly_units,
+)
+
+
+class PlannerTest(unittest.TestCase):
+    def test_units(self):
+        units = monthly_units()
+        self.assertEqual(len(units), 4 * 7 * 12)
+        self.assertEqual(len(bioclim_units()), 4 * 19)
+
+        unit = WorkUnit(Resolution.TEN_MINUTES, "tmin", Month.JANUARY)
+        self.assertEqual(unit.file_name, "wc2.1_10m_tmin_01.tif")
+        self.assertTrue(unit.url.endswith("/wc2.1_10m_tmin.zip"))
+        self.assertEqual(unit.pixels, 1080 * 2160)
+        self.assertEqual(unit.outputs, 1)
+
+        unit = WorkUnit(Resolution.THIRTY_SECONDS, "bio_12")
+        self.assertEqual(unit.file_name, "wc2.1_30s_bio_12.tif")
+        self.assertTrue(unit.url.endswith("/wc2.1_30s_bio.zip"))
+        self.assertEqual(unit.outputs, 8)
+
+    def test_largest_first(self):
+        plan = Plan(bioclim_units(), workers=4, pixels_per_second=1e6)
+        pixels = [unit.pixels for unit in plan.order]
+        self.assertEqual(pixels, sorted(pixels, reverse=True))
+        # The 30s conversions start on every worker before anything else
+        starts = [start for start, _, _ in plan.schedule[:4]]
+        self.assertEqual(starts, [0.0] * 4)
+
+        total = sum(unit.estimated_seconds(1e6) for unit in plan.order)
+        largest = plan.order[0].estimated_seconds(1e6)
+        self.assertGreaterEqual(plan.makespan, total / 4)
+        self.assertLessEqual(plan.makespan, total / 4 + largest)
+
+    def test_peak_scratch(self):
+        units = [
+            WorkUnit(Resolution.TEN_MINUTES, "tmin", month)
+            for month in Month
+        ]
+        url = units[0].url
+        plan = Plan(units, workers=2, archive_bytes={url: 1000})
+        file_bytes = units[0].scratch_bytes
+        self.assertEqual(plan.peak_scratch_bytes, 1000 + 2 * file_bytes)
+
+        plan = Plan(units, workers=2, archives_in_scratch=False)
+        self.assertEqual(plan.peak_scratch_bytes, 2 * file_bytes)
+
+    def test_describe(self):
+        description = Plan(monthly_units(), workers=8).describe()
+        self.assertIn("336 conversions from 28 archives", description)
+        self.assertIn("Expected peak scratch usage", description)
+        self.assertIn("Estimated wall time", description)
+
+    def test_derived_units(self):
+        units = monthly_units(derive=True)
+        self.assertEqual(len(units), 7 * 12)
+        self.assertEqual(len(bioclim_units(derive=True)), 19)
+        unit = units[0]
+        self.assertIs(unit.resolution, Resolution.THIRTY_SECONDS)
+        self.assertEqual(unit.derived_file_names, [
+            "wc2.1_2.5m_tmin_01.tif", "wc2.1_5m_tmin_01.tif",
+            "wc2.1_10m_tmin_01.tif"
+        ])
+        self.assertEqual(unit.outputs, 8 + 3)
+        plain = WorkUnit(Resolution.THIRTY_SECONDS, "tmin", Month.JANUARY)
+        self.assertGreater(unit.scratch_bytes, plain.scratch_bytes)
+        self.assertGreater(unit.estimated_seconds(), plain.estimated_seconds())
+
+        plan = Plan(units, workers=4)
+        self.assertEqual(len(plan.archive_bytes), 7)
+        self.assertIn("-> derive wc2.1_10m_tmin_01.tif", plan.describe())
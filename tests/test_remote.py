@@ -0,0 +1,110 @@
+import multiprocessing
+import os
+import re
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from stactools.worldclim import stac
+from stactools.worldclim.remote import is_remote
+
+DATA_FILES = os.path.abspath("tests/data-files")
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves the test data files with range requests, logging each request."""
+    protocol_version = "HTTP/1.1"
+    request_log = None
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def respond(self, send_body):
+        byte_range = self.headers.get("Range")
+        self.request_log.put((self.command, self.path, byte_range))
+        path = os.path.join(DATA_FILES, os.path.basename(self.path))
+        if not os.path.isfile(path):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        if byte_range:
+            start, end = re.match(r"bytes=(\d+)-(\d*)", byte_range).groups()
+            start = int(start)
+            end = min(int(end) if end else len(data) - 1, len(data) - 1)
+            self.send_response(206)
+            self.send_header("Content-Range",
+                             f"bytes {start}-{end}/{len(data)}")
+            data = data[start:end + 1]
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port_queue, request_log):
+    RangeHandler.request_log = request_log
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+class RemoteTest(unittest.TestCase):
+    def setUp(self):
+        # rasterio holds the GIL while opening files, so the server runs in
+        # its own process
+        port_queue = multiprocessing.Queue()
+        self.request_log = multiprocessing.Queue()
+        self.server = multiprocessing.Process(target=serve,
+                                              args=(port_queue,
+                                                    self.request_log),
+                                              daemon=True)
+        self.server.start()
+        self.base_url = f"http://127.0.0.1:{port_queue.get()}"
+
+    def tearDown(self):
+        self.server.terminate()
+        self.server.join()
+
+    def requests(self):
+        time.sleep(0.2)
+        requests = []
+        while not self.request_log.empty():
+            requests.append(self.request_log.get())
+        return requests
+
+    def assert_one_range_request(self, requests):
+        gets = [r for r in requests if r[0] == "GET"]
+        self.assertEqual(len(gets), 1, msg=requests)
+        self.assertIsNotNone(gets[0][2])
+        self.assertLessEqual(len(requests), 2, msg=requests)
+
+    def test_is_remote(self):
+        self.assertTrue(is_remote("https://example.com/a.tif"))
+        self.assertTrue(is_remote("s3://bucket/a.tif"))
+        self.assertFalse(is_remote("tests/data-files/a.tif"))
+
+    def test_remote_bioclim_item(self):
+        href = f"{self.base_url}/bioclim/wc2.1_10m_bio_1.tif"
+        item = stac.create_bioclim_item(href)
+        self.assertEqual(item.assets["data"].href, href)
+        self.assert_one_range_request(self.requests())
+
+    def test_remote_monthly_item(self):
+        href = "/monthly/wc2.1_10m_prec_01.tif"
+        item = stac.create_monthly_item(
+            href, cog_href_modifier=lambda href: self.base_url + href)
+        self.assertEqual(item.id, "wc2.1_10m_1")
+        self.assertEqual(len(item.assets), 7)
+        self.assert_one_range_request(self.requests())
@@ -0,0 +1,166 @@
+import threading
+import time
+import unittest
+from functools import partial
+from subprocess import CalledProcessError, TimeoutExpired
+from urllib.error import HTTPError, URLError
+
+from stactools.worldclim.scheduler import (
+    BudgetScheduler,
+    RetryPolicy,
+    SharedResource,
+    Task,
+    is_transient,
+    parse_size,
+)
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_parse_size(self):
+        self.assertEqual(parse_size("512"), 512)
+        self.assertEqual(parse_size("2K"), 2048)
+        self.assertEqual(parse_size("1.5G"), 1536 * 1024**2)
+        self.assertEqual(parse_size("10gb"), 10 * 1024**3)
+        with self.assertRaises(ValueError):
+            parse_size("lots")
+
+    def test_budgets_are_never_exceeded(self):
+        lock = threading.Lock()
+        usage = {"scratch": 0, "memory": 0}
+        peaks = {"scratch": 0, "memory": 0}
+        finished = []
+
+        def make_task(name, scratch, memory):
+            def run():
+                with lock:
+                    usage["scratch"] += scratch
+                    usage["memory"] += memory
+                    for key in usage:
+                        peaks[key] = max(peaks[key], usage[key])
+                time.sleep(0.01)
+                with lock:
+                    usage["scratch"] -= scratch
+                    usage["memory"] -= memory
+                    finished.append(name)
+
+            return Task(name, run, scratch_bytes=scratch, memory_bytes=memory)
+
+        sizes = [(60, 10), (50, 40), (30, 30), (20, 50), (10, 10), (40, 20)]
+        tasks = [
+            make_task(f"task-{i}", scratch, memory)
+            for i, (scratch, memory) in enumerate(sizes * 3)
+        ]
+        scheduler = BudgetScheduler(scratch_budget=100,
+                                    memory_budget=80,
+                                    max_workers=4)
+        scheduler.run(tasks)
+
+        self.assertEqual(len(finished), len(tasks))
+        self.assertLessEqual(peaks["scratch"], 100)
+        self.assertLessEqual(peaks["memory"], 80)
+        self.assertEqual(scheduler.scratch_in_use, 0)
+        self.assertEqual(scheduler.memory_in_use, 0)
+
+    def test_shared_resources(self):
+        events = []
+        archives = {
+            name: SharedResource(name, 50, partial(events.append, name))
+            for name in ["a", "b"]
+        }
+        tasks = [
+            Task(f"{name}-{i}",
+                 partial(events.append, f"{name}-{i}"),
+                 scratch_bytes=10,
+                 resource=archives[name]) for name in ["a", "b"]
+            for i in range(3)
+        ]
+        scheduler = BudgetScheduler(scratch_budget=70, max_workers=2)
+        scheduler.run(tasks)
+
+        # Each archive is released after its last task, before the other
+        # archive fits in the budget
+        self.assertEqual(sorted(events[:3]), ["a-0", "a-1", "a-2"])
+        self.assertEqual(events[3], "a")
+        self.assertEqual(sorted(events[4:7]), ["b-0", "b-1", "b-2"])
+        self.assertEqual(events[7], "b")
+        self.assertEqual(scheduler.scratch_in_use, 0)
+
+        with self.assertRaises(ValueError):
+            BudgetScheduler(scratch_budget=55).run(tasks)
+
+    def test_task_larger_than_budget(self):
+        ran = []
+        task = Task("huge", lambda: ran.append(True), scratch_bytes=200)
+        with self.assertRaises(ValueError):
+            BudgetScheduler(scratch_budget=100).run([task])
+        self.assertEqual(ran, [])
+
+    def test_errors_are_raised(self):
+        def fail():
+            raise RuntimeError("conversion failed")
+
+        with self.assertRaises(RuntimeError):
+            BudgetScheduler(max_workers=2).run([Task("fail", fail)])
+
+    def test_transient_errors(self):
+        for error in [
+                URLError("reset"),
+                HTTPError("url", 503, "unavailable", {}, None),
+                ConnectionResetError(),
+                TimeoutError(),
+                CalledProcessError(1, "gdal_translate"),
+                TimeoutExpired("gdal_translate", 10),
+                OSError("Read error at scanline 100"),
+        ]:
+            self.assertTrue(is_transient(error), error)
+        for error in [
+                HTTPError("url", 404, "not found", {}, None),
+                FileNotFoundError(),
+                ValueError("bad shape"),
+                RuntimeError(),
+        ]:
+            self.assertFalse(is_transient(error), error)
+
+    def test_transient_errors_are_retried(self):
+        attempts = []
+
+        def flaky():
+            attempts.append(time.perf_counter())
+            if len(attempts) < 3:
+                raise ConnectionResetError("reset by peer")
+
+        retry = RetryPolicy(retries=2, backoff=0.05)
+        self.assertEqual(retry.delay(2), 0.1)
+        scheduler = BudgetScheduler(scratch_budget=10, retry=retry)
+        scheduler.run([Task("flaky", flaky, scratch_bytes=10)])
+        self.assertEqual(len(attempts), 3)
+        self.assertGreaterEqual(attempts[2] - attempts[1], 0.1)
+        self.assertEqual(scheduler.scratch_in_use, 0)
+
+        attempts.clear()
+        with self.assertRaises(ConnectionResetError):
+            BudgetScheduler(retry=RetryPolicy(retries=1, backoff=0)).run(
+                [Task("flaky", flaky)])
+        self.assertEqual(len(attempts), 2)
+
+    def test_keep_going(self):
+        attempts = []
+        ran = []
+
+        def fail():
+            attempts.append(True)
+            raise ValueError("bad file")
+
+        tasks = [Task("fail", fail)] + [
+            Task(f"task-{i}", partial(ran.append, i)) for i in range(4)
+        ]
+        scheduler = BudgetScheduler(max_workers=2,
+                                    retry=RetryPolicy(retries=3, backoff=0))
+        failures = scheduler.run(tasks, keep_going=True)
+        self.assertEqual(sorted(ran), [0, 1, 2, 3])
+        self.assertEqual([failure.task.name for failure in failures],
+                         ["fail"])
+        self.assertIsInstance(failures[0].error, ValueError)
+        # Errors that are not transient are not retried
+        self.assertEqual(failures[0].attempts, 1)
+        self.assertEqual(attempts, [True])
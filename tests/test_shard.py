@@ -0,0 +1,103 @@
+import os
+import shutil
+from multiprocessing import Process
+from tempfile import TemporaryDirectory
+
+import pystac
+from stactools.testing import CliTestCase
+
+from stactools.worldclim import stac
+from stactools.worldclim.commands import create_worldclim_command
+from stactools.worldclim.enum import Resolution
+from stactools.worldclim.index import ItemIndex
+from stactools.worldclim.planner import Shard, bioclim_units, monthly_units
+from stactools.worldclim.shard import merge_shards, save_shard
+
+TEST_COG = os.path.join(os.path.dirname(__file__), "data-files",
+                        "wc2.1_10m_bio_1.tif")
+
+
+def run_shard(destination: str, index: int, count: int) -> None:
+    """Creates the 10m bioclimatic items of a shard from copies of the test
+    COG, as create-full-bioclim-collection --shard does after converting."""
+    shard = Shard(index, count)
+    cog_directory = os.path.join(destination, shard.name)
+    os.makedirs(cog_directory)
+    for unit in shard.select(bioclim_units()):
+        if unit.resolution is Resolution.TEN_MINUTES:
+            shutil.copy(TEST_COG, os.path.join(cog_directory, unit.file_name))
+    items = stac.create_bioclim_items(cog_directory, destination)
+    os.rmdir(cog_directory)
+    save_shard(stac.create_bioclim_collection(), items, destination, shard)
+
+
+class ShardTest(CliTestCase):
+    def create_subcommand_functions(self):
+        return [create_worldclim_command]
+
+    def test_parse(self):
+        shard = Shard.parse("2/8")
+        self.assertEqual((shard.index, shard.count), (2, 8))
+        self.assertEqual(shard.name, "shard-2-of-8")
+        for invalid in ["0/8", "9/8", "2", "a/b"]:
+            with self.assertRaises(ValueError):
+                Shard.parse(invalid)
+
+    def test_partition(self):
+        units = monthly_units()
+        shards = [Shard(index, 5).select(units) for index in range(1, 6)]
+        selected = [unit.file_name for shard in shards for unit in shard]
+        self.assertEqual(sorted(selected),
+                         sorted(unit.file_name for unit in units))
+        # Every COG of an item is built by the same shard
+        groups = [set(unit.item_group for unit in shard) for shard in shards]
+        for i, group in enumerate(groups):
+            for other in groups[i + 1:]:
+                self.assertEqual(group & other, set())
+        # Shards are computed identically on every node
+        self.assertEqual(
+            [unit.file_name for unit in Shard(3, 5).select(units)],
+            [unit.file_name for unit in shards[2]])
+
+    def test_merge_shards_run_as_processes(self):
+        with TemporaryDirectory() as destination:
+            processes = [
+                Process(target=run_shard, args=(destination, index, 3))
+                for index in range(1, 4)
+            ]
+            for process in processes[:2]:
+                process.start()
+            for process in processes[:2]:
+                process.join()
+                self.assertEqual(process.exitcode, 0)
+
+            with self.assertRaises(ValueError):
+                merge_shards(stac.create_bioclim_collection(), destination)
+
+            processes[2].start()
+            processes[2].join()
+            self.assertEqual(processes[2].exitcode, 0)
+
+            result = self.run_command([
+                "worldclim", "merge", "-d", destination, "--dataset",
+                "bioclim"
+            ])
+            self.assertEqual(result.exit_code,
+                             0,
+                             msg="\n{}".format(result.output))
+
+            collection = pystac.read_file(
+                os.path.join(destination, "collection.json"))
+            items = list(collection.get_items())
+            self.assertEqual(len(items), 19)
+            for item in items:
+                href = item.assets["data"].get_absolute_href()
+                self.assertTrue(os.path.exists(href))
+                self.assertEqual(
+                    os.path.dirname(href),
+                    os.path.dirname(item.get_self_href()),
+                )
+
+            index = ItemIndex.load(os.path.join(destination, "items.npz"))
+            self.assertEqual(sorted(index.ids.tolist()),
+                             sorted(item.id for item in items))
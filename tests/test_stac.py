@@ -1,6 +1,13 @@
+import json
+import os
+import shutil
 import unittest
+from tempfile import TemporaryDirectory
 
 from stactools.worldclim import stac
+from stactools.worldclim.constants import MONTHLY_DATA_VARIABLES
+
+DATA_FILES = os.path.join(os.path.dirname(__file__), "data-files")
 
 
 class StacTest(unittest.TestCase):
@@ -30,3 +37,72 @@ class StacTest(unittest.TestCase):
 
         # Validate
         item.validate()
+
+    def test_create_items_in_item_directories(self):
+        with TemporaryDirectory() as tmp_dir:
+            item_dir = os.path.join(tmp_dir, "wc2.1_10m_1")
+            os.makedirs(item_dir)
+            for data_var in MONTHLY_DATA_VARIABLES:
+                shutil.copy(
+                    os.path.join(DATA_FILES, "wc2.1_10m_prec_01.tif"),
+                    os.path.join(item_dir, f"wc2.1_10m_{data_var}_01.tif"))
+            items = stac.create_monthly_items(tmp_dir, tmp_dir)
+            self.assertEqual([item.id for item in items], ["wc2.1_10m_1"])
+            self.assertEqual(len(os.listdir(item_dir)), 7)
+            self.assertEqual(
+                items[0].assets["tmin"].href,
+                os.path.join(item_dir, "wc2.1_10m_tmin_01.tif"))
+
+    def test_create_items_renames_into_item_directories(self):
+        with TemporaryDirectory() as tmp_dir:
+            cog_dir = os.path.join(tmp_dir, "cogs")
+            os.makedirs(cog_dir)
+            shutil.copy(os.path.join(DATA_FILES, "wc2.1_10m_bio_1.tif"),
+                        cog_dir)
+            items = stac.create_bioclim_items(cog_dir, tmp_dir)
+            self.assertEqual(os.listdir(cog_dir), [])
+            self.assertEqual(
+                items[0].assets["data"].href,
+                os.path.join(tmp_dir, "wc2.1_10m_bio_1",
+                             "wc2.1_10m_bio_1.tif"))
+
+    def test_compact_items(self):
+        with TemporaryDirectory() as tmp_dir:
+            for data_var in MONTHLY_DATA_VARIABLES:
+                shutil.copy(
+                    os.path.join(DATA_FILES, "wc2.1_10m_prec_01.tif"),
+                    os.path.join(tmp_dir, f"wc2.1_10m_{data_var}_01.tif"))
+            cog = os.path.join(tmp_dir, "wc2.1_10m_tmin_01.tif")
+            item = stac.create_monthly_item(cog)
+            compact = stac.create_monthly_item(cog, compact=True)
+
+            for asset in compact.assets.values():
+                self.assertFalse(
+                    any(key.startswith("proj:") for key in asset.extra_fields))
+            self.assertNotIn("proj:wkt2", compact.properties)
+            for field in ["proj:bbox", "proj:transform", "proj:shape"]:
+                self.assertEqual(compact.properties[field],
+                                 item.properties[field])
+            self.assertEqual(compact.properties["proj:shape"], [1080, 2160])
+            self.assertLess(
+                len(json.dumps(compact.to_dict())) * 3,
+                len(json.dumps(item.to_dict())))
+            self.assertEqual(
+                stac.compact_projection(item).to_dict(), compact.to_dict())
+
+            bioclim = stac.create_bioclim_item(
+                os.path.join(DATA_FILES, "wc2.1_10m_bio_1.tif"), compact=True)
+            self.assertNotIn("proj:wkt2", bioclim.properties)
+            self.assertNotIn("proj:shape", bioclim.assets["data"].extra_fields)
+
+    def test_compact_projection_keeps_fields_assets_do_not_share(self):
+        item = stac.create_monthly_item(
+            os.path.join(DATA_FILES, "wc2.1_10m_prec_01.tif"))
+        item.assets["prec"].extra_fields["proj:shape"] = [10, 20]
+        stac.compact_projection(item)
+        self.assertEqual(item.assets["prec"].extra_fields["proj:shape"],
+                         [10, 20])
+        self.assertEqual(item.assets["tmin"].extra_fields["proj:shape"],
+                         [1080, 2160])
+        self.assertNotIn("proj:transform", item.assets["tmin"].extra_fields)
+        self.assertNotIn("proj:wkt2", item.assets["prec"].extra_fields)
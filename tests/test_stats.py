@@ -0,0 +1,85 @@
+import os
+import shutil
+import unittest
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import rasterio
+from pystac.extensions.raster import RasterExtension
+
+from stactools.worldclim import stac
+from stactools.worldclim.constants import (
+    HISTOGRAM_BUCKETS,
+    MONTHLY_DATA_VARIABLES,
+)
+from stactools.worldclim.enum import StatisticsMode
+from stactools.worldclim.stats import compute_raster_band
+
+BIOCLIM_TIF = "tests/data-files/wc2.1_10m_bio_1.tif"
+PREC_TIF = "tests/data-files/wc2.1_10m_prec_01.tif"
+
+
+class StatsTest(unittest.TestCase):
+    def test_exact_statistics(self):
+        with rasterio.open(BIOCLIM_TIF) as dataset:
+            values = dataset.read(1, masked=True).compressed().astype(
+                np.float64)
+            total = dataset.height * dataset.width
+
+        band = compute_raster_band(BIOCLIM_TIF, StatisticsMode.EXACT)
+        statistics = band.statistics
+        self.assertAlmostEqual(statistics.minimum, values.min())
+        self.assertAlmostEqual(statistics.maximum, values.max())
+        self.assertAlmostEqual(statistics.mean, values.mean(), places=6)
+        self.assertAlmostEqual(statistics.stddev, values.std(), places=6)
+        self.assertAlmostEqual(statistics.valid_percent,
+                               100.0 * values.size / total)
+        self.assertEqual(band.data_type.value, "float32")
+        self.assertEqual(band.histogram.count, HISTOGRAM_BUCKETS)
+        # The histogram spans the full resolution values, not the overview's
+        expected, _ = np.histogram(values,
+                                   bins=HISTOGRAM_BUCKETS,
+                                   range=(values.min(), values.max()))
+        self.assertEqual((band.histogram.min, band.histogram.max),
+                         (values.min(), values.max()))
+        self.assertEqual(band.histogram.buckets, expected.tolist())
+
+    def test_approximate_statistics(self):
+        exact = compute_raster_band(PREC_TIF, StatisticsMode.EXACT)
+        approximate = compute_raster_band(PREC_TIF,
+                                          StatisticsMode.APPROXIMATE)
+        self.assertLess(sum(approximate.histogram.buckets),
+                        sum(exact.histogram.buckets))
+        self.assertAlmostEqual(
+            sum(approximate.histogram.buckets),
+            135 * 270 * approximate.statistics.valid_percent / 100)
+        self.assertGreater(approximate.statistics.mean,
+                           exact.statistics.minimum)
+        self.assertLess(approximate.statistics.mean, exact.statistics.maximum)
+        self.assertEqual(approximate.nodata, -32768)
+
+    def test_bioclim_item_statistics(self):
+        item = stac.create_bioclim_item(
+            BIOCLIM_TIF, statistics=StatisticsMode.APPROXIMATE)
+        self.assertIn(RasterExtension.get_schema_uri(), item.stac_extensions)
+        bands = RasterExtension.ext(item.assets["data"]).bands
+        self.assertEqual(len(bands), 1)
+        self.assertIsNotNone(bands[0].statistics.mean)
+
+    def test_monthly_item_statistics(self):
+        with TemporaryDirectory() as tmp_dir:
+            for data_var in MONTHLY_DATA_VARIABLES.keys():
+                shutil.copy(
+                    PREC_TIF,
+                    os.path.join(tmp_dir, f"wc2.1_10m_{data_var}_01.tif"))
+            item = stac.create_monthly_item(
+                os.path.join(tmp_dir, "wc2.1_10m_prec_01.tif"),
+                statistics=StatisticsMode.EXACT)
+            for asset in item.assets.values():
+                bands = RasterExtension.ext(asset).bands
+                self.assertIsNotNone(bands[0].histogram)
+
+    def test_item_without_statistics(self):
+        item = stac.create_bioclim_item(BIOCLIM_TIF)
+        self.assertNotIn(RasterExtension.get_schema_uri(),
+                         item.stac_extensions)
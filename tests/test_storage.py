@@ -0,0 +1,143 @@
+import os
+import shutil
+import unittest
+from glob import glob
+from tempfile import TemporaryDirectory
+
+import pystac
+
+from stactools.worldclim import stac
+from stactools.worldclim.thumbnail import add_thumbnails
+
+try:
+    import fsspec
+
+    from stactools.worldclim.storage import (
+        FsspecStacIO,
+        StagedItems,
+        Uploader,
+        publish_collection,
+    )
+except ImportError:
+    fsspec = None
+
+TEST_COG = os.path.join(os.path.dirname(__file__), "data-files",
+                        "wc2.1_10m_bio_1.tif")
+URL = "memory://worldclim-test/bioclim"
+
+
+@unittest.skipIf(fsspec is None, "fsspec is not installed")
+class StorageTest(unittest.TestCase):
+    def setUp(self):
+        self.fs = fsspec.filesystem("memory")
+
+    def tearDown(self):
+        if self.fs.exists("/worldclim-test"):
+            self.fs.rm("/worldclim-test", recursive=True)
+
+    def test_multipart_upload(self):
+        with TemporaryDirectory() as tmp_dir:
+            os.makedirs(os.path.join(tmp_dir, "item"))
+            path = os.path.join(tmp_dir, "item", "data.tif")
+            shutil.copy(TEST_COG, path)
+            with Uploader(tmp_dir, URL, max_workers=2,
+                          block_size=2**16) as uploader:
+                uploader.upload(path)
+                self.assertEqual(uploader.url_for(path),
+                                 f"{URL}/item/data.tif")
+            with open(TEST_COG, "rb") as f:
+                self.assertEqual(
+                    self.fs.cat("/worldclim-test/bioclim/item/data.tif"),
+                    f.read())
+
+    def test_failed_upload(self):
+        with TemporaryDirectory() as tmp_dir:
+            with self.assertRaises(FileNotFoundError):
+                with Uploader(tmp_dir, URL) as uploader:
+                    uploader.upload(os.path.join(tmp_dir, "missing.tif"))
+
+    def test_staged_items_are_removed(self):
+        def staged_cogs():
+            return sorted(
+                os.path.basename(path)
+                for path in glob(os.path.join(tmp_dir, "**", "*.tif"),
+                                 recursive=True))
+
+        with TemporaryDirectory() as tmp_dir:
+            with Uploader(tmp_dir, URL) as uploader:
+                staged_items = StagedItems(
+                    uploader, lambda paths: stac.create_bioclim_item(paths[0]),
+                    1)
+                for i in range(1, 5):
+                    path = os.path.join(tmp_dir, f"wc2.1_10m_bio_{i}",
+                                        f"wc2.1_10m_bio_{i}.tif")
+                    os.makedirs(os.path.dirname(path))
+                    shutil.copy(TEST_COG, path)
+                    staged_items.add(path)
+                    uploader.wait()
+                    # Only COGs of items that are not created yet are staged
+                    self.assertEqual(staged_cogs(), [])
+                self.assertEqual([item.id for item in staged_items.items],
+                                 [f"wc2.1_10m_bio_{i}" for i in range(1, 5)])
+
+                created = []
+                staged_items = StagedItems(
+                    uploader, lambda paths: created.append(paths) or
+                    stac.create_bioclim_item(TEST_COG), 2)
+                for variable in ["tmin", "tmax"]:
+                    path = os.path.join(tmp_dir, "wc2.1_10m_1",
+                                        f"wc2.1_10m_{variable}_01.tif")
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    shutil.copy(TEST_COG, path)
+                    staged_items.add(path)
+                    uploader.wait()
+                    if variable == "tmin":
+                        self.assertEqual(staged_cogs(),
+                                         ["wc2.1_10m_tmin_01.tif"])
+                self.assertEqual(staged_cogs(), [])
+                self.assertEqual(len(created), 1)
+                self.assertEqual(len(created[0]), 2)
+
+        self.assertTrue(
+            self.fs.exists(
+                "/worldclim-test/bioclim/wc2.1_10m_1/wc2.1_10m_tmax_01.tif"))
+        self.assertTrue(
+            self.fs.exists(
+                "/worldclim-test/bioclim/wc2.1_10m_bio_4/wc2.1_10m_bio_4.tif"))
+
+    def test_publish_collection(self):
+        with TemporaryDirectory() as tmp_dir:
+            shutil.copy(TEST_COG, tmp_dir)
+            with Uploader(tmp_dir, URL) as uploader:
+                items = stac.create_bioclim_items(tmp_dir, tmp_dir)
+                for item in items:
+                    uploader.upload(item.assets["data"].href)
+                collection = stac.create_bioclim_collection()
+                collection.add_items(items)
+                publish_collection(collection, uploader)
+
+        self.assertTrue(
+            self.fs.exists(
+                "/worldclim-test/bioclim/wc2.1_10m_bio_1/wc2.1_10m_bio_1.tif"))
+        collection = pystac.Collection.from_file(f"{URL}/collection.json",
+                                                 stac_io=FsspecStacIO())
+        self.assertEqual(collection.get_self_href(),
+                         f"{URL}/collection.json")
+        item = next(collection.get_items())
+        self.assertEqual(
+            item.assets["data"].get_absolute_href(),
+            f"{URL}/wc2.1_10m_bio_1/wc2.1_10m_bio_1.tif")
+
+    def test_publish_uploads_remaining_assets(self):
+        with TemporaryDirectory() as tmp_dir:
+            shutil.copy(TEST_COG, tmp_dir)
+            with Uploader(tmp_dir, URL) as uploader:
+                items = stac.create_bioclim_items(tmp_dir, tmp_dir)
+                add_thumbnails(items)
+                collection = stac.create_bioclim_collection()
+                collection.add_items(items)
+                publish_collection(collection, uploader)
+
+        for name in ["wc2.1_10m_bio_1.tif", "wc2.1_10m_bio_1.png"]:
+            self.assertTrue(
+                self.fs.exists(f"/worldclim-test/bioclim/wc2.1_10m_bio_1/{name}"))
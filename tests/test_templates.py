@@ -0,0 +1,68 @@
+import json
+import unittest
+from datetime import datetime, timezone
+
+from stactools.worldclim import stac
+from stactools.worldclim.constants import MONTHLY_DATA_VARIABLES
+
+TRANSFORM = [
+    0.008333333333333333, 0.0, -90.0, 0.0, -0.008333333333333333, 90.0, 0.0,
+    0.0, 1.0
+]
+
+
+def as_json(item):
+    return json.dumps(item.to_dict(), sort_keys=True)
+
+
+class TemplatesTest(unittest.TestCase):
+    def test_monthly_template_matches_builder(self):
+        start = datetime(1970, 6, 1, tzinfo=timezone.utc)
+        end = datetime(2000, 6, 30, 23, 59, 59, tzinfo=timezone.utc)
+        hrefs = {
+            data_var: f"/data/wc2.1_30s_{data_var}_06_1_2.tif"
+            for data_var in MONTHLY_DATA_VARIABLES.keys()
+        }
+        args = dict(id="wc2.1_30s_6_1_2",
+                    title="Worldclim 30s June",
+                    start_datetime=start,
+                    end_datetime=end,
+                    bbox=[-90.0, 0.0, 0.0, 90.0],
+                    transform=TRANSFORM,
+                    shape=[10800, 10800],
+                    asset_hrefs=hrefs)
+        self.assertEqual(as_json(stac._monthly_template().render(**args)),
+                         as_json(stac._build_monthly_item(**args)))
+
+    def test_bioclim_template_matches_builder(self):
+        start = datetime(1970, 1, 1, tzinfo=timezone.utc)
+        end = datetime(2000, 12, 31, 23, 59, 59, tzinfo=timezone.utc)
+        rendered = stac._bioclim_template("bio_12").render(
+            id="wc2.1_30s_bio_12_2_1",
+            title="Worldclim Annual Precipitation",
+            start_datetime=start,
+            end_datetime=end,
+            bbox=[-180.0, -90.0, -90.0, 0.0],
+            transform=TRANSFORM,
+            shape=[10800, 10800],
+            asset_hrefs={"data": "/data/wc2.1_30s_bio_12_2_1.tif"})
+        built = stac._build_bioclim_item(
+            id="wc2.1_30s_bio_12_2_1",
+            bio_var="bio_12",
+            start_datetime=start,
+            end_datetime=end,
+            bbox=[-180.0, -90.0, -90.0, 0.0],
+            transform=TRANSFORM,
+            shape=[10800, 10800],
+            href="/data/wc2.1_30s_bio_12_2_1.tif")
+        self.assertEqual(as_json(rendered), as_json(built))
+
+    def test_rendered_items_are_independent(self):
+        first = stac.create_monthly_item(
+            "tests/data-files/wc2.1_10m_prec_01.tif")
+        first.properties["proj:shape"].append(1)
+        first.assets["prec"].roles.append("changed")
+        second = stac.create_monthly_item(
+            "tests/data-files/wc2.1_10m_prec_01.tif")
+        self.assertEqual(second.properties["proj:shape"], [1080, 2160])
+        self.assertEqual(second.assets["prec"].roles, ["data"])
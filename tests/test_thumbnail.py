@@ -0,0 +1,114 @@
+import os
+import shutil
+import threading
+import unittest
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import rasterio
+
+from stactools.worldclim import stac, thumbnail
+from stactools.worldclim.constants import (
+    BIOCLIM_VARIABLES,
+    COLORMAPS,
+    MONTHLY_DATA_VARIABLES,
+    THUMBNAIL_STYLES,
+)
+from stactools.worldclim.thumbnail import (
+    add_thumbnail,
+    add_thumbnails,
+    colorize,
+)
+
+DATA_FILES = os.path.join(os.path.dirname(__file__), "data-files")
+BIOCLIM_TIF = os.path.join(DATA_FILES, "wc2.1_10m_bio_1.tif")
+
+
+class ThumbnailTest(unittest.TestCase):
+    def test_every_variable_has_a_style(self):
+        self.assertLessEqual(
+            set(MONTHLY_DATA_VARIABLES) | set(BIOCLIM_VARIABLES),
+            set(THUMBNAIL_STYLES))
+        for colormap, low, high in THUMBNAIL_STYLES.values():
+            self.assertIn(colormap, COLORMAPS)
+            self.assertLess(low, high)
+
+    def test_colorize(self):
+        colormap, low, high = THUMBNAIL_STYLES["tavg"]
+        data = np.ma.masked_array([[low, high], [low - 100, 0]],
+                                  mask=[[False, False], [False, True]])
+        rgba = colorize(data, "tavg")
+        self.assertEqual(rgba.shape, (4, 2, 2))
+        self.assertEqual(rgba.dtype, np.uint8)
+        stops = COLORMAPS[colormap]
+        self.assertEqual(list(rgba[:3, 0, 0]), list(stops[0]))
+        self.assertEqual(list(rgba[:3, 0, 1]), list(stops[-1]))
+        # Values outside the range are clamped to its ends
+        self.assertEqual(list(rgba[:3, 1, 0]), list(stops[0]))
+        self.assertEqual(list(rgba[3].ravel()), [255, 255, 255, 0])
+
+    def test_bioclim_thumbnails(self):
+        for image_format, driver in [("png", "PNG"), ("webp", "WEBP")]:
+            with TemporaryDirectory() as tmp_dir:
+                shutil.copy(BIOCLIM_TIF, tmp_dir)
+                item = stac.create_bioclim_item(
+                    os.path.join(tmp_dir, "wc2.1_10m_bio_1.tif"))
+                add_thumbnail(item, max_size=64, image_format=image_format)
+                asset = item.assets["thumbnail"]
+                self.assertEqual(asset.roles, ["thumbnail"])
+                self.assertEqual(
+                    asset.href,
+                    os.path.join(tmp_dir, f"{item.id}.{image_format}"))
+                with rasterio.open(asset.href) as dataset:
+                    self.assertEqual(dataset.driver, driver)
+                    self.assertEqual(dataset.count, 4)
+                    self.assertLessEqual(max(dataset.shape), 64)
+                    alpha = dataset.read(4)
+                self.assertTrue((alpha == 0).any())
+                self.assertTrue((alpha == 255).any())
+
+    def test_monthly_thumbnail(self):
+        with TemporaryDirectory() as tmp_dir:
+            for variable in MONTHLY_DATA_VARIABLES:
+                shutil.copy(
+                    BIOCLIM_TIF,
+                    os.path.join(tmp_dir, f"wc2.1_10m_{variable}_01.tif"))
+            item = stac.create_monthly_item(
+                os.path.join(tmp_dir, "wc2.1_10m_tmin_01.tif"))
+            rendered = []
+            original = thumbnail.create_thumbnail
+
+            def create_thumbnail(href, *args):
+                rendered.append(os.path.basename(href))
+                original(href, *args)
+
+            thumbnail.create_thumbnail = create_thumbnail
+            try:
+                add_thumbnail(item)
+            finally:
+                thumbnail.create_thumbnail = original
+            self.assertEqual(rendered, ["wc2.1_10m_tavg_01.tif"])
+            self.assertTrue(os.path.exists(item.assets["thumbnail"].href))
+
+    def test_add_thumbnails_in_parallel(self):
+        threads = set()
+        original = thumbnail.add_thumbnail
+
+        def add_thumbnail(item, *args):
+            threads.add(threading.get_ident())
+            original(item, *args)
+
+        with TemporaryDirectory() as tmp_dir:
+            items = []
+            for name in ["wc2.1_10m_bio_1.tif", "wc2.1_10m_bio_12.tif"]:
+                path = os.path.join(tmp_dir, name)
+                shutil.copy(BIOCLIM_TIF, path)
+                items.append(stac.create_bioclim_item(path))
+            thumbnail.add_thumbnail = add_thumbnail
+            try:
+                add_thumbnails(items, max_size=32, max_workers=2)
+            finally:
+                thumbnail.add_thumbnail = original
+            for item in items:
+                self.assertTrue(os.path.exists(item.assets["thumbnail"].href))
+        self.assertNotIn(threading.get_ident(), threads)